@@ -14,38 +14,23 @@ Gradio 应用 - 乡村化学教师AI教学助手
 """
 
 import os
-import sys
+import asyncio
+import contextlib
 import logging
-import base64
 from pathlib import Path
 
-# 自动安装依赖
-def ensure_dependencies():
-    """确保必要的依赖已安装"""
-    try:
-        import gradio
-    except ImportError:
-        print("正在安装 gradio...")
-        import subprocess
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "gradio", "-q"])
-    
-    # 尝试导入后端服务
-    try:
-        from backend.services import ChemistryService
-        return True
-    except ImportError:
-        print("警告：后端服务不可用，将运行演示模式")
-        return False
-
-# 检查依赖
-HAS_BACKEND = ensure_dependencies()
-
 import gradio as gr
 
-if HAS_BACKEND:
+# 后端依赖未安装时运行演示模式（依赖见 requirements.txt）
+try:
     from backend.services import ChemistryService
-else:
+    from backend.executor import run_sync
+    from backend.image_store import image_store
+    HAS_BACKEND = True
+except ImportError as e:
+    print(f"警告：后端服务不可用（{e}），将运行演示模式")
     ChemistryService = None
+    HAS_BACKEND = False
 
 # ===================== 日志配置 =====================
 
@@ -73,59 +58,131 @@ def set_api_key(api_key: str) -> str:
     return "✅ API密钥已保存"
 
 
+# ===================== 并发与取消 =====================
+
+# 各标签页的并发上限（图像生成与文本功能相互隔离）
+TEXT_CONCURRENCY = int(os.environ.get('GRADIO_TEXT_CONCURRENCY', '16'))
+IMAGE_CONCURRENCY = int(os.environ.get('GRADIO_IMAGE_CONCURRENCY', '4'))
+RECOGNIZE_CONCURRENCY = int(os.environ.get('GRADIO_RECOGNIZE_CONCURRENCY', '4'))
+QUEUE_MAX_SIZE = int(os.environ.get('GRADIO_QUEUE_MAX_SIZE', '200'))
+
+# (会话ID, 功能) -> (请求令牌, 正在执行的任务)
+_in_flight = {}
+
+
+def _claim_request(feature: str, request: gr.Request) -> tuple:
+    """
+    登记新的请求，并取消同一会话中该功能仍在执行的上一次请求
+    
+    Returns:
+        (登记键, 请求令牌)
+    """
+    key = (getattr(request, "session_hash", None), feature)
+    previous = _in_flight.get(key)
+    if previous is not None and previous[1] is not None and not previous[1].done():
+        logger.info(f"取消上一次未完成的请求: {feature}")
+        previous[1].cancel()
+    token = object()
+    _in_flight[key] = (token, None)
+    return key, token
+
+
+def _is_current(key: tuple, token: object) -> bool:
+    """判断请求是否仍是该会话中最新的一次"""
+    entry = _in_flight.get(key)
+    return entry is not None and entry[0] is token
+
+
+def _release_request(key: tuple, token: object) -> None:
+    if _is_current(key, token):
+        del _in_flight[key]
+
+
+async def _run_cancellable(key: tuple, token: object, coro):
+    """以可取消任务执行协程，新请求到来时上一次任务会被取消"""
+    task = asyncio.ensure_future(coro)
+    if _is_current(key, token):
+        _in_flight[key] = (token, task)
+    return await task
+
+
 # ===================== 功能处理器 =====================
 
-def handle_explain_reaction(reaction: str) -> str:
-    """处理化学反应讲解"""
+async def _stream_text(feature: str, stream, request: gr.Request):
+    """逐段产出累积文本；被同一会话的新请求取代时立即停止"""
+    key, token = _claim_request(feature, request)
+    text = ""
+    try:
+        async with contextlib.aclosing(stream) as chunks:
+            async for chunk in chunks:
+                if not _is_current(key, token):
+                    logger.info(f"请求已被新的请求取代，停止输出: {feature}")
+                    return
+                text += chunk
+                yield text
+    finally:
+        _release_request(key, token)
+
+
+async def handle_explain_reaction(reaction: str, request: gr.Request):
+    """处理化学反应讲解（流式输出）"""
     global global_api_key
     
     if not global_api_key:
-        return "❌ 请先设置API密钥"
+        yield "❌ 请先设置API密钥"
+        return
     
     if not reaction or not reaction.strip():
-        return "❌ 请输入化学反应描述"
+        yield "❌ 请输入化学反应描述"
+        return
     
     if not ChemistryService:
-        return "❌ 后端服务不可用"
+        yield "❌ 后端服务不可用"
+        return
     
     try:
         logger.info(f"处理反应讲解: {reaction}")
-        result = ChemistryService.explain_reaction(
+        stream = ChemistryService.astream_explain_reaction(
             reaction=reaction,
             api_key=global_api_key
         )
-        return result
+        async for text in _stream_text("explain", stream, request):
+            yield text
     except Exception as e:
         logger.error(f"反应讲解失败: {str(e)}")
-        return f"❌ 讲解失败: {str(e)}"
+        yield f"❌ 讲解失败: {str(e)}"
 
 
-def handle_balance_equation(equation: str) -> str:
-    """处理方程式配平"""
+async def handle_balance_equation(equation: str, request: gr.Request):
+    """处理方程式配平（流式输出）"""
     global global_api_key
     
     if not global_api_key:
-        return "❌ 请先设置API密钥"
+        yield "❌ 请先设置API密钥"
+        return
     
     if not equation or not equation.strip():
-        return "❌ 请输入化学方程式"
+        yield "❌ 请输入化学方程式"
+        return
     
     if not ChemistryService:
-        return "❌ 后端服务不可用"
+        yield "❌ 后端服务不可用"
+        return
     
     try:
         logger.info(f"处理方程式配平: {equation}")
-        result = ChemistryService.balance_equation(
+        stream = ChemistryService.astream_balance_equation(
             equation=equation,
             api_key=global_api_key
         )
-        return str(result)
+        async for text in _stream_text("balance", stream, request):
+            yield text
     except Exception as e:
         logger.error(f"方程式配平失败: {str(e)}")
-        return f"❌ 配平失败: {str(e)}"
+        yield f"❌ 配平失败: {str(e)}"
 
 
-def handle_generate_image(prompt: str) -> str:
+async def handle_generate_image(prompt: str, request: gr.Request):
     """处理图像生成"""
     global global_api_key
     
@@ -138,19 +195,46 @@ def handle_generate_image(prompt: str) -> str:
     if not ChemistryService:
         return "❌ 后端服务不可用"
     
+    key, token = _claim_request("image", request)
     try:
         logger.info(f"处理图像生成: {prompt}")
-        result = ChemistryService.generate_reaction_image(
+        result = await _run_cancellable(key, token, ChemistryService.agenerate_reaction_image(
             prompt=prompt,
             api_key=global_api_key
-        )
-        return result
+        ))
+        # 本地存储的图像直接使用文件路径，无需经由后端 HTTP 接口
+        return image_store.local_path(result) or result
+    except asyncio.CancelledError:
+        # 被同一会话的新请求取代，不更新界面
+        if _is_current(key, token):
+            raise
+        return gr.skip()
     except Exception as e:
         logger.error(f"图像生成失败: {str(e)}")
         return f"❌ 生成失败: {str(e)}"
+    finally:
+        _release_request(key, token)
+
 
+def _read_image_file(image_path: str) -> tuple:
+    """读取本地图片，返回 (文件字节, 媒体类型)"""
+    with open(image_path, "rb") as image_file:
+        data = image_file.read()
+    
+    # 确定图片类型
+    image_ext = Path(image_path).suffix.lower()
+    mime_type_map = {
+        '.jpg': 'image/jpeg',
+        '.jpeg': 'image/jpeg',
+        '.png': 'image/png',
+        '.gif': 'image/gif',
+        '.bmp': 'image/bmp',
+        '.webp': 'image/webp',
+    }
+    return data, mime_type_map.get(image_ext, 'image/jpeg')
 
-def handle_recognize_material(image) -> str:
+
+async def handle_recognize_material(image, request: gr.Request) -> str:
     """处理物质识别"""
     global global_api_key
     
@@ -163,43 +247,35 @@ def handle_recognize_material(image) -> str:
     if not ChemistryService:
         return "❌ 后端服务不可用"
     
+    key, token = _claim_request("recognize", request)
     try:
         logger.info("处理物质识别")
         
         # Gradio Image 组件返回的是本地文件路径
-        # 需要转换为 base64 格式供后端使用
+        # 直接读取文件字节，base64 编码由后端在调用模型前进行一次
         image_path = image if isinstance(image, str) else str(image)
         
         # 检查文件是否存在
         if not Path(image_path).exists():
             return f"❌ 图片文件不存在: {image_path}"
         
-        # 读取文件并转换为 base64
-        with open(image_path, "rb") as image_file:
-            image_data = base64.b64encode(image_file.read()).decode('utf-8')
+        data, media_type = await run_sync(_read_image_file, image_path)
         
-        # 确定图片类型
-        image_ext = Path(image_path).suffix.lower()
-        mime_type_map = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.gif': 'image/gif',
-            '.bmp': 'image/bmp',
-        }
-        mime_type = mime_type_map.get(image_ext, 'image/jpeg')
-        
-        # 构造 data URL
-        image_url = f"data:{mime_type};base64,{image_data}"
-        
-        result = ChemistryService.recognize_material(
-            image_url=image_url,
+        result = await _run_cancellable(key, token, ChemistryService.arecognize_image(
+            data=data,
+            media_type=media_type,
             api_key=global_api_key
-        )
+        ))
         return str(result)
+    except asyncio.CancelledError:
+        if _is_current(key, token):
+            raise
+        return gr.skip()
     except Exception as e:
         logger.error(f"物质识别失败: {str(e)}")
         return f"❌ 识别失败: {str(e)}"
+    finally:
+        _release_request(key, token)
 
 
 # ===================== UI 创建 =====================
@@ -566,15 +642,19 @@ def create_interface():
                         show_copy_button=True
                     )
                     
-                    explain_btn.click(
+                    explain_event = explain_btn.click(
                         fn=handle_explain_reaction,
                         inputs=[reaction_input],
-                        outputs=[explain_output]
+                        outputs=[explain_output],
+                        concurrency_id="explain",
+                        concurrency_limit=TEXT_CONCURRENCY,
+                        trigger_mode="multiple"
                     )
                     
                     clear_btn.click(
                         fn=lambda: ("", ""),
-                        outputs=[reaction_input, explain_output]
+                        outputs=[reaction_input, explain_output],
+                        cancels=[explain_event]
                     )
             
             # 标签2：方程式配平
@@ -603,15 +683,19 @@ def create_interface():
                         show_copy_button=True
                     )
                     
-                    balance_btn.click(
+                    balance_event = balance_btn.click(
                         fn=handle_balance_equation,
                         inputs=[equation_input],
-                        outputs=[balance_output]
+                        outputs=[balance_output],
+                        concurrency_id="balance",
+                        concurrency_limit=TEXT_CONCURRENCY,
+                        trigger_mode="multiple"
                     )
                     
                     clear_btn.click(
                         fn=lambda: ("", ""),
-                        outputs=[equation_input, balance_output]
+                        outputs=[equation_input, balance_output],
+                        cancels=[balance_event]
                     )
             
             # 标签3：图像生成
@@ -638,15 +722,19 @@ def create_interface():
                         type="filepath"
                     )
                     
-                    image_btn.click(
+                    image_event = image_btn.click(
                         fn=handle_generate_image,
                         inputs=[prompt_input],
-                        outputs=[image_output]
+                        outputs=[image_output],
+                        concurrency_id="image",
+                        concurrency_limit=IMAGE_CONCURRENCY,
+                        trigger_mode="multiple"
                     )
                     
                     clear_btn.click(
                         fn=lambda: ("", None),
-                        outputs=[prompt_input, image_output]
+                        outputs=[prompt_input, image_output],
+                        cancels=[image_event]
                     )
             
             # 标签4：物质识别
@@ -674,15 +762,19 @@ def create_interface():
                         show_copy_button=True
                     )
                     
-                    recognize_btn.click(
+                    recognize_event = recognize_btn.click(
                         fn=handle_recognize_material,
                         inputs=[image_input],
-                        outputs=[material_output]
+                        outputs=[material_output],
+                        concurrency_id="recognize",
+                        concurrency_limit=RECOGNIZE_CONCURRENCY,
+                        trigger_mode="multiple"
                     )
                     
                     clear_btn.click(
                         fn=lambda: (None, ""),
-                        outputs=[image_input, material_output]
+                        outputs=[image_input, material_output],
+                        cancels=[recognize_event]
                     )
         
         # 页脚
@@ -690,6 +782,12 @@ def create_interface():
             "---\n🎓 **乡村化学教师AI教学助手 © 2025 | 专为乡村教育设计，提升教学效率，弥补实验资源不足"
         )
     
+    # 显式队列配置：各功能使用独立的 concurrency_id，慢速图像生成不占用文本功能的并发额度
+    demo.queue(
+        default_concurrency_limit=TEXT_CONCURRENCY,
+        max_size=QUEUE_MAX_SIZE
+    )
+    
     return demo
 
 
@@ -707,5 +805,7 @@ if __name__ == "__main__":
         server_port=port,
         share=False,
         show_error=True,
-        debug=True
+        debug=True,
+        # 允许 Gradio 读取本地存储的生成图像
+        allowed_paths=[image_store.root] if HAS_BACKEND else None
     )
\ No newline at end of file
@@ -1,10 +1,18 @@
 """
 乡村化学教师AI教学助手后端包
+
+FastAPI 应用在首次访问 backend.app 时才导入，Gradio 与命令行只导入 backend.services 时
+无需加载 FastAPI 与路由。
 """
 
 __version__ = "2.0.0"
 __author__ = "AI Chemistry Teaching Team"
 
-from .main import app
-
 __all__ = ["app"]
+
+
+def __getattr__(name):
+    if name == "app":
+        from .main import app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,225 @@
+"""
+准入控制模块 - 按 API 密钥与功能限制上游调用速率
+
+- 每个（API 密钥, 功能）一个令牌桶：容量 CHEM_RATE_LIMIT_BURST，每秒补充 CHEM_RATE_LIMIT_RPS 个
+- 令牌不足时请求排队等待（预约令牌，先到先得），每个桶的等待队列有上限
+- 队列已满或预计等待超过 CHEM_ADMISSION_MAX_WAIT 秒时立即拒绝（HTTP 429 + Retry-After）
+- 只有真正发起上游调用时才消耗令牌：结果缓存命中、合并到已有调用的请求不受限制
+- 过载时可降级（CHEM_ADMISSION_DEGRADE）：配平方程式返回本地精确配平结果
+
+令牌桶只在事件循环线程中使用，无需加锁。CHEM_RATE_LIMIT_RPS=0 关闭限流。
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 每个（密钥, 功能）的令牌补充速率（个/秒）与桶容量
+RATE_LIMIT_RPS = float(os.getenv("CHEM_RATE_LIMIT_RPS", "1"))
+RATE_LIMIT_BURST = float(os.getenv("CHEM_RATE_LIMIT_BURST", "20"))
+# 单个请求最长等待时间（秒）、每个桶的等待队列上限
+ADMISSION_MAX_WAIT = float(os.getenv("CHEM_ADMISSION_MAX_WAIT", "10"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("CHEM_ADMISSION_QUEUE_SIZE", "20"))
+# 过载时是否返回降级结果
+ADMISSION_DEGRADE = os.getenv("CHEM_ADMISSION_DEGRADE", "1") != "0"
+# 保留的令牌桶数量上限（超出时淘汰最久未使用且已满的桶）
+ADMISSION_MAX_BUCKETS = int(os.getenv("CHEM_ADMISSION_MAX_BUCKETS", "10000"))
+
+
+def key_id(api_key: str) -> str:
+    """API 密钥的摘要：桶与合并键都以摘要为键，不在内存中长期保留明文密钥"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+class RateLimitedError(Exception):
+    """请求超出速率限制"""
+
+    def __init__(self, feature: str, retry_after: float):
+        self.feature = feature
+        self.retry_after = retry_after
+        super().__init__(f"请求过于频繁，请 {self.retry_after_seconds} 秒后重试")
+
+    @property
+    def retry_after_seconds(self) -> int:
+        """Retry-After 响应头使用的整数秒"""
+        return max(1, math.ceil(self.retry_after))
+
+
+class TokenBucket:
+    """令牌桶（令牌数可以为负，表示已被排队请求预约）"""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.waiting = 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float, cost: float = 1.0) -> float:
+        """预约 cost 个令牌需要等待的时间（秒）"""
+        self._refill(now)
+        return max(0.0, (cost - self.tokens) / self.rate)
+
+    def reserve(self, cost: float = 1.0) -> None:
+        self.tokens -= cost
+
+    def refund(self, cost: float = 1.0) -> None:
+        self.tokens = min(self.capacity, self.tokens + cost)
+
+    def idle(self, now: float) -> bool:
+        """桶已补满且无人等待，可以安全淘汰"""
+        self._refill(now)
+        return self.waiting == 0 and self.tokens >= self.capacity
+
+
+class _FeatureStats:
+    def __init__(self):
+        self.admitted = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.degraded = 0
+        self.wait_total = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "admitted": self.admitted,
+            "delayed": self.delayed,
+            "rejected": self.rejected,
+            "degraded": self.degraded,
+            "avg_wait": self.wait_total / self.delayed if self.delayed else None,
+        }
+
+
+class AdmissionController:
+    """按（API 密钥, 功能）限流的准入控制器"""
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT_RPS,
+        burst: float = RATE_LIMIT_BURST,
+        max_wait: float = ADMISSION_MAX_WAIT,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        degrade: bool = ADMISSION_DEGRADE,
+        max_buckets: int = ADMISSION_MAX_BUCKETS,
+    ):
+        """
+        Args:
+            rate: 每秒补充的令牌数，<= 0 时不限流
+            burst: 桶容量（允许的突发请求数）
+            max_wait: 单个请求最长等待时间（秒）
+            queue_size: 每个桶的等待队列上限
+            degrade: 过载时是否返回降级结果
+            max_buckets: 保留的令牌桶数量上限
+        """
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+        self.degrade = degrade
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._features: Dict[str, _FeatureStats] = {}
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _bucket(self, api_key: str, feature: str, now: float) -> TokenBucket:
+        key = (key_id(api_key), feature)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst, now)
+            self._buckets[key] = bucket
+            self._evict(now)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _evict(self, now: float) -> None:
+        while len(self._buckets) > self.max_buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if not bucket.idle(now):
+                break
+            del self._buckets[key]
+
+    def _stats(self, feature: str) -> _FeatureStats:
+        stats = self._features.get(feature)
+        if stats is None:
+            stats = self._features[feature] = _FeatureStats()
+        return stats
+
+    async def acquire(self, api_key: str, feature: str) -> None:
+        """
+        申请一次上游调用，令牌不足时排队等待
+
+        Raises:
+            RateLimitedError: 等待队列已满或预计等待时间过长
+        """
+        if not self.enabled:
+            return
+        stats = self._stats(feature)
+        now = time.monotonic()
+        bucket = self._bucket(api_key, feature, now)
+        wait = bucket.wait_time(now)
+
+        if wait <= 0:
+            bucket.reserve()
+            stats.admitted += 1
+            return
+        if bucket.waiting >= self.queue_size or wait > self.max_wait:
+            stats.rejected += 1
+            logger.warning(f"[准入控制] 拒绝 {feature}：排队 {bucket.waiting}，预计等待 {wait:.1f}s")
+            raise RateLimitedError(feature, wait)
+
+        # 预约令牌后等待补充，后到的请求看到更少的令牌，自然按到达顺序放行
+        bucket.reserve()
+        bucket.waiting += 1
+        self.queue_depth += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            bucket.refund()
+            raise
+        finally:
+            bucket.waiting -= 1
+            self.queue_depth -= 1
+        stats.admitted += 1
+        stats.delayed += 1
+        stats.wait_total += wait
+
+    def record_degraded(self, feature: str) -> None:
+        """记录一次降级响应"""
+        self._stats(feature).degraded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """导出限流统计"""
+        return {
+            "enabled": self.enabled,
+            "rate": self.rate,
+            "burst": self.burst,
+            "max_wait": self.max_wait,
+            "queue_size": self.queue_size,
+            "degrade": self.degrade,
+            "buckets": len(self._buckets),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "features": {name: stats.snapshot() for name, stats in sorted(self._features.items())},
+        }
+
+
+# 进程级单例
+admission = AdmissionController()
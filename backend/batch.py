@@ -0,0 +1,109 @@
+"""
+批量处理模块 - 练习卷等一次提交多条输入的场景
+
+- 等价输入去重（与结果缓存相同的规范化），每个不同输入只处理一次
+- 以信号量限制并发，避免一次批量请求占满上游配额
+- 结果按输入顺序返回，单条失败不影响其他条目
+- 返回批量总耗时与逐条顺序执行的耗时估计，便于评估并发收益
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+try:
+    from .admission import RateLimitedError
+    from .resilience import CircuitOpenError
+except ImportError:
+    from backend.admission import RateLimitedError
+    from backend.resilience import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# 单次批量请求的最大条目数、每个批量请求的并发上限
+BATCH_MAX_ITEMS = int(os.getenv("CHEM_BATCH_MAX_ITEMS", "100"))
+BATCH_CONCURRENCY = int(os.getenv("CHEM_BATCH_CONCURRENCY", "4"))
+
+
+@dataclass
+class BatchItemResult:
+    """单条结果"""
+    input: str
+    success: bool
+    data: Optional[str] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+
+
+async def run_batch(
+    items: List[str],
+    call: Callable[[str], Awaitable[str]],
+    key: Callable[[str], Hashable],
+    concurrency: int = BATCH_CONCURRENCY,
+) -> Dict[str, Any]:
+    """
+    去重后并发处理一批输入
+
+    Args:
+        items: 输入列表
+        call: 处理单条输入的协程函数
+        key: 去重键（等价输入返回相同的键）
+        concurrency: 并发上限
+
+    Returns:
+        {"results": 按输入顺序的结果, "total", "unique", "concurrency",
+         "elapsed": 总耗时, "sequential_estimate": 逐条顺序执行的耗时估计}
+    """
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    # 去重键 → 首次出现的输入
+    unique: Dict[Hashable, str] = {}
+    keys: List[Optional[Hashable]] = []
+    for item in items:
+        if not item.strip():
+            keys.append(None)
+            continue
+        k = key(item)
+        unique.setdefault(k, item)
+        keys.append(k)
+
+    async def worker(item: str) -> BatchItemResult:
+        async with semaphore:
+            item_start = time.perf_counter()
+            try:
+                data = await call(item)
+                return BatchItemResult(item, True, data=data, elapsed=time.perf_counter() - item_start)
+            except (ValueError, RateLimitedError, CircuitOpenError) as e:
+                error = str(e)
+            except Exception as e:
+                logger.error(f"[批量处理] 条目失败: {str(e)}")
+                error = "处理请求失败"
+            return BatchItemResult(item, False, error=error, elapsed=time.perf_counter() - item_start)
+
+    done = await asyncio.gather(*(worker(item) for item in unique.values()))
+    by_key = dict(zip(unique.keys(), done))
+
+    results = []
+    for item, k in zip(items, keys):
+        if k is None:
+            results.append(BatchItemResult(item, False, error="内容为空"))
+            continue
+        result = by_key[k]
+        # 重复条目共享结果，但保留各自的原始输入
+        results.append(result if result.input == item else BatchItemResult(
+            item, result.success, data=result.data, error=result.error, elapsed=0.0
+        ))
+
+    elapsed = time.perf_counter() - start
+    return {
+        "results": [asdict(r) for r in results],
+        "total": len(items),
+        "unique": len(unique),
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "sequential_estimate": sum(r.elapsed for r in done),
+    }
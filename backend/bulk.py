@@ -0,0 +1,285 @@
+"""
+批量离线处理命令行 - 为整学期课程预先生成讲解 / 配平 / 图像
+
+读取 CSV 或 JSONL 中的反应或方程式，以有界并发调用 ChemistryService，
+每完成一条立即追加一行结果到 JSONL 输出，并把该条目写入检查点文件。
+中断（Ctrl+C、断电）后用相同参数重新运行，已完成的条目会被跳过。
+
+输入格式：
+- CSV：首行为表头，默认读取 reaction / equation / prompt / text / input 中第一个存在的列
+  （可用 --column 指定），id 列存在时作为条目标识，否则使用行号
+- JSONL：每行一个对象（字段规则同 CSV），或一个 JSON 字符串
+
+输出每行：{"id", "input", "task", "success", "result", "error", "elapsed"}
+失败条目不写入检查点，重新运行时会重试；同一 id 出现多行时以最后一行为准。
+限流或熔断时不接受降级结果（本地配平结果、占位图），按失败处理，以便重新运行时补齐；
+输入中重复的 id 只处理第一条。
+
+使用：
+    python -m backend.bulk reactions.csv --task explain --output explain.jsonl
+    python -m backend.bulk equations.jsonl --task balance --workers 8 --no-narrative
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple
+
+try:
+    from .services import ChemistryService, is_placeholder_image
+except ImportError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from backend.services import ChemistryService, is_placeholder_image
+
+logger = logging.getLogger(__name__)
+
+# 默认读取的输入列（按顺序取第一个存在的）
+INPUT_FIELDS = ("reaction", "equation", "prompt", "text", "input")
+# 默认并发数
+BULK_WORKERS = int(os.getenv("CHEM_BULK_WORKERS", "4"))
+# 每完成多少条输出一次进度
+PROGRESS_EVERY = 20
+
+TASKS = ("explain", "balance", "image")
+
+
+# ===================== 输入读取 =====================
+
+def _pick_field(record: Dict[str, Any], column: Optional[str]) -> str:
+    if column:
+        if column not in record:
+            raise ValueError(f"输入缺少列 {column}")
+        return column
+    for name in INPUT_FIELDS:
+        if name in record:
+            return name
+    raise ValueError(f"输入中没有可识别的列（{', '.join(INPUT_FIELDS)}），请用 --column 指定")
+
+
+def read_records(path: str, column: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """
+    逐条读取输入文件（不会一次载入整个文件）
+
+    Args:
+        path: CSV 或 JSONL 文件路径（按扩展名判断，.jsonl / .json 为 JSONL）
+        column: 输入列名
+
+    Yields:
+        (条目 id, 输入文本)
+    """
+    is_jsonl = path.lower().endswith((".jsonl", ".json"))
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if is_jsonl:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if isinstance(record, str):
+                    yield str(line_no), record
+                    continue
+                field = _pick_field(record, column)
+                yield str(record.get("id", line_no)), str(record[field])
+        else:
+            reader = csv.DictReader(f)
+            field = None
+            for row_no, row in enumerate(reader, 1):
+                field = field or _pick_field(row, column)
+                yield str(row.get("id") or row_no), row[field]
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """读取已完成的条目 id"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+# ===================== 处理 =====================
+
+class DegradedResultError(Exception):
+    """服务返回了降级结果（如占位图），不能作为成功结果写入检查点"""
+
+
+def _task_call(task: str, api_key: str, narrative: bool) -> Callable[[str], Any]:
+    # 批量结果会长期复用，全部走不降级的路径：失败即抛出，不写入检查点
+    if task == "explain":
+        return lambda text: ChemistryService.aexplain_reaction(text, api_key)
+    if task == "balance":
+        return lambda text: ChemistryService.abalance_equation(text, api_key, narrative=narrative, degrade=False)
+
+    async def generate(text: str) -> str:
+        url = await ChemistryService.agenerate_reaction_image(text, api_key, degrade=False)
+        if is_placeholder_image(url):
+            raise DegradedResultError(f"图像生成失败，返回了占位图: {url}")
+        return url
+
+    return generate
+
+
+class BulkRunner:
+    """有界并发的断点续跑批处理"""
+
+    def __init__(
+        self,
+        task: str,
+        api_key: str,
+        output: str,
+        checkpoint: str,
+        workers: int = BULK_WORKERS,
+        narrative: bool = True,
+    ):
+        """
+        Args:
+            task: explain / balance / image
+            api_key: ModelScope API密钥
+            output: 结果 JSONL 路径（追加写入）
+            checkpoint: 检查点路径（每行一个已完成的条目 id）
+            workers: 并发数
+            narrative: 配平时是否生成讲解
+        """
+        self.task = task
+        self.call = _task_call(task, api_key, narrative)
+        self.output = output
+        self.checkpoint = checkpoint
+        self.workers = max(1, workers)
+
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.duplicates = 0
+
+    async def run(self, records: Iterator[Tuple[str, str]]) -> None:
+        """处理全部条目；被取消时已完成的结果均已落盘"""
+        completed = load_checkpoint(self.checkpoint)
+        # 本次运行已入队的 id，输入中重复的 id 只处理第一条
+        queued: Set[str] = set()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 2)
+        start = time.perf_counter()
+
+        with open(self.output, "a", encoding="utf-8") as out, open(self.checkpoint, "a", encoding="utf-8") as ckpt:
+
+            async def worker() -> None:
+                while True:
+                    item = await queue.get()
+                    try:
+                        if item is None:
+                            return
+                        await self._process(*item, out, ckpt)
+                    finally:
+                        queue.task_done()
+
+            tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+            try:
+                for item_id, text in records:
+                    if item_id in completed:
+                        self.skipped += 1
+                        continue
+                    if item_id in queued:
+                        self.duplicates += 1
+                        logger.warning(f"[批量处理] 条目 {item_id} 重复，已忽略")
+                        continue
+                    queued.add(item_id)
+                    await queue.put((item_id, text))
+                for _ in tasks:
+                    await queue.put(None)
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        logger.info(
+            f"[批量处理] 完成 {self.done} 条，失败 {self.failed} 条，跳过已完成 {self.skipped} 条，"
+            f"忽略重复 {self.duplicates} 条，耗时 {time.perf_counter() - start:.1f}s"
+        )
+
+    async def _process(self, item_id: str, text: str, out, ckpt) -> None:
+        start = time.perf_counter()
+        record = {"id": item_id, "input": text, "task": self.task}
+        try:
+            result = await self.call(text)
+            record.update(success=True, result=result, error=None)
+        except Exception as e:
+            record.update(success=False, result=None, error=str(e))
+        record["elapsed"] = round(time.perf_counter() - start, 3)
+
+        # 先写结果再写检查点：中途断电最多重复处理一条，不会丢失结果
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        if record["success"]:
+            ckpt.write(item_id + "\n")
+            ckpt.flush()
+            self.done += 1
+        else:
+            self.failed += 1
+            logger.warning(f"[批量处理] 条目 {item_id} 失败: {record['error']}")
+
+        finished = self.done + self.failed
+        if finished % PROGRESS_EVERY == 0:
+            logger.info(f"[批量处理] 已处理 {finished} 条（失败 {self.failed}）")
+
+
+# ===================== 命令行 =====================
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.bulk",
+        description="批量离线处理反应 / 方程式，支持断点续跑",
+    )
+    parser.add_argument("input", help="输入文件（.csv 或 .jsonl）")
+    parser.add_argument("--task", choices=TASKS, required=True, help="explain 讲解 / balance 配平 / image 文生图")
+    parser.add_argument("--output", help="结果 JSONL（默认 <输入名>.<task>.jsonl）")
+    parser.add_argument("--checkpoint", help="检查点文件（默认 <输出>.ckpt）")
+    parser.add_argument("--column", help="输入列名（默认自动识别）")
+    parser.add_argument("--workers", type=int, default=BULK_WORKERS, help="并发数")
+    parser.add_argument("--no-narrative", action="store_true", help="配平时只返回本地精确配平结果")
+    parser.add_argument("--api-key", help="ModelScope API密钥（默认读取环境变量 modelscope_API_KEY）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    api_key = args.api_key or os.getenv("modelscope_API_KEY")
+    if not api_key:
+        parser.error("未设置 API 密钥（--api-key 或环境变量 modelscope_API_KEY）")
+
+    output = args.output or f"{os.path.splitext(args.input)[0]}.{args.task}.jsonl"
+    checkpoint = args.checkpoint or output + ".ckpt"
+    runner = BulkRunner(
+        task=args.task,
+        api_key=api_key,
+        output=output,
+        checkpoint=checkpoint,
+        workers=args.workers,
+        narrative=not args.no_narrative,
+    )
+    logger.info(f"[批量处理] {args.input} → {output}（检查点 {checkpoint}，并发 {runner.workers}）")
+
+    async def run() -> None:
+        # SIGTERM 与 Ctrl+C 一样取消运行，已完成的条目都已写入检查点
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, task.cancel)
+        except (NotImplementedError, RuntimeError):
+            pass
+        await runner.run(read_records(args.input, args.column))
+
+    try:
+        asyncio.run(run())
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        logger.info(f"[批量处理] 已中断：完成 {runner.done} 条，重新运行相同命令即可继续")
+        return 130
+    return 0 if runner.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
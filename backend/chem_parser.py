@@ -0,0 +1,394 @@
+"""
+化学式与方程式解析模块 - 分词、解析与规范化表示
+
+- 支持 Unicode 下标/上标（H₂O、Fe³⁺）、反应箭头（= / → / -> / ⇌）、
+  括号（() 与 []）、结晶水（·5H₂O）、状态符号（(s)、(aq)、↑、↓）和离子电荷
+- 解析结果为紧凑的驻留（interned）表示：驻留表按 LRU 保留最近的 PARSE_CACHE_SIZE 种物质，
+  表内相同化学式只对应一个 Species 对象，元素组成以 (元素序号, 原子数) 平行数组保存，可直接用于缓存键、守恒校验和渲染
+"""
+
+import re
+import sys
+import threading
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 元素周期表符号（按原子序数排列，序号即元素索引）
+ELEMENT_SYMBOLS: Tuple[str, ...] = tuple("""
+H He Li Be B C N O F Ne Na Mg Al Si P S Cl Ar K Ca Sc Ti V Cr Mn Fe Co Ni Cu Zn
+Ga Ge As Se Br Kr Rb Sr Y Zr Nb Mo Tc Ru Rh Pd Ag Cd In Sn Sb Te I Xe Cs Ba La Ce
+Pr Nd Pm Sm Eu Gd Tb Dy Ho Er Tm Yb Lu Hf Ta W Re Os Ir Pt Au Hg Tl Pb Bi Po At Rn
+Fr Ra Ac Th Pa U Np Pu Am Cm Bk Cf Es Fm Md No Lr Rf Db Sg Bh Hs Mt Ds Rg Cn Nh Fl
+Mc Lv Ts Og
+""".split())
+ELEMENT_INDEX: Dict[str, int] = {symbol: i for i, symbol in enumerate(ELEMENT_SYMBOLS)}
+
+# 解析缓存容量
+PARSE_CACHE_SIZE = 8192
+
+_SUBSCRIPTS = str.maketrans("0123456789", "₀₁₂₃₄₅₆₇₈₉")
+_SUPERSCRIPTS = str.maketrans("0123456789+-", "⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻")
+# NFKC 会把上标数字转为普通数字，需要先转换为 ^ 记法以保留电荷信息
+_SUPERSCRIPT_RE = re.compile(r"[⁰¹²³⁴⁵⁶⁷⁸⁹]*[⁺⁻]")
+_SUPERSCRIPT_INPUT = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻", "0123456789+-")
+
+# 反应箭头（NFKC 之后）：⇌ ⟶ → -> => == =
+# 注意阴离子紧跟 -> 时（SO42-->）连字符会被视为箭头的一部分，需用空格分隔
+_ARROW_RE = re.compile(r"\s*(?:<=>|<->|⇌|⟶|→|-+>|=+>|=+)\s*")
+# 物质之间的加号：两侧有空白，或紧跟系数/化学式开头/电子（离子电荷 Fe3+ 中的加号不拆分）
+_PLUS_RE = re.compile(r"\s+\+\s*|\+(?=[0-9A-Z(\[]|e\^?[-−])")
+_SPACE_RE = re.compile(r"\s+")
+
+# 化学式分词
+_TOKEN_RE = re.compile(r"""
+    (?P<STATE>\((?:s|l|g|aq)\)|[↑↓])
+  | (?P<ELEMENT>[A-Z][a-z]?)
+  | (?P<NUMBER>\d+)
+  | (?P<OPEN>[(\[])
+  | (?P<CLOSE>[)\]])
+  | (?P<DOT>[·•∙⋅*.])
+  | (?P<CARET>\^)
+  | (?P<SIGN>[+\-−])
+  | (?P<ELECTRON>e(?=\^?[\-−]$))
+  | (?P<ERROR>.)
+""", re.VERBOSE)
+
+Token = Tuple[str, str]
+
+
+class ChemParseError(ValueError):
+    """化学式或方程式无法解析"""
+
+
+@dataclass(frozen=True)
+class Species:
+    """
+    物质（驻留对象，共享相同化学式的实例；驻留表有上限，比较请用 ==）
+
+    Attributes:
+        formula: 规范化学式（ASCII 数字，结晶水用 · 连接，不含电荷与状态符号）
+        elements: 元素序号（升序）
+        counts: 与 elements 对应的原子数
+        charge: 电荷数
+    """
+    formula: str
+    elements: Tuple[int, ...]
+    counts: Tuple[int, ...]
+    charge: int = 0
+
+    @property
+    def atoms(self) -> Tuple[Tuple[str, int], ...]:
+        """(元素符号, 原子数) 列表"""
+        return tuple((ELEMENT_SYMBOLS[e], n) for e, n in zip(self.elements, self.counts))
+
+    @property
+    def key(self) -> str:
+        """包含电荷的规范标识，如 "Fe^3+" """
+        if not self.charge:
+            return self.formula
+        return f"{self.formula}^{abs(self.charge)}{'+' if self.charge > 0 else '-'}"
+
+    def vector(self, elements: Iterable[int]) -> List[int]:
+        """按给定元素顺序展开为原子数数组"""
+        lookup = dict(zip(self.elements, self.counts))
+        return [lookup.get(e, 0) for e in elements]
+
+    def render(self) -> str:
+        """规范展示：数字转下标，电荷转上标"""
+        text = re.sub(r"(?<=[A-Za-z)\]])(\d+)", lambda m: m.group(1).translate(_SUBSCRIPTS), self.formula)
+        if self.charge:
+            magnitude = str(abs(self.charge)) if abs(self.charge) > 1 else ""
+            sign = "+" if self.charge > 0 else "-"
+            text += (magnitude + sign).translate(_SUPERSCRIPTS)
+        return text
+
+    def __repr__(self) -> str:
+        return f"Species({self.key})"
+
+
+@dataclass(frozen=True)
+class Equation:
+    """
+    方程式：(系数, 物质) 元组
+
+    输入中已写出的系数会保留在 coefficients 中，但不参与规范形式。
+    """
+    reactants: Tuple[Species, ...]
+    products: Tuple[Species, ...]
+    coefficients: Tuple[int, ...]
+
+    @property
+    def species(self) -> Tuple[Species, ...]:
+        return self.reactants + self.products
+
+    @property
+    def elements(self) -> Tuple[int, ...]:
+        """方程式涉及的元素序号（升序）"""
+        return tuple(sorted({e for s in self.species for e in s.elements}))
+
+    @property
+    def has_charge(self) -> bool:
+        return any(s.charge for s in self.species)
+
+    def canonical(self) -> str:
+        """规范形式（各侧物质排序、忽略系数），用于缓存键，如 "H2O=H2+O2" """
+        left = "+".join(sorted(s.key for s in self.reactants))
+        right = "+".join(sorted(s.key for s in self.products))
+        return f"{left}={right}"
+
+    def is_balanced(self, coefficients: Optional[Iterable[int]] = None) -> bool:
+        """校验给定系数（默认为输入中的系数）下原子与电荷是否守恒"""
+        coefficients = tuple(coefficients) if coefficients is not None else self.coefficients
+        n = len(self.reactants)
+        totals: Dict[int, int] = {}
+        charge = 0
+        for i, (c, s) in enumerate(zip(coefficients, self.species)):
+            sign = 1 if i < n else -1
+            for e, k in zip(s.elements, s.counts):
+                totals[e] = totals.get(e, 0) + sign * c * k
+            charge += sign * c * s.charge
+        return charge == 0 and not any(totals.values())
+
+    def render(self, coefficients: Optional[Iterable[int]] = None) -> str:
+        """渲染为规范方程式，如 2H₂O → 2H₂ + O₂；不传系数时不显示系数"""
+        coefficients = tuple(coefficients) if coefficients is not None else (1,) * len(self.species)
+        terms = [
+            (str(c) if c != 1 else "") + s.render()
+            for c, s in zip(coefficients, self.species)
+        ]
+        n = len(self.reactants)
+        return " + ".join(terms[:n]) + " → " + " + ".join(terms[n:])
+
+
+# ===================== 分词 =====================
+
+def _normalize(text: str) -> str:
+    """上标电荷转为 ^ 记法，再做 NFKC（全角字符、下标数字 ₂ → 2）"""
+    if any("⁰" <= ch <= "⁹" or ch in "¹²³⁺⁻" for ch in text):
+        text = _SUPERSCRIPT_RE.sub(lambda m: "^" + m.group().translate(_SUPERSCRIPT_INPUT), text)
+    return unicodedata.normalize("NFKC", text)
+
+
+def tokenize(text: str) -> List[Token]:
+    """
+    化学式分词
+
+    Returns:
+        (类型, 文本) 列表，类型为 ELEMENT / NUMBER / OPEN / CLOSE / DOT / CARET / SIGN / ELECTRON
+
+    Raises:
+        ChemParseError: 含无法识别的字符
+    """
+    tokens: List[Token] = []
+    for match in _TOKEN_RE.finditer(_SPACE_RE.sub("", _normalize(text))):
+        kind = match.lastgroup
+        if kind == "STATE":
+            continue
+        if kind == "ERROR":
+            raise ChemParseError(f"无法识别的字符 {match.group()!r}: {text}")
+        tokens.append((kind, match.group()))
+    return tokens
+
+
+def split_equation(text: str) -> List[List[str]]:
+    """
+    按反应箭头与加号拆分方程式（仅做词法拆分，不解析化学式）
+
+    Returns:
+        各侧的物质文本列表；不含反应箭头时只有一侧
+    """
+    text = _SPACE_RE.sub(" ", _normalize(text)).strip()
+    return [
+        [s for s in (_SPACE_RE.sub("", part) for part in _PLUS_RE.split(side)) if s]
+        for side in _ARROW_RE.split(text)
+    ]
+
+
+# ===================== 解析 =====================
+
+def _split_charge(tokens: List[Token]) -> Tuple[List[Token], int]:
+    """从末尾拆分电荷，返回 (化学式记号, 电荷)"""
+    if not tokens or tokens[-1][0] != "SIGN":
+        return tokens, 0
+
+    end = len(tokens)
+    while end > 0 and tokens[end - 1][0] == "SIGN":
+        end -= 1
+    signs = {t[1].replace("−", "-") for t in tokens[end:]}
+    if len(signs) > 1:
+        raise ChemParseError("无法识别的电荷")
+    sign = 1 if signs == {"+"} else -1
+    repeated = len(tokens) - end
+
+    if end >= 2 and tokens[end - 1][0] == "NUMBER" and tokens[end - 2][0] == "CARET":
+        # 显式记法 ^2+
+        return tokens[:end - 2], sign * int(tokens[end - 1][1])
+    if end >= 1 and tokens[end - 1][0] == "CARET":
+        return tokens[:end - 1], sign * repeated
+    if repeated > 1 or end == 0 or tokens[end - 1][0] != "NUMBER":
+        # Fe++、OH-
+        return tokens[:end], sign * repeated
+
+    # 2+ 这类写法中数字可能是下标也可能是电荷：
+    # 多位数字时最后一位是电荷（SO42- → SO₄²⁻）；
+    # 单原子离子或配离子方括号后的单个数字是电荷（Fe3+ → Fe³⁺，[Fe(CN)6]4- → [Fe(CN)₆]⁴⁻）；
+    # 其余视为下标（NH4+ → NH₄⁺）
+    digits = tokens[end - 1][1]
+    body = tokens[:end - 1]
+    if len(digits) > 1:
+        return body + [("NUMBER", digits[:-1])], sign * int(digits[-1])
+    if (len(body) == 1 and body[0][0] == "ELEMENT") or (body and body[-1] == ("CLOSE", "]")):
+        return body, sign * int(digits)
+    return tokens[:end], sign
+
+
+def _parse_group(tokens: List[Token], pos: int) -> Tuple[Dict[int, int], int]:
+    """递归下降解析：group := ((ELEMENT | OPEN group CLOSE) NUMBER?)*"""
+    counts: Dict[int, int] = {}
+    while pos < len(tokens) and tokens[pos][0] != "CLOSE":
+        kind, value = tokens[pos]
+        if kind == "ELEMENT":
+            index = ELEMENT_INDEX.get(value)
+            if index is None:
+                raise ChemParseError(f"未知元素: {value}")
+            inner = {index: 1}
+            pos += 1
+        elif kind == "OPEN":
+            inner, pos = _parse_group(tokens, pos + 1)
+            if pos >= len(tokens) or not inner:
+                raise ChemParseError("括号不匹配")
+            pos += 1
+        else:
+            raise ChemParseError(f"无法识别的化学式记号: {value}")
+
+        n = 1
+        if pos < len(tokens) and tokens[pos][0] == "NUMBER":
+            n = int(tokens[pos][1])
+            pos += 1
+        for e, k in inner.items():
+            counts[e] = counts.get(e, 0) + k * n
+    return counts, pos
+
+
+def _format_tokens(tokens: List[Token]) -> str:
+    return "".join("·" if kind == "DOT" else value for kind, value in tokens)
+
+
+# 驻留表：与解析缓存容量相同，按 LRU 淘汰，自由输入的化学式不会让内存无限增长
+_INTERNED: "OrderedDict[Tuple[str, int], Species]" = OrderedDict()
+_INTERNED_LOCK = threading.Lock()
+
+
+def _intern(formula: str, counts: Dict[int, int], charge: int) -> Species:
+    key = (formula, charge)
+    with _INTERNED_LOCK:
+        species = _INTERNED.get(key)
+        if species is not None:
+            _INTERNED.move_to_end(key)
+            return species
+    elements = tuple(sorted(counts))
+    species = Species(
+        formula=sys.intern(formula),
+        elements=elements,
+        counts=tuple(counts[e] for e in elements),
+        charge=charge,
+    )
+    with _INTERNED_LOCK:
+        species = _INTERNED.setdefault(key, species)
+        while len(_INTERNED) > PARSE_CACHE_SIZE:
+            _INTERNED.popitem(last=False)
+    return species
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_term(text: str) -> Tuple[int, Species]:
+    """
+    解析方程式中的一项，返回 (系数, 物质)
+
+    Examples:
+        "2H2O" → (2, H2O)；"CuSO4·5H2O"；"Fe3+"；"SO4^2-"；"[Fe(CN)6]4-"；"e-"、"e⁻"
+
+    Raises:
+        ChemParseError: 无法解析
+    """
+    tokens = tokenize(text)
+    coefficient = 1
+    if tokens and tokens[0][0] == "NUMBER":
+        coefficient = int(tokens[0][1])
+        tokens = tokens[1:]
+    if not tokens:
+        raise ChemParseError(f"物质为空: {text}")
+
+    if tokens[0][0] == "ELECTRON":
+        # e-、e^-（上标 e⁻ 经 _normalize 后为 e^-）
+        if [kind for kind, _ in tokens[1:]] not in (["SIGN"], ["CARET", "SIGN"]):
+            raise ChemParseError(f"无法识别的化学式: {text}")
+        return coefficient, _intern("e", {}, -1)
+
+    tokens, charge = _split_charge(tokens)
+
+    # 按结晶水分隔符拆分，每部分可带前置倍数（·5H2O）
+    counts: Dict[int, int] = {}
+    parts: List[List[Token]] = [[]]
+    for token in tokens:
+        if token[0] == "DOT":
+            parts.append([])
+        else:
+            parts[-1].append(token)
+    for part in parts:
+        multiplier = 1
+        if part and part[0][0] == "NUMBER":
+            multiplier = int(part[0][1])
+            part = part[1:]
+        part_counts, end = _parse_group(part, 0)
+        if end != len(part):
+            raise ChemParseError(f"括号不匹配: {text}")
+        if not part_counts:
+            raise ChemParseError(f"无法识别的化学式: {text}")
+        for e, k in part_counts.items():
+            counts[e] = counts.get(e, 0) + k * multiplier
+
+    return coefficient, _intern(_format_tokens(tokens), counts, charge)
+
+
+def parse_species(text: str) -> Species:
+    """解析单个物质（忽略系数）"""
+    return parse_term(text)[1]
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_equation(text: str) -> Equation:
+    """
+    解析方程式
+
+    Args:
+        text: 方程式，如 "H2O = O2 + H2"、"Fe³⁺ + OH⁻ → Fe(OH)₃"
+
+    Raises:
+        ChemParseError: 不是恰好两侧、或含无法解析的物质
+    """
+    sides = split_equation(text)
+    if len(sides) != 2:
+        raise ChemParseError(f"方程式需要恰好一个反应箭头: {text}")
+    if not sides[0] or not sides[1]:
+        raise ChemParseError(f"方程式一侧为空: {text}")
+
+    reactants = [parse_term(s) for s in sides[0]]
+    products = [parse_term(s) for s in sides[1]]
+    terms = reactants + products
+    return Equation(
+        reactants=tuple(s for _, s in reactants),
+        products=tuple(s for _, s in products),
+        coefficients=tuple(c for c, _ in terms),
+    )
+
+
+def try_parse_equation(text: str) -> Optional[Equation]:
+    """解析方程式，无法解析时返回 None"""
+    try:
+        return parse_equation(text)
+    except ChemParseError:
+        return None
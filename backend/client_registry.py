@@ -0,0 +1,401 @@
+"""
+模型客户端注册表 - 进程级共享的 ChatOpenAI 客户端与智能体缓存
+
+- 按 (api_key, model, temperature, feature) 缓存 ChatOpenAI 与编译后的智能体
+- LRU + 空闲过期淘汰，缓存数量有上限
+- 所有客户端共享同一组 httpx 连接池，并统计连接复用情况；异步连接绑定在创建它的事件循环上，
+  因此每个事件循环（uvicorn 主循环、同步调用方的后台循环）各用一个异步连接池
+- langchain_openai / langchain 导入耗时约 2 秒，首次创建客户端时才导入，
+  健康检查、本地配平等不调用模型的路径无需承担
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Iterable, Optional
+
+import httpx
+from pydantic import SecretStr
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+logger = logging.getLogger(__name__)
+
+# ModelScope 推理服务配置
+MODELSCOPE_BASE_URL = os.getenv("CHEM_MODELSCOPE_BASE_URL", "https://api-inference.modelscope.cn/v1")
+DEFAULT_CHAT_MODEL = "Qwen/Qwen3-VL-30B-A3B-Instruct"
+DEFAULT_TEMPERATURE = 0.7
+# 确定性功能（如方程式配平）使用的低温度，保证缓存结果稳定
+DETERMINISTIC_TEMPERATURE = float(os.getenv("CHEM_DETERMINISTIC_TEMPERATURE", "0.1"))
+
+# 缓存容量与空闲过期时间（秒）
+REGISTRY_MAX_SIZE = int(os.getenv("CHEM_REGISTRY_MAX_SIZE", "64"))
+REGISTRY_IDLE_TTL = float(os.getenv("CHEM_REGISTRY_IDLE_TTL", "1800"))
+
+
+class ConnectionStats:
+    """HTTP 连接复用统计（基于 httpcore trace 扩展）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.handshake_seconds = 0.0
+
+    def _record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def _record_handshake(self, seconds: float, new_connection: bool) -> None:
+        with self._lock:
+            if new_connection:
+                self.new_connections += 1
+            self.handshake_seconds += seconds
+
+    def _make_tracer(self) -> Callable[[str, Dict[str, Any]], None]:
+        """为单个请求创建 trace 回调，记录 TCP 建连与 TLS 握手耗时"""
+        marks: Dict[str, float] = {}
+
+        def trace(name: str, info: Dict[str, Any]) -> None:
+            now = time.perf_counter()
+            if name == "connection.connect_tcp.started":
+                marks["tcp"] = now
+            elif name == "connection.connect_tcp.complete" and "tcp" in marks:
+                self._record_handshake(now - marks["tcp"], new_connection=True)
+            elif name == "connection.start_tls.started":
+                marks["tls"] = now
+            elif name == "connection.start_tls.complete" and "tls" in marks:
+                self._record_handshake(now - marks["tls"], new_connection=False)
+
+        return trace
+
+    def on_request(self, request: httpx.Request) -> None:
+        """同步客户端请求钩子"""
+        self._record_request()
+        request.extensions["trace"] = self._make_tracer()
+
+    async def on_async_request(self, request: httpx.Request) -> None:
+        """异步客户端请求钩子（httpcore 要求异步 trace 回调）"""
+        self._record_request()
+        tracer = self._make_tracer()
+
+        async def trace(name: str, info: Dict[str, Any]) -> None:
+            tracer(name, info)
+
+        request.extensions["trace"] = trace
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出统计快照"""
+        with self._lock:
+            requests = self.requests
+            new_connections = self.new_connections
+            handshake_seconds = self.handshake_seconds
+        reused = max(requests - new_connections, 0)
+        avg_handshake = handshake_seconds / new_connections if new_connections else 0.0
+        return {
+            "requests": requests,
+            "new_connections": new_connections,
+            "reused_connections": reused,
+            "reuse_ratio": reused / requests if requests else 0.0,
+            "avg_handshake_ms": avg_handshake * 1000,
+            "saved_handshake_seconds": reused * avg_handshake,
+        }
+
+
+class _LRUCache:
+    """带空闲过期的有界 LRU 缓存（线程安全）"""
+
+    def __init__(self, max_size: int, idle_ttl: float):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self._items: "OrderedDict[Hashable, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._items.get(key)
+            if entry is not None:
+                entry[1] = now
+                self._items.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # 在锁外构建，避免慢构建阻塞其他请求
+        value = factory()
+
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is not None:
+                entry[1] = now
+                return entry[0]
+            self._items[key] = [value, now]
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def _expire(self, now: float) -> None:
+        while self._items:
+            key, (_, last_used) = next(iter(self._items.items()))
+            if now - last_used <= self.idle_ttl:
+                break
+            del self._items[key]
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def discard(self, predicate: Callable[[Hashable], bool]) -> int:
+        """删除键满足条件的缓存项，返回删除数量"""
+        with self._lock:
+            keys = [key for key in self._items if predicate(key)]
+            for key in keys:
+                del self._items[key]
+        return len(keys)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class _LoopBoundTransport(httpx.AsyncBaseTransport):
+    """把请求转发到当前事件循环连接池的传输层（自身不建立连接）"""
+
+    def __init__(self, registry: "ClientRegistry"):
+        self._registry = registry
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._registry.async_transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        # 连接池由各事件循环共享，关闭转发客户端时不关闭连接池
+        pass
+
+
+class ClientRegistry:
+    """进程级模型客户端与智能体注册表"""
+
+    def __init__(self, max_size: int = REGISTRY_MAX_SIZE, idle_ttl: float = REGISTRY_IDLE_TTL):
+        self.connection_stats = ConnectionStats()
+        self._models = _LRUCache(max_size, idle_ttl)
+        self._agents = _LRUCache(max_size, idle_ttl)
+        self._http_client: Optional[httpx.Client] = None
+        self._model_async_client: Optional[httpx.AsyncClient] = None
+        self._loop_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._loop_transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._client_lock = threading.Lock()
+
+    # 连接池首次使用时创建（每个客户端加载 CA 证书约需 40ms）
+    _LIMITS = httpx.Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=120)
+    _TIMEOUT = httpx.Timeout(600, connect=10)
+
+    @property
+    def http_client(self) -> httpx.Client:
+        """同步 httpx 客户端（进程级共享连接池）"""
+        if self._http_client is None:
+            with self._client_lock:
+                if self._http_client is None:
+                    self._http_client = httpx.Client(
+                        limits=self._LIMITS,
+                        timeout=self._TIMEOUT,
+                        event_hooks={"request": [self.connection_stats.on_request]},
+                    )
+        return self._http_client
+
+    @property
+    def async_http_client(self) -> httpx.AsyncClient:
+        """当前事件循环的异步 httpx 客户端（同一循环内共享连接池，需在事件循环中调用）"""
+        loop = asyncio.get_running_loop()
+        client = self._loop_async_clients.get(loop)
+        if client is None:
+            with self._client_lock:
+                client = self._loop_async_clients.get(loop)
+                if client is None:
+                    client = self._loop_async_clients[loop] = self._new_async_client(self._transport_for(loop))
+        return client
+
+    @property
+    def async_transport(self) -> httpx.AsyncHTTPTransport:
+        """当前事件循环的异步连接池（与 async_http_client 共用，需在事件循环中调用）"""
+        loop = asyncio.get_running_loop()
+        transport = self._loop_transports.get(loop)
+        if transport is None:
+            with self._client_lock:
+                transport = self._transport_for(loop)
+        return transport
+
+    def _transport_for(self, loop: asyncio.AbstractEventLoop) -> httpx.AsyncHTTPTransport:
+        """获取（必要时创建）事件循环的连接池（调用方需持有锁）"""
+        transport = self._loop_transports.get(loop)
+        if transport is None:
+            transport = self._loop_transports[loop] = httpx.AsyncHTTPTransport(limits=self._LIMITS)
+        return transport
+
+    def _new_async_client(self, transport: httpx.AsyncBaseTransport) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=self._TIMEOUT,
+            event_hooks={"request": [self.connection_stats.on_async_request]},
+        )
+
+    @property
+    def model_async_client(self) -> httpx.AsyncClient:
+        """
+        交给 ChatOpenAI 的异步客户端
+
+        ChatOpenAI 可能在工作线程中构建、在任一事件循环中调用，请求在调用时由传输层转发到当前循环的连接池。
+        不读取代理环境变量：代理传输层会绑定在首个使用它的事件循环上。
+        """
+        if self._model_async_client is None:
+            with self._client_lock:
+                if self._model_async_client is None:
+                    self._model_async_client = httpx.AsyncClient(
+                        transport=_LoopBoundTransport(self),
+                        timeout=self._TIMEOUT,
+                        trust_env=False,
+                        event_hooks={"request": [self.connection_stats.on_async_request]},
+                    )
+        return self._model_async_client
+
+    def get_model(
+        self,
+        api_key: str,
+        feature: str,
+        model: str = DEFAULT_CHAT_MODEL,
+        temperature: float = DEFAULT_TEMPERATURE,
+    ) -> "ChatOpenAI":
+        """
+        获取（或创建）共享连接池的 ChatOpenAI 客户端
+
+        Args:
+            api_key: ModelScope API密钥
+            feature: 功能标识（如 "explain"、"balance"）
+            model: 模型名称
+            temperature: 采样温度
+
+        Returns:
+            ChatOpenAI 实例
+        """
+        key = (api_key, model, temperature, feature)
+
+        def build() -> "ChatOpenAI":
+            from langchain_openai import ChatOpenAI
+
+            return ChatOpenAI(
+                api_key=SecretStr(api_key),
+                model=model,
+                base_url=MODELSCOPE_BASE_URL,
+                temperature=temperature,
+                http_client=self.http_client,
+                http_async_client=self.model_async_client,
+                # 重试由 resilience 模块统一处理
+                max_retries=0,
+            )
+
+        return self._models.get_or_create(key, build)
+
+    def get_agent(
+        self,
+        api_key: str,
+        feature: str,
+        system_prompt: str,
+        model: str = DEFAULT_CHAT_MODEL,
+        temperature: float = DEFAULT_TEMPERATURE,
+    ):
+        """
+        获取（或创建并编译）指定功能的智能体
+
+        Args:
+            api_key: ModelScope API密钥
+            feature: 功能标识
+            system_prompt: 系统提示词
+            model: 模型名称
+            temperature: 采样温度
+
+        Returns:
+            编译后的智能体
+        """
+        prompt_digest = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+        key = (api_key, model, temperature, feature, prompt_digest)
+
+        def build():
+            from langchain.agents import create_agent
+
+            return create_agent(
+                model=self.get_model(api_key, feature, model, temperature),
+                system_prompt=system_prompt,
+            )
+
+        return self._agents.get_or_create(key, build)
+
+    def clear(self) -> None:
+        """清空缓存的客户端与智能体（连接池保留）"""
+        self._models.clear()
+        self._agents.clear()
+
+    def discard(self, api_key: str) -> None:
+        """删除指定密钥的客户端与智能体（如预热使用的占位密钥）"""
+        self._models.discard(lambda key: key[0] == api_key)
+        self._agents.discard(lambda key: key[0] == api_key)
+
+    async def warm_up(self, urls: Iterable[str], connections: int = 1, timeout: float = 10) -> None:
+        """
+        预先建立到上游的连接（DNS 解析、TCP 建连与 TLS 握手），连接保留在连接池中复用
+
+        Args:
+            urls: 上游地址，任何 HTTP 响应（包括 4xx）都视为连接成功
+            connections: 每个地址并发建立的连接数（异步连接池）
+            timeout: 单个请求的超时时间（秒）
+
+        Raises:
+            httpx.HTTPError: 无法连接上游
+        """
+        urls = list(urls)
+
+        async def touch(url: str) -> None:
+            response = await self.async_http_client.get(url, timeout=timeout)
+            await response.aread()
+
+        def touch_sync(url: str) -> None:
+            self.http_client.get(url, timeout=timeout).read()
+
+        await asyncio.gather(
+            *(touch(url) for url in urls for _ in range(max(1, connections))),
+            # 同步客户端供 Gradio 与命令行调用，每个地址预热一个连接
+            *(asyncio.to_thread(touch_sync, url) for url in urls),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """导出注册表统计信息"""
+        return {
+            "models": self._models.snapshot(),
+            "agents": self._agents.snapshot(),
+            "connections": self.connection_stats.snapshot(),
+        }
+
+
+# 进程级单例
+registry = ClientRegistry()
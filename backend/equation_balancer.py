@@ -3,35 +3,29 @@
 """
 
 import logging
+from typing import AsyncIterator, Optional, Tuple
 
-from langchain.agents import create_agent
-from pydantic import SecretStr
-from langchain_openai import ChatOpenAI
+try:
+    from .client_registry import registry, DETERMINISTIC_TEMPERATURE
+    from .prompts import prompts
+    from .resilience import agent_text_chunks, resilience, UPSTREAM_CHAT
+    from .stoichiometry import (
+        BalanceResult, balance, FormulaParseError, NoSolutionError, AmbiguousBalanceError,
+    )
+except ImportError:
+    from backend.client_registry import registry, DETERMINISTIC_TEMPERATURE
+    from backend.prompts import prompts
+    from backend.resilience import agent_text_chunks, resilience, UPSTREAM_CHAT
+    from backend.stoichiometry import (
+        BalanceResult, balance, FormulaParseError, NoSolutionError, AmbiguousBalanceError,
+    )
 
 logger = logging.getLogger(__name__)
 
+# 采样温度（参与结果缓存键）
+TEMPERATURE = DETERMINISTIC_TEMPERATURE
 
-def balance_equation(equation: str, api_key: str) -> str:
-    """
-    化学方程式自动配平
-    
-    Args:
-        equation: 未配平的方程式
-        api_key: ModelScope API密钥（必需）
-        
-    Returns:
-        配平结果 {"balanced_equation": "...", "steps": [...]}
-    """
-    try:
-        
-        model =  ChatOpenAI(
-            api_key=SecretStr(api_key),
-            model="Qwen/Qwen3-VL-30B-A3B-Instruct",
-            base_url="https://api-inference.modelscope.cn/v1",
-            temperature=0.7
-        )
-        
-        system_prompt = """
+SYSTEM_PROMPT = """
         
         你是一位中学化学教学专家，专门帮助教师检查、修正并配平化学方程式。用户会输入一个未配平的化学方程式，通常使用等号“=”代替反应箭头（如 “H2O = O2 + H2”）。你的任务是：准确理解用户意图，将输入自动转换为规范化学表达，判断反应合理性，必要时补充缺失物质，完成配平，并分步讲解过程。
 
@@ -97,29 +91,193 @@ def balance_equation(equation: str, api_key: str) -> str:
         现在，请根据用户输入，生成符合上述规范的配平与教学说明。
         
         """
-        
-        agent = create_agent(
-            model=model,
-            system_prompt=system_prompt,
-        )
 
-        logger.info(f"[配平方程式] 开始处理: {equation}")
+# 精简版：去掉下标渲染规则（由本地后处理统一转换），示例只保留一个
+COMPACT_SYSTEM_PROMPT = """
+    你是中学化学教学专家，帮助教师检查、修正并配平化学方程式。用户输入通常用“=”代替箭头、用普通数字代替下标，这是输入设备限制，不视为错误。
+
+    规则：
+    - 原子不守恒说明物质缺失，按常见反应合理补充；常规条件下不能发生的反应在【教学提示】中说明条件；输入明显错误（如 “H2O = Au”）时礼貌指出并引导。
+    - 按顺序输出：【原始输入】（“=”改为“→”）、【问题诊断】（仅当存在原子不守恒、反应不可行、物质缺失时输出）、【修正后方程式】、【配平结果】、【配平步骤】（分步、适合课堂讲解）、【教学提示】（实验、误区、安全）。
+    - 面向乡村中学，语言简洁温暖，不超纲，不推荐危险操作。
+    - 化学式直接用普通数字书写，程序会自动转为下标。
+
+    示例：用户输入 `H2O = O2 + H2`
+    【原始输入】H2O → O2 + H2
+    【配平结果】2H2O → 2H2 + O2
+    【配平步骤】
+    1. 右边 O2 含2个氧原子，左边 H2O 只有1个氧，左边配2；
+    2. 左边现含4个氢原子，右边 H2 配2使氢守恒。
+    【教学提示】该反应需电解水实现，演示时可用霍夫曼电解器，注意氢气验纯防爆。
+    """
+
+PROMPT = prompts.register("balance", SYSTEM_PROMPT, COMPACT_SYSTEM_PROMPT, postprocess=True)
+SYSTEM_PROMPT = PROMPT.text
+
+
+def _build_agent(api_key: str):
+    """获取配平方程式使用的智能体（进程级缓存，复用连接池）"""
+    return registry.get_agent(
+        api_key=api_key,
+        feature="balance",
+        system_prompt=SYSTEM_PROMPT,
+        temperature=TEMPERATURE,
+    )
+
+
+# 本地配平校验结果附加给大模型的说明（参与结果缓存键）
+LOCAL_CHECK_PROMPTS = {
+    "balanced": "程序已按原子守恒与电荷守恒精确配平，【配平结果】必须为：{balanced}。请据此给出配平步骤与教学提示。",
+    "no_solution": "程序校验：{reason}，仅调整系数无法配平，请检查是否缺少或写错物质。",
+    "ambiguous": "程序校验：{reason}（可能是几个反应的叠加），请在【问题诊断】中说明，并给出教学中最常见的一组。",
+}
+
+
+def _local_check(equation: str) -> Tuple[Optional[BalanceResult], Optional[str]]:
+    """
+    本地精确配平
+
+    Returns:
+        (配平结果, 附加给大模型的校验说明)；无解或有多组解时配平结果为 None，
+        无法解析时两者均为 None，完全交由大模型处理
+    """
+    try:
+        result = balance(equation)
+    except FormulaParseError as e:
+        logger.info(f"[本地配平] 无法解析，交由大模型处理: {str(e)}")
+        return None, None
+    except AmbiguousBalanceError as e:
+        logger.info(f"[本地配平] {str(e)}")
+        return None, LOCAL_CHECK_PROMPTS["ambiguous"].format(reason=str(e))
+    except NoSolutionError as e:
+        logger.info(f"[本地配平] {str(e)}")
+        return None, LOCAL_CHECK_PROMPTS["no_solution"].format(reason=str(e))
+
+    logger.info(f"[本地配平] {result.render()}")
+    return result, LOCAL_CHECK_PROMPTS["balanced"].format(balanced=result.render())
+
+
+def _format_local_result(result: BalanceResult) -> str:
+    """不调用大模型时的配平结果文本"""
+    return f"【原始输入】{result.render_input()}\n【配平结果】{result.render()}"
+
+
+def local_balance_equation(equation: str) -> Optional[str]:
+    """
+    仅使用本地引擎配平（不调用大模型，微秒级）
+
+    Returns:
+        配平结果文本，无法本地配平时返回 None
+    """
+    result, _ = _local_check(equation)
+    return _format_local_result(result) if result is not None else None
+
+
+def _build_input(equation: str, check: Optional[str] = None) -> dict:
+    """构建智能体输入消息，附带本地配平校验说明"""
+    prompt = f"请将给定的方程式进行配平：{equation}"
+    if check:
+        prompt += f"\n\n（{check}）"
+    return {"messages": [{"role": "user", "content": prompt}]}
+
+
+def balance_equation(equation: str, api_key: str, narrative: bool = True) -> str:
+    """
+    化学方程式自动配平
+    
+    系数由本地引擎精确计算，大模型只负责配平步骤与教学讲解；
+    本地无法解析时完全交由大模型处理。
+    
+    Args:
+        equation: 未配平的方程式
+        api_key: ModelScope API密钥（必需）
+        narrative: 是否生成教学讲解；为 False 且本地可配平时不调用大模型
         
-        prompt = f"请将给定的方程式进行配平：{equation}"
+    Returns:
+        配平结果 {"balanced_equation": "...", "steps": [...]}
+    """
+    try:
+        logger.info(f"[配平方程式] 开始处理: {equation}")
+        result, check = _local_check(equation)
+        if result is not None and not narrative:
+            return _format_local_result(result)
+
+        agent = _build_agent(api_key)
         
         logger.info(f"[调用大模型] 配平方程式开始处理，请等待...")
-        response = agent.invoke(
-            {"messages": [{"role": "user", "content": prompt}]},
-        )
+        response = resilience.call(UPSTREAM_CHAT, lambda: agent.invoke(_build_input(equation, check)))
         logger.info(f"[大模型回复] 配平方程式完成")
         
         # 提取大模型返回的文本内容
-        return response["messages"][-1].content
+        return prompts.postprocess("balance", response["messages"][-1].content)
 
     except Exception as e:
         logger.error(f"配平方程式失败: {str(e)}")
         raise
+
+
+async def abalance_equation(equation: str, api_key: str, narrative: bool = True) -> str:
+    """
+    化学方程式自动配平（异步版本，不阻塞事件循环）
     
+    Args:
+        equation: 未配平的方程式
+        api_key: ModelScope API密钥（必需）
+        narrative: 是否生成教学讲解
+        
+    Returns:
+        配平结果
+    """
+    try:
+        logger.info(f"[配平方程式] 开始处理: {equation}")
+        result, check = _local_check(equation)
+        if result is not None and not narrative:
+            return _format_local_result(result)
+
+        agent = _build_agent(api_key)
+        
+        logger.info(f"[调用大模型] 配平方程式开始处理，请等待...")
+        response = await resilience.acall(UPSTREAM_CHAT, lambda: agent.ainvoke(_build_input(equation, check)))
+        logger.info(f"[大模型回复] 配平方程式完成")
+        
+        return prompts.postprocess("balance", response["messages"][-1].content)
+
+    except Exception as e:
+        logger.error(f"配平方程式失败: {str(e)}")
+        raise
+
+
+async def astream_balance_equation(equation: str, api_key: str, narrative: bool = True) -> AsyncIterator[str]:
+    """
+    化学方程式自动配平（流式版本，逐段产出模型生成的文本）
+    
+    Args:
+        equation: 未配平的方程式
+        api_key: ModelScope API密钥（必需）
+        narrative: 是否生成教学讲解
+        
+    Yields:
+        文本片段
+    """
+    try:
+        logger.info(f"[配平方程式] 开始处理: {equation}（流式）")
+        result, check = _local_check(equation)
+        if result is not None and not narrative:
+            yield _format_local_result(result)
+            return
+
+        agent = _build_agent(api_key)
+        
+        chunks = resilience.astream(UPSTREAM_CHAT, lambda: agent_text_chunks(agent, _build_input(equation, check)))
+        async for text in prompts.postprocess_stream("balance", chunks):
+            yield text
+        logger.info(f"[大模型回复] 配平方程式完成（流式）")
+        
+    except Exception as e:
+        logger.error(f"配平方程式失败: {str(e)}")
+        raise
+
+
 if __name__ == "__main__":
     
     import os
@@ -0,0 +1,82 @@
+"""
+执行器模块 - 同步/异步调用桥接
+
+- run_sync: 在有界线程池中执行仍为同步实现的调用，避免阻塞事件循环
+- run_coroutine_sync: 供同步调用方（Gradio、命令行脚本）在常驻后台事件循环中执行协程
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Coroutine, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 同步调用线程池大小（可通过环境变量调整）
+MAX_SYNC_WORKERS = int(os.getenv("CHEM_SYNC_WORKERS", "16"))
+
+_sync_executor = ThreadPoolExecutor(
+    max_workers=MAX_SYNC_WORKERS,
+    thread_name_prefix="chem-sync",
+)
+
+_background_loop: Optional[asyncio.AbstractEventLoop] = None
+_background_lock = threading.Lock()
+
+
+async def run_sync(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    在有界线程池中执行同步函数
+
+    Args:
+        func: 同步函数
+        *args, **kwargs: 函数参数
+
+    Returns:
+        函数返回值
+    """
+    loop = asyncio.get_running_loop()
+    # 复制上下文变量，保证日志/追踪等上下文在线程中可见
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(_sync_executor, call)
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """获取（必要时启动）常驻后台事件循环"""
+    global _background_loop
+
+    with _background_lock:
+        if _background_loop is None or _background_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever,
+                name="chem-async-loop",
+                daemon=True,
+            )
+            thread.start()
+            _background_loop = loop
+            logger.info("后台事件循环已启动")
+        return _background_loop
+
+
+def run_coroutine_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """
+    在常驻后台事件循环中执行协程并阻塞等待结果
+
+    所有同步调用方共享同一个事件循环，异步HTTP连接池可以跨调用复用。
+
+    Args:
+        coro: 待执行的协程
+
+    Returns:
+        协程返回值
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_background_loop())
+    return future.result()
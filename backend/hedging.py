@@ -0,0 +1,186 @@
+"""
+对冲请求模块 - 降低文本功能的尾延迟
+
+首次上游调用在最近单次调用延迟的 CHEM_HEDGE_PERCENTILE 分位内未返回时，
+再发起一次相同的调用；先成功返回的结果生效，另一个调用被取消。
+
+- 默认关闭，CHEM_HEDGE_ENABLED=1 开启，CHEM_HEDGE_FEATURES 指定参与的功能（默认讲解与配平）
+- 额外调用受预算限制：每次调用积累 CHEM_HEDGE_BUDGET 个额度，每次对冲消耗 1 个，
+  长期额外调用比例不超过该值（上游整体变慢时不会把请求量翻倍）
+- 样本不足 CHEM_HEDGE_MIN_SAMPLES 时不对冲
+- 一个调用失败时等待另一个，两个都失败才抛出异常
+
+统计：额外调用次数与比例、对冲调用胜出次数，以及单次调用 p99 与对冲后实际 p99 的差值。
+被取消的慢调用不计入单次调用样本，因此节省的 p99 是保守估计。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+try:
+    from .metrics import latency
+except ImportError:
+    from backend.metrics import latency
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HEDGE_ENABLED = os.getenv("CHEM_HEDGE_ENABLED", "0") == "1"
+HEDGE_FEATURES = tuple(f.strip() for f in os.getenv("CHEM_HEDGE_FEATURES", "explain,balance").split(",") if f.strip())
+# 触发对冲的延迟分位、额外调用预算比例、最少样本数、最短对冲等待（秒）
+HEDGE_PERCENTILE = float(os.getenv("CHEM_HEDGE_PERCENTILE", "95"))
+HEDGE_BUDGET = float(os.getenv("CHEM_HEDGE_BUDGET", "0.1"))
+HEDGE_MIN_SAMPLES = int(os.getenv("CHEM_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("CHEM_HEDGE_MIN_DELAY", "0.2"))
+# 预算额度上限（空闲后允许的连续对冲次数）
+HEDGE_BUDGET_CAP = 10.0
+
+
+class _FeatureHedge:
+    """单个功能的对冲状态与统计"""
+
+    def __init__(self):
+        self.budget = 0.0
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+
+class Hedger:
+    """对冲请求执行器"""
+
+    def __init__(
+        self,
+        enabled: bool = HEDGE_ENABLED,
+        features: Tuple[str, ...] = HEDGE_FEATURES,
+        percentile: float = HEDGE_PERCENTILE,
+        budget: float = HEDGE_BUDGET,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        min_delay: float = HEDGE_MIN_DELAY,
+    ):
+        """
+        Args:
+            enabled: 是否开启对冲
+            features: 参与对冲的功能
+            percentile: 触发对冲的单次调用延迟分位（0-100）
+            budget: 额外调用预算比例（如 0.1 表示最多增加 10% 的上游调用）
+            min_samples: 开始对冲前需要的单次调用样本数
+            min_delay: 最短对冲等待时间（秒）
+        """
+        self.enabled = enabled
+        self.features = features
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self._features: Dict[str, _FeatureHedge] = {}
+
+    def _state(self, feature: str) -> _FeatureHedge:
+        state = self._features.get(feature)
+        if state is None:
+            state = self._features[feature] = _FeatureHedge()
+        return state
+
+    def delay(self, feature: str) -> Optional[float]:
+        """当前的对冲等待时间（秒），未开启或样本不足时返回 None"""
+        if not self.enabled or feature not in self.features:
+            return None
+        tracker = latency(f"{feature}.upstream")
+        if tracker.count < self.min_samples:
+            return None
+        return max(self.min_delay, tracker.percentile(self.percentile))
+
+    async def run(self, feature: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        执行上游调用，必要时发起对冲调用
+
+        Args:
+            feature: 功能标识（如 "explain"）
+            factory: 创建上游调用协程的函数（每次调用创建一个新协程）
+        """
+        state = self._state(feature)
+        state.calls += 1
+        state.budget = min(HEDGE_BUDGET_CAP, state.budget + self.budget)
+        start = time.perf_counter()
+        delay = self.delay(feature)
+
+        primary = asyncio.ensure_future(self._timed(feature, factory))
+        tasks = [primary]
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    if state.budget >= 1:
+                        state.budget -= 1
+                        state.hedged += 1
+                        logger.info(f"[对冲请求] {feature} 超过 {delay:.2f}s 未返回，发起对冲调用")
+                        tasks.append(asyncio.ensure_future(self._timed(feature, factory)))
+                    else:
+                        state.budget_denied += 1
+            result, winner = await self._first_success(tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        if winner is not primary:
+            state.hedge_wins += 1
+        latency(f"{feature}.hedged").observe(time.perf_counter() - start)
+        return result
+
+    @staticmethod
+    async def _timed(feature: str, factory: Callable[[], Awaitable[T]]) -> T:
+        """执行单次调用，并记录成功调用的耗时（作为对冲分位的样本）"""
+        start = time.perf_counter()
+        result = await factory()
+        latency(f"{feature}.upstream").observe(time.perf_counter() - start)
+        return result
+
+    @staticmethod
+    async def _first_success(tasks: List[asyncio.Future]) -> Tuple[Any, asyncio.Future]:
+        """等待第一个成功的调用；全部失败时抛出最先出现的异常"""
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=tasks.index):
+                if task.cancelled():
+                    continue
+                if task.exception() is None:
+                    return task.result(), task
+                error = error or task.exception()
+        raise error or asyncio.CancelledError()
+
+    def stats(self) -> Dict[str, Any]:
+        """导出对冲统计"""
+        features = {}
+        for name, state in sorted(self._features.items()):
+            single = latency(f"{name}.upstream").percentile(99)
+            observed = latency(f"{name}.hedged").percentile(99)
+            features[name] = {
+                "calls": state.calls,
+                "extra_calls": state.hedged,
+                "extra_ratio": state.hedged / state.calls if state.calls else 0.0,
+                "hedge_wins": state.hedge_wins,
+                "budget_denied": state.budget_denied,
+                "delay": self.delay(name),
+                "p99_single": single,
+                "p99_observed": observed,
+                "p99_saved": single - observed if single is not None and observed is not None else None,
+            }
+        return {
+            "enabled": self.enabled,
+            "features": list(self.features),
+            "percentile": self.percentile,
+            "budget": self.budget,
+            "stats": features,
+        }
+
+
+# 进程级单例
+hedger = Hedger()
@@ -0,0 +1,304 @@
+"""
+图像预处理模块 - 物质识别上传前的压缩
+
+手机照片通常有 4–12 MB，直接转成 base64 会再膨胀 1/3，在慢速网络下上传很慢。
+识别前统一处理：
+- 按 EXIF 方向自动旋转
+- 缩小到视觉模型的有效分辨率（最长边 CHEM_IMAGE_MAX_SIDE）
+- 重新编码为 JPEG / WebP，逐级降低质量直到不超过目标大小，同时去掉 EXIF 等元数据
+- 已在限制内（尺寸、大小）且不含 EXIF 的 JPEG / PNG / WebP 原样发送，不再重新编码
+
+解码与编码在进程池中执行，大图不会占用主进程的 GIL。
+依赖 Pillow；未安装或图片无法解码时原样发送。
+"""
+
+import asyncio
+import base64
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+try:
+    from PIL import Image, ImageOps
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+try:
+    from .executor import run_sync
+    from .metrics import latency
+    from .recognition_cache import decode_data_url
+except ImportError:
+    from backend.executor import run_sync
+    from backend.metrics import latency
+    from backend.recognition_cache import decode_data_url
+
+logger = logging.getLogger(__name__)
+
+# 最长边像素、目标大小（KB）、输出格式（JPEG / WEBP）
+IMAGE_MAX_SIDE = int(os.getenv("CHEM_IMAGE_MAX_SIDE", "1280"))
+IMAGE_TARGET_KB = int(os.getenv("CHEM_IMAGE_TARGET_KB", "300"))
+IMAGE_FORMAT = os.getenv("CHEM_IMAGE_FORMAT", "JPEG").upper()
+# 预处理进程数，设为 0 则在线程池中执行
+IMAGE_PREPROCESS_WORKERS = int(os.getenv("CHEM_IMAGE_PREPROCESS_WORKERS", "2"))
+
+# 逐级尝试的编码质量；最低质量仍超出目标时缩小尺寸重试
+QUALITY_STEPS = (85, 75, 65, 55, 45)
+SHRINK_FACTOR = 0.75
+MIN_SIDE = 512
+
+_MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+# 满足限制时可原样发送的格式
+_PASSTHROUGH_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+
+class ImagePreprocessError(ValueError):
+    """图片无法解码"""
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """预处理后的图片"""
+    data: bytes
+    media_type: str
+    width: int
+    height: int
+    # 编码质量；原样发送时为 None
+    quality: Optional[int]
+    original_size: int
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.media_type};base64,{base64.b64encode(self.data).decode('ascii')}"
+
+
+def prepare_image(
+    data: bytes,
+    max_side: int = IMAGE_MAX_SIDE,
+    target_bytes: int = IMAGE_TARGET_KB * 1024,
+    image_format: str = IMAGE_FORMAT,
+) -> PreparedImage:
+    """
+    自动旋转、缩小并重新编码图片（同步，可在子进程中执行）
+
+    Args:
+        data: 原始图片字节
+        max_side: 最长边像素
+        target_bytes: 目标大小（字节），尽量不超过
+        image_format: 输出格式，JPEG 或 WEBP
+
+    Returns:
+        预处理后的图片；已在限制内且不含 EXIF（无需旋转、无元数据）时为原图字节
+
+    Raises:
+        ImagePreprocessError: 图片无法解码
+    """
+    if image_format not in _MEDIA_TYPES:
+        raise ValueError(f"不支持的输出格式: {image_format}")
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            # 只读取文件头即可判断，无需解码像素
+            if (
+                len(data) <= target_bytes
+                and max(source.size) <= max_side
+                and source.format in _PASSTHROUGH_TYPES
+                and not source.getexif()
+            ):
+                return PreparedImage(
+                    data=data,
+                    media_type=_PASSTHROUGH_TYPES[source.format],
+                    width=source.width,
+                    height=source.height,
+                    quality=None,
+                    original_size=len(data),
+                )
+            # JPEG 按接近目标的尺寸解码，12MP 照片可省去大部分解码开销
+            source.draft("RGB", (max_side, max_side))
+            image = ImageOps.exif_transpose(source)
+            if image.mode not in ("RGB", "L"):
+                # 透明背景铺白，避免转 RGB 后变黑
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.getchannel("A"))
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise ImagePreprocessError(f"图片无法解码: {str(e)}") from e
+
+    while True:
+        for quality in QUALITY_STEPS:
+            buffer = io.BytesIO()
+            # 不传 exif / icc_profile，输出不含元数据
+            image.save(buffer, image_format, quality=quality, optimize=True)
+            if buffer.tell() <= target_bytes:
+                break
+        if buffer.tell() <= target_bytes or max(image.size) <= MIN_SIDE:
+            break
+        image = image.resize(
+            (max(1, int(image.width * SHRINK_FACTOR)), max(1, int(image.height * SHRINK_FACTOR))),
+            Image.Resampling.LANCZOS,
+        )
+
+    return PreparedImage(
+        data=buffer.getvalue(),
+        media_type=_MEDIA_TYPES[image_format],
+        width=image.width,
+        height=image.height,
+        quality=quality,
+        original_size=len(data),
+    )
+
+
+class ImagePreprocessor:
+    """图片预处理器（进程池执行，统计压缩效果）"""
+
+    def __init__(self, workers: int = IMAGE_PREPROCESS_WORKERS):
+        """
+        Args:
+            workers: 进程数，为 0 时在线程池中执行
+        """
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+        self.images = 0
+        self.failures = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """首次使用时创建进程池（spawn，避免在多线程进程中 fork）"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                logger.info(f"[图像预处理] 进程池已启动: {self.workers} 个进程")
+            return self._pool
+
+    async def warm_up(self) -> None:
+        """预先启动全部子进程（spawn 启动需要数秒，避免计入首个请求）"""
+        if self.workers <= 0 or not HAS_PIL:
+            return
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        await asyncio.gather(*(loop.run_in_executor(pool, os.getpid) for _ in range(self.workers)))
+
+    def prepare(self, image_url: str) -> str:
+        """预处理 data URL（同步，在当前线程中执行）"""
+        data = decode_data_url(image_url)
+        if data is None or not HAS_PIL:
+            return image_url
+        start = time.perf_counter()
+        try:
+            prepared = prepare_image(data)
+        except ImagePreprocessError as e:
+            self._record_failure(e)
+            return image_url
+        self._record(prepared, start)
+        return prepared.data_url if prepared.quality is not None else image_url
+
+    async def aprepare(self, image_url: str) -> str:
+        """
+        预处理 data URL（异步，在进程池中执行）
+
+        Args:
+            image_url: 图片地址；普通 URL 原样返回
+
+        Returns:
+            压缩后的 data URL，无法处理或无需处理时返回原地址
+        """
+        data = decode_data_url(image_url)
+        if data is None or not HAS_PIL:
+            return image_url
+        prepared = await self._aprepare(data)
+        # 原样发送时直接使用原 data URL，不再重新 base64 编码
+        if prepared is None or prepared.quality is None:
+            return image_url
+        return prepared.data_url
+
+    async def aprepare_bytes(self, data: bytes, media_type: str) -> str:
+        """
+        预处理上传的图片字节并编码为 data URL（异步，在进程池中执行）
+
+        这是上传路径中唯一一次 base64 编码。
+
+        Args:
+            data: 图片文件字节
+            media_type: 图片媒体类型，无法预处理时按原图编码使用
+
+        Returns:
+            压缩后的 data URL，无法处理时返回原图的 data URL
+        """
+        prepared = await self._aprepare(data) if HAS_PIL else None
+        if prepared is not None:
+            return prepared.data_url
+        return f"data:{media_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+    async def _aprepare(self, data: bytes) -> Optional[PreparedImage]:
+        """在进程池中预处理，图片无法解码时返回 None"""
+        start = time.perf_counter()
+        try:
+            if self.workers > 0:
+                try:
+                    loop = asyncio.get_running_loop()
+                    prepared = await loop.run_in_executor(self._get_pool(), prepare_image, data)
+                except BrokenProcessPool:
+                    # 子进程异常退出：丢弃进程池（下次重建），本次改在线程池中处理
+                    logger.warning("[图像预处理] 进程池异常，改用线程池")
+                    self.shutdown()
+                    prepared = await run_sync(prepare_image, data)
+            else:
+                prepared = await run_sync(prepare_image, data)
+        except ImagePreprocessError as e:
+            self._record_failure(e)
+            return None
+        self._record(prepared, start)
+        return prepared
+
+    def stats(self) -> Dict[str, Any]:
+        """导出压缩统计"""
+        return {
+            "enabled": HAS_PIL,
+            "workers": self.workers,
+            "images": self.images,
+            "failures": self.failures,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "saved_ratio": 1 - self.bytes_out / self.bytes_in if self.bytes_in else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        """关闭进程池"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def _record(self, prepared: PreparedImage, start: float) -> None:
+        latency("recognize.preprocess").observe(time.perf_counter() - start)
+        with self._lock:
+            self.images += 1
+            self.bytes_in += prepared.original_size
+            self.bytes_out += len(prepared.data)
+        encoding = "原图" if prepared.quality is None else f"q={prepared.quality}"
+        logger.info(
+            f"[图像预处理] {prepared.original_size} → {len(prepared.data)} 字节 "
+            f"({prepared.width}x{prepared.height}, {encoding})"
+        )
+
+    def _record_failure(self, error: Exception) -> None:
+        with self._lock:
+            self.failures += 1
+        logger.warning(f"[图像预处理] {str(error)}，发送原图")
+
+
+# 进程级单例
+image_preprocessor = ImagePreprocessor()
@@ -0,0 +1,277 @@
+"""
+图像存储模块 - 生成图像的本地内容寻址存储
+
+- 工作流生成且通过图像评估的最终图像只下载一次，保存到本地目录（未通过评估的图像不保存）
+- 文件名为 sha256(规范化的用户输入 + 图像模型)，重复请求在工作流的任何模型调用之前直接命中
+- 总大小有上限，超出时按最近访问时间（LRU）淘汰
+- 由后端 /api/images/{digest} 提供访问（ETag、Range、长期缓存）
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import httpx
+
+try:
+    from .executor import run_sync
+except ImportError:
+    from backend.executor import run_sync
+
+logger = logging.getLogger(__name__)
+
+# 存储目录、总大小上限（MB）、单张图像大小上限（MB）
+IMAGE_STORE_DIR = os.getenv(
+    "CHEM_IMAGE_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "images"),
+)
+IMAGE_STORE_MAX_MB = float(os.getenv("CHEM_IMAGE_STORE_MAX_MB", "1024"))
+IMAGE_STORE_MAX_IMAGE_MB = float(os.getenv("CHEM_IMAGE_STORE_MAX_IMAGE_MB", "20"))
+
+# 对外访问路径前缀
+IMAGE_URL_PREFIX = "/api/images/"
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# 文件头 → (扩展名, 媒体类型)
+_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", ".png", "image/png"),
+    (b"\xff\xd8\xff", ".jpg", "image/jpeg"),
+    (b"GIF8", ".gif", "image/gif"),
+)
+_MEDIA_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".gif": "image/gif", ".webp": "image/webp"}
+
+
+class ImageDownloadError(Exception):
+    """图像下载失败或不是有效图像"""
+
+
+@dataclass(frozen=True)
+class StoredImage:
+    """已存储的图像"""
+    digest: str
+    path: str
+    size: int
+    media_type: str
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+    @property
+    def url(self) -> str:
+        return IMAGE_URL_PREFIX + self.digest
+
+
+def _sniff(data: bytes) -> Optional[tuple]:
+    """根据文件头识别图像格式"""
+    for signature, ext, media_type in _SIGNATURES:
+        if data.startswith(signature):
+            return ext, media_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return ".webp", "image/webp"
+    return None
+
+
+class ImageStore:
+    """内容寻址的本地图像存储（大小有界，LRU 淘汰）"""
+
+    def __init__(
+        self,
+        root: str = IMAGE_STORE_DIR,
+        max_bytes: int = int(IMAGE_STORE_MAX_MB * 1024 * 1024),
+        max_image_bytes: int = int(IMAGE_STORE_MAX_IMAGE_MB * 1024 * 1024),
+    ):
+        """
+        Args:
+            root: 存储目录
+            max_bytes: 总大小上限（字节）
+            max_image_bytes: 单张图像大小上限（字节）
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_image_bytes = max_image_bytes
+
+        self._index: "OrderedDict[str, StoredImage]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.downloads = 0
+        self.evictions = 0
+
+    @staticmethod
+    def digest(prompt: str, model: str) -> str:
+        """计算图像的内容地址：sha256(规范化的用户输入 + 图像模型)"""
+        return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, digest: str, record: bool = True) -> Optional[StoredImage]:
+        """
+        查询已存储的图像（命中时更新最近访问时间）
+
+        Args:
+            digest: 内容地址
+            record: 是否计入命中/未命中统计
+
+        Returns:
+            已存储的图像，不存在时返回 None
+        """
+        if not _DIGEST_RE.match(digest):
+            return None
+        with self._lock:
+            self._ensure_loaded()
+            image = self._index.get(digest)
+            if image is None:
+                if record:
+                    self.misses += 1
+                return None
+            self._index.move_to_end(digest)
+            if record:
+                self.hits += 1
+        try:
+            # 以修改时间记录访问顺序，重启后仍能按 LRU 淘汰
+            os.utime(image.path)
+        except OSError:
+            self._discard(digest)
+            return None
+        return image
+
+    async def aget(self, digest: str, record: bool = True) -> Optional[StoredImage]:
+        """查询已存储的图像（异步）：更新访问时间与首次扫描目录都是文件系统操作，在线程池中执行"""
+        return await run_sync(self.get, digest, record)
+
+    def local_path(self, url: str) -> Optional[str]:
+        """把 /api/images/{digest} 形式的地址映射为本地文件路径（供 Gradio 直接读取）"""
+        if not url.startswith(IMAGE_URL_PREFIX):
+            return None
+        image = self.get(url[len(IMAGE_URL_PREFIX):])
+        return image.path if image is not None else None
+
+    async def save_from_url(self, digest: str, url: str, client: httpx.AsyncClient) -> StoredImage:
+        """
+        下载远程图像并存储
+
+        Args:
+            digest: 内容地址
+            url: 远程图像URL
+            client: 共享的异步 HTTP 客户端
+
+        Raises:
+            ImageDownloadError: 下载失败、超过大小上限或不是有效图像
+        """
+        existing = await self.aget(digest, record=False)
+        if existing is not None:
+            return existing
+
+        chunks = []
+        size = 0
+        try:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > self.max_image_bytes:
+                        raise ImageDownloadError(f"图像超过大小上限 {self.max_image_bytes} 字节")
+                    chunks.append(chunk)
+        except httpx.HTTPError as e:
+            raise ImageDownloadError(f"图像下载失败: {str(e)}") from e
+
+        data = b"".join(chunks)
+        kind = _sniff(data)
+        if kind is None:
+            raise ImageDownloadError("下载内容不是有效图像")
+
+        image = await run_sync(self._write, digest, data, *kind)
+        logger.info(f"[图像存储] 已保存 {digest[:12]} ({size} 字节)")
+        return image
+
+    def warm_up(self) -> None:
+        """预先扫描存储目录建立索引，避免计入首个请求"""
+        with self._lock:
+            self._ensure_loaded()
+
+    def stats(self) -> Dict[str, Any]:
+        """导出存储统计"""
+        with self._lock:
+            self._ensure_loaded()
+            return {
+                "images": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "downloads": self.downloads,
+                "evictions": self.evictions,
+            }
+
+    # ===================== 内部实现 =====================
+
+    def _ensure_loaded(self) -> None:
+        """首次使用时扫描存储目录，按修改时间恢复 LRU 顺序（调用方需持有锁）"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.isdir(self.root):
+            return
+        entries = []
+        for name in os.listdir(self.root):
+            digest, ext = os.path.splitext(name)
+            if not _DIGEST_RE.match(digest) or ext not in _MEDIA_TYPES:
+                continue
+            path = os.path.join(self.root, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, StoredImage(digest, path, stat.st_size, _MEDIA_TYPES[ext])))
+        for _, image in sorted(entries, key=lambda e: e[0]):
+            self._index[image.digest] = image
+            self._total_bytes += image.size
+        self._evict()
+
+    def _write(self, digest: str, data: bytes, ext: str, media_type: str) -> StoredImage:
+        """原子写入文件并登记（在线程池中执行）"""
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, digest + ext)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        image = StoredImage(digest=digest, path=path, size=len(data), media_type=media_type)
+        with self._lock:
+            self._ensure_loaded()
+            previous = self._index.pop(digest, None)
+            if previous is not None:
+                self._total_bytes -= previous.size
+            self._index[digest] = image
+            self._total_bytes += image.size
+            self.downloads += 1
+            self._evict()
+        return image
+
+    def _evict(self) -> None:
+        """超出总大小上限时淘汰最久未访问的图像（调用方需持有锁）"""
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            _, image = self._index.popitem(last=False)
+            self._total_bytes -= image.size
+            self.evictions += 1
+            try:
+                os.remove(image.path)
+            except OSError:
+                pass
+
+    def _discard(self, digest: str) -> None:
+        """文件已被外部删除时移除登记"""
+        with self._lock:
+            image = self._index.pop(digest, None)
+            if image is not None:
+                self._total_bytes -= image.size
+
+
+# 进程级单例
+image_store = ImageStore()
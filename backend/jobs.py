@@ -0,0 +1,194 @@
+"""
+图像生成任务模块 - 基于任务ID的异步文生图
+
+POST 提交后立即返回任务ID，由有界的后台工作协程池执行工作流；
+客户端通过任务ID查询状态、当前执行节点和最终图像URL。
+每个任务记录一条追踪（含排队等待），trace_id 用于 python -m backend.tracing 查看时间线。
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+try:
+    from .metrics import latency
+    from .tracing import tracer
+except ImportError:
+    from backend.metrics import latency
+    from backend.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 并发执行的工作流数量、排队上限、已完成任务的保留时间（秒）
+IMAGE_JOB_WORKERS = int(os.getenv("CHEM_IMAGE_JOB_WORKERS", "4"))
+IMAGE_JOB_MAX_PENDING = int(os.getenv("CHEM_IMAGE_JOB_MAX_PENDING", "100"))
+IMAGE_JOB_TTL = float(os.getenv("CHEM_IMAGE_JOB_TTL", "3600"))
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class JobQueueFullError(Exception):
+    """任务队列已满"""
+
+
+@dataclass
+class ImageJob:
+    """文生图任务"""
+    job_id: str
+    prompt: str
+    api_key: str = field(repr=False)
+    status: str = JOB_PENDING
+    node: Optional[str] = None
+    nodes: List[str] = field(default_factory=list)
+    image_url: Optional[str] = None
+    error: Optional[str] = None
+    trace_id: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_SUCCEEDED, JOB_FAILED)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """对外展示的任务信息（不含API密钥）"""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "node": self.node,
+            "nodes": list(self.nodes),
+            "image_url": self.image_url,
+            "error": self.error,
+            "trace_id": self.trace_id,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ImageJobManager:
+    """文生图任务管理器（有界工作协程池）"""
+
+    def __init__(
+        self,
+        runner: Callable[..., Awaitable[str]],
+        workers: int = IMAGE_JOB_WORKERS,
+        max_pending: int = IMAGE_JOB_MAX_PENDING,
+        ttl: float = IMAGE_JOB_TTL,
+    ):
+        """
+        Args:
+            runner: 执行工作流的协程函数 runner(prompt, api_key, on_node) -> image_url
+            workers: 并发工作协程数量
+            max_pending: 排队任务上限
+            ttl: 已完成任务保留时间（秒）
+        """
+        self._runner = runner
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+
+        self._jobs: Dict[str, ImageJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def submit(self, prompt: str, api_key: str) -> ImageJob:
+        """
+        提交文生图任务
+
+        Raises:
+            JobQueueFullError: 排队任务已达上限
+        """
+        self._ensure_workers()
+        self._prune()
+
+        job = ImageJob(job_id=uuid.uuid4().hex, prompt=prompt, api_key=api_key)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFullError("图像生成任务队列已满，请稍后重试")
+
+        self._jobs[job.job_id] = job
+        logger.info(f"[文生图任务] 已提交 {job.job_id}")
+        return job
+
+    def get(self, job_id: str) -> Optional[ImageJob]:
+        """查询任务"""
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """导出任务统计"""
+        counts = {JOB_PENDING: 0, JOB_RUNNING: 0, JOB_SUCCEEDED: 0, JOB_FAILED: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "jobs": counts,
+        }
+
+    # ===================== 内部实现 =====================
+
+    def _ensure_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._worker_tasks:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._worker_tasks = [
+            loop.create_task(self._worker(), name=f"image-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job: ImageJob) -> None:
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        latency("image.queue_wait").observe(job.started_at - job.created_at)
+
+        def on_node(node_name: str) -> None:
+            job.node = node_name
+            job.nodes.append(node_name)
+
+        try:
+            attributes = {"job.id": job.job_id, "job.queue_wait_seconds": job.started_at - job.created_at}
+            async with tracer.atrace("image_job", attributes) as span:
+                job.trace_id = span.trace_id
+                job.image_url = await self._runner(job.prompt, job.api_key, on_node)
+            job.status = JOB_SUCCEEDED
+            logger.info(f"[文生图任务] 完成 {job.job_id}")
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = str(e)
+            logger.error(f"[文生图任务] 失败 {job.job_id}: {str(e)}")
+        finally:
+            job.finished_at = time.time()
+            # 密钥只在执行期间需要，完成后不随任务保留到过期
+            job.api_key = ""
+
+    def _prune(self) -> None:
+        """清理超过保留时间的已完成任务"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
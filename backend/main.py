@@ -1,4 +1,6 @@
 import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -6,15 +8,21 @@ from fastapi.responses import JSONResponse
 # 使用条件导入，解决直接运行时的相对导入问题
 try:
     # 当作为模块导入时（正常情况）
-    from .routes import router
+    from .routes import router, metrics_router
+    from .metrics import MetricsMiddleware
     from .models import BaseResponse
+    from .warmup import warmup
+    from .image_preprocess import image_preprocessor
 except ImportError:
     # 当直接运行时
     import sys
     import os
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from backend.routes import router
+    from backend.routes import router, metrics_router
+    from backend.metrics import MetricsMiddleware
     from backend.models import BaseResponse
+    from backend.warmup import warmup
+    from backend.image_preprocess import image_preprocessor
 
 # ===================== 日志配置 =====================
 
@@ -27,6 +35,17 @@ logger = logging.getLogger(__name__)
 
 # ===================== 应用初始化 =====================
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动时在后台预热（/api/ready 在预热完成前返回 503），关闭时释放资源"""
+    logger.info("应用启动 - 乡村化学教师AI教学助手 v2.0.0")
+    warmup.start()
+    yield
+    await warmup.stop()
+    image_preprocessor.shutdown()
+    logger.info("应用关闭")
+
+
 def create_app() -> FastAPI:
     """创建并配置FastAPI应用"""
     
@@ -36,7 +55,8 @@ def create_app() -> FastAPI:
         version="2.0.0",
         docs_url="/docs",
         redoc_url="/redoc",
-        openapi_url="/openapi.json"
+        openapi_url="/openapi.json",
+        lifespan=lifespan,
     )
     
     # CORS 配置必须在最前面
@@ -64,19 +84,14 @@ def create_app() -> FastAPI:
     
     # 包含路由
     app.include_router(router)
+    app.include_router(metrics_router)
+    
+    # 按路由统计请求数、错误数与耗时（GET /metrics 导出）
+    app.add_middleware(MetricsMiddleware, routes=app.routes)
     
     # 全局异常处理
     setup_exception_handlers(app)
     
-    # 应用启动事件
-    @app.on_event("startup")
-    async def startup_event():
-        logger.info("应用启动 - 乡村化学教师AI教学助手 v2.0.0")
-    
-    @app.on_event("shutdown")
-    async def shutdown_event():
-        logger.info("应用关闭")
-    
     return app
 
 
@@ -93,7 +108,8 @@ def setup_exception_handlers(app: FastAPI) -> None:
             content=BaseResponse(
                 success=False,
                 error=exc.detail
-            ).dict()
+            ).dict(),
+            headers=exc.headers
         )
     
     @app.exception_handler(ValueError)
@@ -4,33 +4,18 @@
 
 import logging
 
-from langchain.agents import create_agent
-from pydantic import SecretStr
-from langchain_openai import ChatOpenAI
+try:
+    from .client_registry import registry
+    from .prompts import prompts
+    from .resilience import resilience, UPSTREAM_CHAT
+except ImportError:
+    from backend.client_registry import registry
+    from backend.prompts import prompts
+    from backend.resilience import resilience, UPSTREAM_CHAT
 
 logger = logging.getLogger(__name__)
 
-def recognize_material(image_url: str, api_key: str) -> str:
-    """
-    实验物质图生文识别
-    
-    Args:
-        image_url: 图片URL地址
-        api_key: ModelScope API密钥（必需）
-        
-    Returns:
-        物质识别结果
-    """
-    try:
-        
-        model =  ChatOpenAI(
-            api_key=SecretStr(api_key),
-            model="Qwen/Qwen3-VL-30B-A3B-Instruct",
-            base_url="https://api-inference.modelscope.cn/v1",
-            temperature=0.7
-        )
-        
-        system_prompt ="""
+SYSTEM_PROMPT = """
         
         你是一位中学化学教师兼实验安全指导员，擅长通过图片识别常见的化学物质（如固体、液体、晶体）或基础实验仪器（如试管、烧杯、酒精灯等）。用户会上传一张照片，可能来自乡村学校的简易实验室、家庭环境或教材插图。你的任务是：基于图像内容，识别最可能的物质或仪器，并用清晰、安全、教学友好的方式提供相关知识。
 
@@ -87,26 +72,98 @@ def recognize_material(image_url: str, api_key: str) -> str:
         现在，请根据用户上传的图片内容，生成符合上述规范的识别与教学说明。
         
         """
+
+# 精简版：示例只保留一个，化学式下标由本地后处理统一转换
+COMPACT_SYSTEM_PROMPT = """
+    你是中学化学教师兼实验安全指导员，根据照片识别常见化学物质或基础实验仪器（照片可能来自乡村学校实验室、家庭或教材插图）。
+
+    规则：
+    - 图像清晰时给出最可能的名称；模糊或有多种可能时用“可能为”“类似……”等谨慎表述；无法识别时回复：“未能识别出明确的化学物质或仪器，请尝试拍摄更清晰的正面照片。”
+    - 按顺序输出：【识别结果】标准中文名称；【典型特征】1–2个视觉特征；【主要用途】中学实验或生活用途；【安全提示】必须包含；【教学建议】仅对物质，1条课堂讲解或演示建议。
+    - 不提供自制方法，危险品须突出安全警示并强调“仅限教师演示”，内容不超出中学课标。
+    - 语言简洁温暖，面向乡村教师，多用生活类比。
+    - 化学式直接用普通数字书写，程序会自动转为下标。
+
+    示例（蓝色晶体）：
+    【识别结果】五水合硫酸铜（CuSO4·5H2O）
+    【典型特征】亮蓝色透明晶体，常呈块状或粉末状
+    【主要用途】用于检验水的存在（遇水变蓝），也用于配制波尔多液
+    【安全提示】有一定毒性，避免误食或长时间皮肤接触，实验后需洗手
+    【教学建议】可加热演示其失去结晶水变为白色，冷却后加水又变蓝，说明可逆变化
+    """
+
+PROMPT = prompts.register("recognize", SYSTEM_PROMPT, COMPACT_SYSTEM_PROMPT, postprocess=True)
+SYSTEM_PROMPT = PROMPT.text
+
+
+def _build_agent(api_key: str):
+    """获取物质识别使用的智能体（进程级缓存，复用连接池）"""
+    return registry.get_agent(
+        api_key=api_key,
+        feature="recognize",
+        system_prompt=SYSTEM_PROMPT,
+    )
+
+
+def _build_input(image_url: str) -> dict:
+    """构建包含图片的智能体输入消息"""
+    return {"messages": [{
+        "role": "user",
+        "content": [
+            {"type": "image", "url": image_url},
+        ]}]}
+
+
+def recognize_material(image_url: str, api_key: str) -> str:
+    """
+    实验物质图生文识别
+    
+    Args:
+        image_url: 图片URL地址
+        api_key: ModelScope API密钥（必需）
+        
+    Returns:
+        物质识别结果
+    """
+    try:
+        agent = _build_agent(api_key)
         
-        agent = create_agent(
-            model=model,
-            system_prompt=system_prompt,    
-        )
+        logger.info(f"[识别实验物质] 开始处理图片...")
+        logger.info(f"[识别实验物质] 图片URL: {image_url}")
+        
+        logger.info(f"[识别实验物质] 开始调用大模型...")
+        result = resilience.call(UPSTREAM_CHAT, lambda: agent.invoke(_build_input(image_url)))
+        
+        logger.info(f"[识别实验物质] 大模型调用完成")
+        return prompts.postprocess("recognize", result["messages"][-1].content)
+        
+    except Exception as e:
+        logger.error(f"识别物质失败: {str(e)}")
+        raise
+
+
+async def arecognize_material(image_url: str, api_key: str) -> str:
+    """
+    实验物质图生文识别（异步版本，不阻塞事件循环）
+    
+    Args:
+        image_url: 图片URL地址
+        api_key: ModelScope API密钥（必需）
+        
+    Returns:
+        物质识别结果
+    """
+    try:
+        agent = _build_agent(api_key)
         
         logger.info(f"[识别实验物质] 开始处理图片...")
         logger.info(f"[识别实验物质] 图片URL: {image_url}")
         
         logger.info(f"[识别实验物质] 开始调用大模型...")
-        result = agent.invoke(
-            {"messages": [{
-                "role": "user",
-                "content": [
-                    {"type": "image", "url": image_url},
-                ]}]},
-        )
+        result = await resilience.acall(UPSTREAM_CHAT, lambda: agent.ainvoke(_build_input(image_url)))
         
         logger.info(f"[识别实验物质] 大模型调用完成")
-        return result["messages"][-1].content
+        return prompts.postprocess("recognize", result["messages"][-1].content)
         
     except Exception as e:
         logger.error(f"识别物质失败: {str(e)}")
@@ -0,0 +1,383 @@
+"""
+指标模块 - 各阶段耗时统计与 Prometheus 文本格式导出
+
+- latency(name)：按阶段记录耗时（总耗时、首字节时间、上游调用、文生图节点等），
+  保留最近一段时间窗口内的样本计算分位数，同时计入直方图 chem_stage_duration_seconds{stage=name}
+- counter() / histogram()：带标签的计数器与直方图，标签组合首次使用（或启动时预先创建）后
+  热路径只做一次加锁累加，每个事件的开销在 1 微秒以内，可在生产环境常开
+- register_collector()：导出时才读取的指标（缓存命中数等组件已有的统计），不增加热路径开销
+- MetricsMiddleware：按路由模板统计请求数、错误数与耗时
+
+render_metrics() 输出 Prometheus 文本格式（由 GET /metrics 提供）。
+"""
+
+import math
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+# 每个指标保留的最近样本数量
+LATENCY_WINDOW = 1024
+
+# 默认直方图分桶上界（秒），覆盖本地计算到大模型长耗时调用
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 未匹配到任何路由的请求（404、405 等）使用的路由与方法标签，避免原始路径与方法造成标签爆炸
+UNMATCHED_ROUTE = "<unmatched>"
+OTHER_METHOD = "other"
+
+
+# ===================== 计数器与直方图 =====================
+
+class CounterValue:
+    """单个标签组合的计数器"""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self, lock: Optional[threading.Lock] = None):
+        self.value = 0.0
+        self._lock = lock or threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        # 热路径直接调用 acquire / release，比 with 语句少一次上下文管理器协议的开销
+        self._lock.acquire()
+        try:
+            self.value += amount
+        finally:
+            self._lock.release()
+
+
+class HistogramValue:
+    """单个标签组合的直方图（分桶计数预先分配）"""
+
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Sequence[float], lock: Optional[threading.Lock] = None):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = lock or threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        self._lock.acquire()
+        try:
+            self.counts[index] += 1
+            self.sum += value
+        finally:
+            self._lock.release()
+
+    def _observe_locked(self, value: float) -> None:
+        """调用方已持有 _lock 时使用（与其他指标共用一把锁，每个事件只加锁一次）"""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """返回 (累计分桶计数（最后一项为 +Inf）, 总和)"""
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = []
+        running = 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total
+
+
+class MetricFamily:
+    """同名指标的全部标签组合"""
+
+    def __init__(self, name: str, help_text: str, kind: str, labelnames: Tuple[str, ...], factory: Callable[[], Any]):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labelnames = labelnames
+        self._factory = factory
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str, lock: Optional[threading.Lock] = None) -> Any:
+        """
+        获取（必要时创建）标签组合对应的计数器或直方图；热路径中应缓存返回值
+
+        Args:
+            values: 标签值，顺序与 labelnames 一致
+            lock: 新建时使用的锁，传入后可与其他指标共用，在一次加锁内同时更新
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._factory(lock)
+        return child
+
+    def render(self, lines: List[str]) -> None:
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for values, child in sorted(self._children.items()):
+            labels = dict(zip(self.labelnames, values))
+            if self.kind == "histogram":
+                cumulative, total = child.snapshot()
+                for bound, count in zip(list(child.bounds) + [math.inf], cumulative):
+                    lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative[-1]}")
+            else:
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(child.value)}")
+
+
+class CollectedMetric(NamedTuple):
+    """导出时由采集函数生成的指标"""
+    name: str
+    kind: str  # "counter" 或 "gauge"
+    help: str
+    samples: List[Tuple[Dict[str, str], float]]
+
+
+_families: Dict[str, MetricFamily] = {}
+_collectors: List[Callable[[], Iterable[CollectedMetric]]] = []
+_registry_lock = threading.Lock()
+
+
+def _register(family: MetricFamily) -> MetricFamily:
+    with _registry_lock:
+        existing = _families.get(family.name)
+        if existing is not None:
+            return existing
+        _families[family.name] = family
+        return family
+
+
+def counter(name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> MetricFamily:
+    """注册（或获取同名的）计数器"""
+    return _register(MetricFamily(name, help_text, "counter", labelnames, CounterValue))
+
+
+def histogram(
+    name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> MetricFamily:
+    """注册（或获取同名的）直方图"""
+    bounds = tuple(sorted(buckets))
+    return _register(MetricFamily(name, help_text, "histogram", labelnames, lambda lock: HistogramValue(bounds, lock)))
+
+
+def register_collector(collector: Callable[[], Iterable[CollectedMetric]]) -> None:
+    """注册导出时调用的采集函数"""
+    with _registry_lock:
+        _collectors.append(collector)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics() -> str:
+    """以 Prometheus 文本格式导出全部指标"""
+    lines: List[str] = []
+    with _registry_lock:
+        families = sorted(_families.values(), key=lambda f: f.name)
+        collectors = list(_collectors)
+    for family in families:
+        family.render(lines)
+    for collector in collectors:
+        for metric in collector():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in metric.samples:
+                lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ===================== 阶段耗时 =====================
+
+STAGE_SECONDS = histogram("chem_stage_duration_seconds", "各处理阶段耗时（秒）", ("stage",))
+
+
+class LatencyTracker:
+    """滑动窗口延迟统计"""
+
+    def __init__(self, window: int = LATENCY_WINDOW, histogram: Optional[HistogramValue] = None):
+        """
+        Args:
+            window: 保留的最近样本数量
+            histogram: 同时计入的直方图，与统计器共用一把锁
+        """
+        self._samples: deque = deque(maxlen=window)
+        self._histogram = histogram if histogram is not None else HistogramValue(DEFAULT_BUCKETS)
+        self._lock = self._histogram._lock
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """记录一次耗时（秒）"""
+        self._lock.acquire()
+        try:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+            self._histogram._observe_locked(seconds)
+        finally:
+            self._lock.release()
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        计算窗口内样本的分位数
+
+        Args:
+            q: 分位（0-100）
+
+        Returns:
+            分位数（秒），无样本时返回 None
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(q / 100 * (len(samples) - 1)))))
+        return samples[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出统计快照"""
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else None,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+_trackers: Dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def latency(name: str) -> LatencyTracker:
+    """按名称获取（必要时创建）延迟统计器，如 "explain.ttfb"、"explain.total" """
+    tracker = _trackers.get(name)
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.get(name)
+            if tracker is None:
+                tracker = _trackers[name] = LatencyTracker(histogram=STAGE_SECONDS.labels(name))
+    return tracker
+
+
+def latency_snapshot() -> Dict[str, Dict[str, Any]]:
+    """导出全部延迟统计"""
+    return {name: tracker.snapshot() for name, tracker in sorted(_trackers.items())}
+
+
+# ===================== HTTP 请求指标 =====================
+
+HTTP_REQUESTS = counter("chem_http_requests_total", "HTTP 请求数", ("route", "method", "status"))
+HTTP_ERRORS = counter("chem_http_request_errors_total", "HTTP 请求错误数（状态码 >= 500 或处理异常）", ("route", "method"))
+HTTP_SECONDS = histogram("chem_http_request_duration_seconds", "HTTP 请求耗时（秒，流式响应到最后一个片段）", ("route", "method"))
+
+
+class _RouteMetrics:
+    """单个路由（模板 + 方法）的预分配指标，共用一把锁，记录一次请求只加锁一次"""
+
+    __slots__ = ("route", "method", "duration", "errors", "statuses", "_lock")
+
+    def __init__(self, route: str, method: str):
+        self.route = route
+        self.method = method
+        self._lock = threading.Lock()
+        self.duration = HTTP_SECONDS.labels(route, method, lock=self._lock)
+        self.errors = HTTP_ERRORS.labels(route, method, lock=self._lock)
+        self.statuses: Dict[int, CounterValue] = {}
+
+    def record(self, status: int, seconds: float) -> None:
+        requests = self.statuses.get(status)
+        if requests is None:
+            requests = self.statuses.setdefault(
+                status, HTTP_REQUESTS.labels(self.route, self.method, str(status), lock=self._lock)
+            )
+        self._lock.acquire()
+        try:
+            requests.value += 1
+            self.duration._observe_locked(seconds)
+            if status >= 500:
+                self.errors.value += 1
+        finally:
+            self._lock.release()
+
+
+class MetricsMiddleware:
+    """ASGI 中间件：按路由模板统计请求数、错误数与耗时"""
+
+    def __init__(self, app: Any, routes: Iterable[Any] = ()):
+        """
+        Args:
+            app: 下游 ASGI 应用
+            routes: 应用的路由，启动时为每个路由预先创建指标
+        """
+        self.app = app
+        self._routes: Dict[Tuple[str, str], _RouteMetrics] = {}
+        self._unmatched = self._route_metrics(UNMATCHED_ROUTE, OTHER_METHOD)
+        self.preallocate(routes)
+
+    def preallocate(self, routes: Iterable[Any]) -> None:
+        """为应用的全部路由预先创建指标（启动时调用）"""
+        for route in routes:
+            for method in getattr(route, "methods", None) or ():
+                self._route_metrics(route.path, method)
+
+    def _route_metrics(self, route: str, method: str) -> _RouteMetrics:
+        metrics = self._routes.get((route, method))
+        if metrics is None:
+            metrics = self._routes.setdefault((route, method), _RouteMetrics(route, method))
+        return metrics
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # 响应开始前抛出的异常由外层转换为 500，status 保持默认值
+            self._metrics_for(scope).record(status, time.perf_counter() - start)
+
+    def _metrics_for(self, scope: Dict[str, Any]) -> _RouteMetrics:
+        """
+        请求对应的指标：路由匹配后 FastAPI 会在 scope 中写入 route，使用路由模板（如 /api/images/{digest}）作为标签；
+        只记录路由声明的方法，其余（未匹配的路径、不允许的方法）都计入同一个 <unmatched>/other 序列
+        """
+        route = scope.get("route")
+        method = scope["method"]
+        if route is None or method not in (getattr(route, "methods", None) or ()):
+            return self._unmatched
+        return self._route_metrics(route.path, method)
@@ -5,6 +5,11 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List, Any, Literal
 
+try:
+    from .batch import BATCH_CONCURRENCY, BATCH_MAX_ITEMS
+except ImportError:
+    from backend.batch import BATCH_CONCURRENCY, BATCH_MAX_ITEMS
+
 
 # ===================== 请求模型 =====================
 
@@ -23,6 +28,7 @@ class EquationBalanceRequest(BaseModel):
     """方程式配平请求"""
     equation: str = Field(..., min_length=1, description="化学方程式")
     api_key: str = Field(..., min_length=1, description="ModelScope API密钥（必需）")
+    narrative: bool = Field(default=True, description="是否生成配平步骤与教学讲解；为 false 时仅返回本地精确配平结果")
 
     class Config:
         example = {
@@ -30,6 +36,31 @@ class EquationBalanceRequest(BaseModel):
         }
 
 
+class ReactionExplainBatchRequest(BaseModel):
+    """批量讲解反应请求"""
+    reactions: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS, description="反应描述列表")
+    api_key: str = Field(..., min_length=1, description="ModelScope API密钥（必需）")
+    concurrency: int = Field(default=BATCH_CONCURRENCY, ge=1, le=BATCH_CONCURRENCY, description="并发上限")
+
+    class Config:
+        example = {
+            "reactions": ["铁与硫酸铜反应", "镁条燃烧"]
+        }
+
+
+class EquationBalanceBatchRequest(BaseModel):
+    """批量配平方程式请求"""
+    equations: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS, description="化学方程式列表")
+    api_key: str = Field(..., min_length=1, description="ModelScope API密钥（必需）")
+    narrative: bool = Field(default=True, description="是否生成配平步骤与教学讲解；为 false 时仅返回本地精确配平结果")
+    concurrency: int = Field(default=BATCH_CONCURRENCY, ge=1, le=BATCH_CONCURRENCY, description="并发上限")
+
+    class Config:
+        example = {
+            "equations": ["Fe + O2 → Fe2O3", "H2 + O2 → H2O"]
+        }
+
+
 class ReactionImageRequest(BaseModel):
     """反应现象文生图请求"""
     prompt: str = Field(..., min_length=1, description="图像生成提示词")
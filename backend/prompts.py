@@ -0,0 +1,298 @@
+"""
+提示词注册表 - 系统提示词的统一登记、版本与 token 统计
+
+- 各功能模块在导入时登记一次提示词（完整版 full / 精简版 compact），之后直接复用
+- 提示词统一去除缩进与首尾空行，版本号由内容计算（sha256 前 12 位）
+- token 数用 tiktoken（cl100k_base）统计；编码只在启动预热时加载（可能需要下载编码文件），
+  未加载、未安装或无法下载时按字符估算，请求路径上不会触发下载
+- 精简版减少示例，化学式下标不再靠提示词要求模型输出，而是由本地后处理统一转换
+  （H2O → H₂O、Fe3+ → Fe³⁺，系数与状态符号保持不变）；完整版已要求模型输出下标，不做后处理
+
+通过 CHEM_PROMPT_VARIANT=full|compact 选择全局版本，
+CHEM_PROMPT_VARIANT_<功能>（如 CHEM_PROMPT_VARIANT_BALANCE）可单独覆盖。
+"""
+
+import hashlib
+import inspect
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Optional
+
+try:
+    from .chem_parser import ChemParseError, parse_term
+except ImportError:
+    from backend.chem_parser import ChemParseError, parse_term
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = ("full", "compact")
+PROMPT_VARIANT = os.getenv("CHEM_PROMPT_VARIANT", "full")
+
+# token 统计使用的编码（与 Qwen 分词器不同，只用于比较各版本的相对长度）
+TOKEN_ENCODING = "cl100k_base"
+
+
+# ===================== token 统计 =====================
+
+_encoder: Any = None
+_encoder_lock = threading.Lock()
+_encoder_loaded = False
+
+_CJK_RE = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+
+
+def load_encoder() -> Any:
+    """
+    加载 tiktoken 编码（首次可能需要联网下载编码文件，只在预热时于线程池中调用）
+
+    Returns:
+        编码对象，失败时返回 None（改用估算）
+    """
+    global _encoder, _encoder_loaded
+    with _encoder_lock:
+        if not _encoder_loaded:
+            _encoder_loaded = True
+            try:
+                import tiktoken
+                _encoder = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception as e:
+                logger.warning(f"[提示词] tiktoken 不可用，token 数按字符估算: {type(e).__name__}")
+            # 加载前按估算缓存的结果作废
+            count_tokens.cache_clear()
+        return _encoder
+
+
+def _get_encoder() -> Any:
+    """已加载的编码；尚未加载时返回 None（按字符估算），不在请求路径上加载"""
+    return _encoder
+
+
+def tokenizer_name() -> str:
+    return TOKEN_ENCODING if _get_encoder() is not None else "estimate"
+
+
+@lru_cache(maxsize=256)
+def count_tokens(text: str) -> int:
+    """
+    统计文本 token 数
+
+    无 tiktoken 时估算：每个中日韩字符约 1 个 token，其余字符约 4 个 1 个 token。
+    """
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text))
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+# ===================== 下标后处理 =====================
+
+# 化学式候选：可选系数 + 以大写字母开头的元素/括号/数字/结晶水序列 + 可选电荷
+# 电荷后紧跟字母、数字、括号或 ">" 时视为加号/箭头而非电荷（如 "2Na+Cl2"、"SO42-->"）
+_FORMULA_RE = re.compile(
+    r"(?<![A-Za-z0-9_])(\d*)([A-Z][A-Za-z0-9()\[\]·]*)((?:\^?\d*[+\-−])?)(?![A-Za-z0-9()\[\]·>+\-−])"
+)
+_STATE_RE = re.compile(r"\((?:s|l|g|aq)\)$")
+# 下标不会超过 3 位，更长的数字串（如 ISO9001）不是化学式
+_LONG_DIGITS_RE = re.compile(r"\d{4,}")
+_SUBSCRIPTS = str.maketrans("0123456789", "₀₁₂₃₄₅₆₇₈₉")
+_SUPERSCRIPTS = str.maketrans("0123456789+-−", "⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻⁻")
+# 单质分子：只含一种元素时，只有这些写法视为化学式（V2、S3、K2 等是版本号或编号）
+_ELEMENTAL_MOLECULES = frozenset({"H2", "N2", "O2", "O3", "F2", "Cl2", "Br2", "I2", "P4", "S8", "C60"})
+# 非金属元素：不带电荷的化合物至少含一种（Y2K 之类的缩写只由金属元素组成）
+_NONMETALS = frozenset({"H", "B", "C", "N", "O", "F", "Si", "P", "S", "Cl", "As", "Se", "Br", "Te", "I"})
+
+
+def _subscript_body(body: str) -> str:
+    """把元素符号或右括号后的数字转为下标，结晶水系数（· 后的数字）保持不变"""
+    out = []
+    previous = ""
+    for ch in body:
+        if ch.isdigit() and (previous.isalpha() or previous in ")]" or (previous.isdigit() and out and out[-1] in "₀₁₂₃₄₅₆₇₈₉")):
+            out.append(ch.translate(_SUBSCRIPTS))
+        else:
+            out.append(ch)
+        previous = ch
+    return "".join(out)
+
+
+def _is_formula(species_text: str, species: Any) -> bool:
+    """
+    解析成功的片段是否确实是化学式
+
+    离子、常见单质分子，或至少含两种元素且含非金属元素的化合物才转换；
+    "V2 版本"、"S3/C4"、"B2B"、"K2 区域"、"Y2K" 保持不变。
+    """
+    if species.charge:
+        return True
+    if len(species.elements) == 1:
+        return species_text in _ELEMENTAL_MOLECULES
+    return any(symbol in _NONMETALS for symbol, _ in species.atoms)
+
+
+def _replace_formula(match: re.Match) -> str:
+    coefficient, body, charge = match.groups()
+    if (not any(ch.isdigit() for ch in body) and not charge) or _LONG_DIGITS_RE.search(body):
+        return match.group(0)
+    state = _STATE_RE.search(body)
+    species_text = body[:state.start()] if state else body
+    try:
+        _, species = parse_term(species_text + charge)
+    except ChemParseError:
+        return match.group(0)
+    if not _is_formula(species_text, species):
+        return match.group(0)
+    if charge or species.charge:
+        # 无 ^ 的写法（SO42-）中电荷数字与下标相连，以解析结果为准
+        if not charge.startswith("^") and species.charge and not charge[:-1]:
+            digits = str(abs(species.charge)) if abs(species.charge) > 1 else ""
+            if digits and species_text.endswith(digits):
+                species_text = species_text[: -len(digits)]
+                charge = digits + charge
+        charge = charge.lstrip("^").translate(_SUPERSCRIPTS)
+    rendered = _subscript_body(species_text) + (state.group(0) if state else "")
+    return coefficient + rendered + charge
+
+
+def subscript_formulas(text: str) -> str:
+    """
+    将文本中的化学式数字转为下标（H2O → H₂O，2H2O → 2H₂O，Fe3+ → Fe³⁺，CuSO4·5H2O → CuSO₄·5H₂O）
+
+    只转换能被 chem_parser 解析、且确实像化学式的片段（离子、常见单质分子、含非金属元素的化合物），
+    普通英文、版本号与编号（V2、B2B、Y2K）、步骤编号与已是下标的文本保持不变。
+    """
+    return _FORMULA_RE.sub(_replace_formula, text)
+
+
+# 流式转换时，末尾可能是未完整的化学式，暂不输出
+_TAIL_RE = re.compile(r"[A-Za-z0-9()\[\]·^+\-−]*$")
+
+
+class SubscriptStream:
+    """流式下标转换：缓存片段末尾可能被截断的化学式，凑齐后再转换"""
+
+    def __init__(self):
+        self._pending = ""
+
+    def feed(self, chunk: str) -> str:
+        text = self._pending + chunk
+        tail = _TAIL_RE.search(text)
+        cut = tail.start() if tail else len(text)
+        self._pending = text[cut:]
+        return subscript_formulas(text[:cut])
+
+    def flush(self) -> str:
+        text, self._pending = self._pending, ""
+        return subscript_formulas(text)
+
+
+# ===================== 注册表 =====================
+
+@dataclass(frozen=True)
+class Prompt:
+    """已登记的提示词"""
+    name: str
+    variant: str
+    text: str
+    version: str
+    postprocess: bool
+
+    @property
+    def tokens(self) -> int:
+        return count_tokens(self.text)
+
+
+def _normalize(text: str) -> str:
+    """去除公共缩进、行尾空白与首尾空行"""
+    return "\n".join(line.rstrip() for line in inspect.cleandoc(text).splitlines())
+
+
+class PromptRegistry:
+    """提示词注册表（进程级，模块导入时登记）"""
+
+    def __init__(self, default_variant: str = PROMPT_VARIANT):
+        if default_variant not in VARIANTS:
+            logger.warning(f"[提示词] 未知版本 {default_variant}，使用 full")
+            default_variant = "full"
+        self.default_variant = default_variant
+        self._prompts: Dict[str, Dict[str, Prompt]] = {}
+
+    def register(self, name: str, full: str, compact: Optional[str] = None, postprocess: bool = False) -> Prompt:
+        """
+        登记提示词
+
+        Args:
+            name: 功能标识（如 "explain"）
+            full: 完整版提示词
+            compact: 精简版提示词（可选）
+            postprocess: 精简版的输出是否需要本地下标后处理
+
+        Returns:
+            当前选用版本的提示词
+        """
+        variants = {"full": full}
+        if compact is not None:
+            variants["compact"] = compact
+        self._prompts[name] = {
+            variant: Prompt(
+                name=name,
+                variant=variant,
+                text=_normalize(text),
+                version=hashlib.sha256(_normalize(text).encode("utf-8")).hexdigest()[:12],
+                # 完整版要求模型直接输出下标，只有精简版需要本地后处理
+                postprocess=postprocess and variant == "compact",
+            )
+            for variant, text in variants.items()
+        }
+        return self.get(name)
+
+    def variant_for(self, name: str) -> str:
+        """功能当前选用的版本（环境变量 CHEM_PROMPT_VARIANT_<功能> 优先）"""
+        variant = os.getenv(f"CHEM_PROMPT_VARIANT_{name.upper()}", self.default_variant)
+        return variant if variant in self._prompts.get(name, {}) else "full"
+
+    def get(self, name: str, variant: Optional[str] = None) -> Prompt:
+        """获取提示词；指定的版本不存在时回退到完整版"""
+        variants = self._prompts[name]
+        return variants.get(variant or self.variant_for(name), variants["full"])
+
+    def postprocess(self, name: str, text: str) -> str:
+        """对当前选用版本的模型输出做本地后处理（下标转换）"""
+        if not self.get(name).postprocess:
+            return text
+        return subscript_formulas(text)
+
+    async def postprocess_stream(self, name: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        """流式后处理"""
+        if not self.get(name).postprocess:
+            async for chunk in chunks:
+                yield chunk
+            return
+        stream = SubscriptStream()
+        async for chunk in chunks:
+            text = stream.feed(chunk)
+            if text:
+                yield text
+        tail = stream.flush()
+        if tail:
+            yield tail
+
+    def stats(self) -> Dict[str, Any]:
+        """导出各提示词的版本与 token 数"""
+        result: Dict[str, Any] = {"tokenizer": tokenizer_name()}
+        for name, variants in self._prompts.items():
+            selected = self.get(name)
+            result[name] = {
+                "variant": selected.variant,
+                "version": selected.version,
+                "tokens": {variant: prompt.tokens for variant, prompt in variants.items()},
+            }
+        return result
+
+
+# 进程级单例
+prompts = PromptRegistry()
@@ -3,33 +3,23 @@
 """
 
 import logging
-from langchain.agents import create_agent
-from pydantic import SecretStr
-from langchain_openai import ChatOpenAI
+from typing import AsyncIterator
+
+try:
+    from .client_registry import registry, DEFAULT_TEMPERATURE
+    from .prompts import prompts
+    from .resilience import agent_text_chunks, resilience, UPSTREAM_CHAT
+except ImportError:
+    from backend.client_registry import registry, DEFAULT_TEMPERATURE
+    from backend.prompts import prompts
+    from backend.resilience import agent_text_chunks, resilience, UPSTREAM_CHAT
 
 logger = logging.getLogger(__name__)
 
-def explain_reaction(reaction: str, api_key: str) -> str:
-    """
-    化学反应智能讲解
-    
-    Args:
-        reaction: 反应描述
-        api_key: ModelScope API密钥（必需）
-        
-    Returns:
-        讲解文本
-    """
-    try:
-        
-        model =  ChatOpenAI(
-            api_key=SecretStr(api_key),
-            model="Qwen/Qwen3-VL-30B-A3B-Instruct",
-            base_url="https://api-inference.modelscope.cn/v1",
-            temperature=0.7
-        )
-        
-        system_prompt = """
+# 采样温度（参与结果缓存键）
+TEMPERATURE = DEFAULT_TEMPERATURE
+
+SYSTEM_PROMPT = """
         
             你是一位经验丰富的中学化学教师，专注于为初中和高中阶段的学生提供清晰、准确、安全的化学知识讲解。你的任务是：当用户输入一个化学反应（可以是反应名称、化学方程式或描述性语句）时，你需以教学助手的身份，生成一段结构清晰、语言通俗、符合课程标准的解释。
 
@@ -64,29 +54,119 @@ def explain_reaction(reaction: str, api_key: str) -> str:
             现在，请根据用户输入，生成符合上述规范的化学反应解释。
         
         """
+
+# 精简版：去掉示例，化学式下标由本地后处理统一转换
+COMPACT_SYSTEM_PROMPT = """
+    你是经验丰富的中学化学教师。用户输入一个化学反应（名称、方程式或描述），请面向教师生成可直接用于课堂的讲解，按顺序输出：
+    【反应名称】标准中文名称
+    【反应类型】化合、分解、置换、复分解或氧化还原等
+    【化学方程式】配平后的完整方程式，标注状态符号 (s)、(l)、(g)、(aq)
+    【反应原理】反应本质（电子转移、离子交换、能量变化等），不超出中学范围
+    【教学提示】常见误区、生活实例或安全注意事项
+
+    要求：语言简洁口语化，不用“可能”“也许”等模糊表述；涉及危险品（浓硫酸、氯气、钠等）须强调“仅限教师演示，禁止学生操作”；不给出制取等实验操作步骤；输入无法识别时回复：“请提供更明确的化学反应描述，例如‘镁在空气中燃烧’或‘NaOH + HCl →’。”
+    化学式直接用普通数字书写（如 H2O、Fe3+），程序会自动转为下标。
+    """
+
+PROMPT = prompts.register("explain", SYSTEM_PROMPT, COMPACT_SYSTEM_PROMPT, postprocess=True)
+SYSTEM_PROMPT = PROMPT.text
+
+
+def _build_agent(api_key: str):
+    """获取讲解反应使用的智能体（进程级缓存，复用连接池）"""
+    return registry.get_agent(
+        api_key=api_key,
+        feature="explain",
+        system_prompt=SYSTEM_PROMPT,
+        temperature=TEMPERATURE,
+    )
+
+
+def _build_input(reaction: str) -> dict:
+    """构建智能体输入消息"""
+    prompt = f"请详细讲解以下化学反应的性质、条件和应用意义：{reaction}"
+    return {"messages": [{"role": "user", "content": prompt}]}
+
+
+def explain_reaction(reaction: str, api_key: str) -> str:
+    """
+    化学反应智能讲解
+    
+    Args:
+        reaction: 反应描述
+        api_key: ModelScope API密钥（必需）
         
-        agent = create_agent(
-            model=model,
-            system_prompt=system_prompt,
-        )
+    Returns:
+        讲解文本
+    """
+    try:
+        agent = _build_agent(api_key)
         
         logger.info(f"[开始讲解] 反应: {reaction}")
         
-        # 构建提示词
-        prompt = f"请详细讲解以下化学反应的性质、条件和应用意义：{reaction}"
+        logger.info(f"[调用大模型] 开始处理，请等待...")
+        response = resilience.call(UPSTREAM_CHAT, lambda: agent.invoke(_build_input(reaction)))
+        logger.info(f"[大模型回复] 讲解完成")
+        
+        return prompts.postprocess("explain", response["messages"][-1].content)
+        
+    except Exception as e:
+        logger.error(f"讲解反应失败: {str(e)}")
+        raise
+
+
+async def aexplain_reaction(reaction: str, api_key: str) -> str:
+    """
+    化学反应智能讲解（异步版本，不阻塞事件循环）
+    
+    Args:
+        reaction: 反应描述
+        api_key: ModelScope API密钥（必需）
+        
+    Returns:
+        讲解文本
+    """
+    try:
+        agent = _build_agent(api_key)
+        
+        logger.info(f"[开始讲解] 反应: {reaction}")
         
         logger.info(f"[调用大模型] 开始处理，请等待...")
-        response = agent.invoke(
-            {"messages": [{"role": "user", "content": prompt}]},
-        )
+        response = await resilience.acall(UPSTREAM_CHAT, lambda: agent.ainvoke(_build_input(reaction)))
         logger.info(f"[大模型回复] 讲解完成")
         
-        return response["messages"][-1].content
+        return prompts.postprocess("explain", response["messages"][-1].content)
+        
+    except Exception as e:
+        logger.error(f"讲解反应失败: {str(e)}")
+        raise
+
+
+async def astream_explain_reaction(reaction: str, api_key: str) -> AsyncIterator[str]:
+    """
+    化学反应智能讲解（流式版本，逐段产出模型生成的文本）
+    
+    Args:
+        reaction: 反应描述
+        api_key: ModelScope API密钥（必需）
+        
+    Yields:
+        文本片段
+    """
+    try:
+        agent = _build_agent(api_key)
+        
+        logger.info(f"[开始讲解] 反应: {reaction}（流式）")
+        chunks = resilience.astream(UPSTREAM_CHAT, lambda: agent_text_chunks(agent, _build_input(reaction)))
+        async for text in prompts.postprocess_stream("explain", chunks):
+            yield text
+        logger.info(f"[大模型回复] 讲解完成（流式）")
         
     except Exception as e:
         logger.error(f"讲解反应失败: {str(e)}")
         raise
 
+
 if __name__ == "__main__":
     
     import os
@@ -1,55 +1,55 @@
 """
 反应现象文生图模块
+
+图结构（节点、边、路由）在模块导入时构建并编译一次，
+每个请求只通过 context（api_key）和 state（prompt）传入数据。
+每次执行记录一条追踪（节点耗时与执行次数、token 用量、图像任务轮询次数），见 tracing 模块。
 """
 
+import asyncio
 import operator
 import logging
-import time
 import json
-import requests
-from dataclasses import dataclass
-from typing import Literal
+import time
+from typing import Callable, Literal, Optional
 from typing_extensions import TypedDict, Annotated
 
-from langchain_openai import ChatOpenAI
 from langchain.messages import AnyMessage, SystemMessage, AIMessage
 from langgraph.graph import StateGraph, START, END
 from langgraph.runtime import Runtime
 
+try:
+    from .executor import run_coroutine_sync
+    from .client_registry import registry
+    from .task_poller import poller, MODELSCOPE_API_BASE
+    from .image_store import image_store, ImageDownloadError
+    from .result_cache import canonicalize
+    from .prompts import prompts
+    from .resilience import resilience, UPSTREAM_CHAT, UPSTREAM_IMAGE
+    from .metrics import latency
+    from .tracing import current_span, traced_node, tracer
+except ImportError:
+    from backend.executor import run_coroutine_sync
+    from backend.client_registry import registry
+    from backend.task_poller import poller, MODELSCOPE_API_BASE
+    from backend.image_store import image_store, ImageDownloadError
+    from backend.result_cache import canonicalize
+    from backend.prompts import prompts
+    from backend.resilience import resilience, UPSTREAM_CHAT, UPSTREAM_IMAGE
+    from backend.metrics import latency
+    from backend.tracing import current_span, traced_node, tracer
+
 logger = logging.getLogger(__name__)
 
-def generate_reaction_image(prompt: str, api_key: str) -> str:
-    """
-    Args:
-        prompt: 简要反应现象描述
-        api_key: ModelScope API密钥（必需）
-        
-    Returns:
-        图像URL或占位符URL（生成失败时）
-    """
-    try:
-        class State(TypedDict):
-            messages: Annotated[list[AnyMessage], operator.add]
-            prompt: str
-            eval_prompt: str
-            image_url: str
-            eval_image: str
-            prompt_generation_count: int
-            image_generation_count: int
-
-        generate_prompt_model = ChatOpenAI(
-            api_key=SecretStr(api_key),
-            model="Qwen/Qwen3-VL-30B-A3B-Instruct",
-            base_url="https://api-inference.modelscope.cn/v1",
-            temperature=0.7
-        )
-        
-        def generate_prompt_node(state: State):
-            """
-            调用提示词生成模型，生成增强后的提示词
-            """
-            
-            system_prompt = """
+IMAGE_MODEL = "black-forest-labs/FLUX.1-Krea-dev"
+
+# 生成失败时返回的占位图地址前缀（保证前端正常渲染；批量处理据此判断失败）
+PLACEHOLDER_IMAGE_URL = "https://via.placeholder.com/512x512?text="
+
+
+# ===================== 提示词 =====================
+
+GENERATE_PROMPT_SYSTEM_PROMPT = """
             
             你是一位化学教育视觉设计师，专门将简略的化学反应描述转化为适合AI绘图模型（如Stable Diffusion）使用的详细视觉提示词。你的目标是：根据用户输入的化学反应（如“镁条燃烧”或“HCl + NaOH”），自动生成一段**具体、可画、安全、教学友好**的图像生成提示，重点描述**可观察的实验现象与实验场景**，而非抽象原理。
 
@@ -96,30 +96,8 @@ def generate_reaction_image(prompt: str, api_key: str) -> str:
             现在，请根据用户输入的化学反应，生成符合上述规范的英文文生图提示词。
             
             """
-            
-            response = generate_prompt_model.invoke(
-                [SystemMessage(content=system_prompt)]
-                + state["messages"]
-            )
-            
-            return {
-                "messages": [response],
-                "prompt": response.content,
-                "prompt_generation_count": state.get('prompt_generation_count', 0) + 1
-            }
-
-        eval_prompt_model = ChatOpenAI(
-            api_key="ms-fb065d50-eedf-41e5-9bc0-7700362c0c45",
-            model="Qwen/Qwen3-VL-30B-A3B-Instruct",
-            base_url="https://api-inference.modelscope.cn/v1",
-            temperature=0.7
-        )
 
-        def eval_prompt_node(state: State):
-            """
-            调用提示词评估模型，评估生成的提示词是否符合规范
-            """
-            system_prompt = """
+EVAL_PROMPT_SYSTEM_PROMPT = """
             
             你是一位专业的化学教育内容审核员，负责检查由AI生成的化学反应绘图提示词（prompt）。你的任务是根据一系列严格的标准评估这些提示词，确保它们包含足够的信息来生成高质量、具体且适合教学使用的图像。如果提示词符合要求，则输出“ok”；若存在问题或缺失关键信息，则提供具体的改进建议。
 
@@ -164,104 +142,8 @@ def generate_reaction_image(prompt: str, api_key: str) -> str:
             现在，请根据上述标准评估给定的化学反应绘图提示词，并按照指示输出“ok”或具体的改进建议。
             
             """
-            
-            
-            response = eval_prompt_model.invoke(
-                [SystemMessage(content=system_prompt)]
-                + [state["prompt"]]
-            )
-            
-            eval_result = response.content.strip()
-            
-            return {
-                "messages": [response],
-                "eval_prompt": eval_result,
-            }
-
-        @dataclass
-        class ContextSchema(TypedDict):
-            api_key: str
-            
-        def generate_image_node(state: State, runtime: Runtime[ContextSchema]):
-            """
-            调用图像生成模型，根据评估后的提示词生成图像
-            """
-            api_key = runtime.context["api_key"]
-            prompt = state["prompt"]
-            
-            base_url = 'https://api-inference.modelscope.cn/'
-            
-            # 设置请求头
-            common_headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json",
-            }
-                            
-            # 提交异步图像生成任务
-            response = requests.post(
-                f"{base_url}v1/images/generations",
-                headers={**common_headers, "X-ModelScope-Async-Mode": "true"},
-                data=json.dumps({
-                    "model": "black-forest-labs/FLUX.1-Krea-dev",
-                    "prompt": prompt
-                }, ensure_ascii=False).encode('utf-8')
-                )
-            response.raise_for_status()
-                    
-            task_id = response.json()["task_id"]
-                    
-            # 轮询任务结果（最多轮询30次，每次间隔10秒）  
-            max_attempts = 30
-            for attempt in range(max_attempts):
-                        
-                result = requests.get(
-                    f"{base_url}v1/tasks/{task_id}",
-                    headers={**common_headers, "X-ModelScope-Task-Type": "image_generation"},
-                )
-                result.raise_for_status()
-                data = result.json()
-                    
-                # 任务成功
-                if data["task_status"] == "SUCCEED":
-                    image_url = data["output_images"][0]
-                    return {
-                        "image_url": image_url,
-                        "image_generation_count": state.get('image_generation_count', 0) + 1
-                        }
-                        
-                # 任务失败
-                elif data["task_status"] == "FAILED":
-                    # 返回占位符URL保证前端正常渲染
-                    return {
-                        "image_url": "https://via.placeholder.com/512x512?text=Image+Generation+Failed",
-                        "image_generation_count": state.get('image_generation_count', 0) + 1
-                        }
-                    
-                # 任务进行中，等待后重试
-                time.sleep(10)
-                            
-            # 超时处理
-            return {
-                "image_url": "https://via.placeholder.com/512x512?text=Generation+Timeout",
-                "image_generation_count": state.get('image_generation_count', 0) + 1
-                    }
-            
-
-        eval_image_model = ChatOpenAI(
-            api_key="ms-fb065d50-eedf-41e5-9bc0-7700362c0c45",
-            model="Qwen/Qwen3-VL-30B-A3B-Instruct",
-            base_url="https://api-inference.modelscope.cn/v1",
-            temperature=0.7
-        )
 
-        def eval_image_node(state: State):
-            """
-            调用图像评估模型，根据图像URL评估图像质量
-            """
-            prompt = state["prompt"]
-            image_url = state["image_url"]
-            
-            system_prompt = """
+EVAL_IMAGE_SYSTEM_PROMPT = """
             
             你是一位具备化学专业知识的多模态AI审核员，能够同时理解一张化学实验图像和一段英文文生图提示词（prompt）。你的任务是：判断该图像是否准确、完整地呈现了提示词中描述的化学反应现象、实验器材、颜色变化、物质状态等关键视觉元素。
 
@@ -322,62 +204,336 @@ def generate_reaction_image(prompt: str, api_key: str) -> str:
             现在，请根据提供的【提示词】和【图像】，输出“ok”或“Refine prompt to: [...]”。
             
             """
+
+# 精简版：规则压缩为要点，示例只保留一个（输出为英文，无需下标后处理）
+COMPACT_GENERATE_PROMPT_SYSTEM_PROMPT = """
+    你是化学教育视觉设计师，把用户输入的化学反应（名称、方程式或描述）转为文生图模型使用的英文提示词，重点描述可观察的实验现象与场景。
+    - 未指明条件与装置时，采用中学课堂最常见的演示方式。
+    - 必须包含：核心现象（颜色变化、沉淀、气泡、火焰等）、实验器材、物质状态与外观、环境与视角（classroom lab setting, natural lighting, close-up view）。
+    - 末尾加上 ", realistic photo, high detail, educational illustration, no text, no labels"。
+    - 不出现抽象概念、文字标签、卡通风格与危险场面；无明显现象的反应用指示剂变色等方式可视化。
+    - 只输出纯英文、逗号分隔的提示词，现在时主动描述。
+
+    示例：“铁和硫酸铜反应” →
+    A shiny iron nail partially submerged in a clear glass beaker filled with bright blue copper sulfate solution, reddish-brown solid copper depositing on the nail surface, solution gradually fading to pale green, classroom lab setting, natural lighting, close-up view, realistic photo, high detail, educational illustration, no text, no labels
+    """
+
+COMPACT_EVAL_PROMPT_SYSTEM_PROMPT = """
+    你是化学教育内容审核员，检查 AI 生成的英文绘图提示词。符合要求时只输出“ok”，否则输出具体的英文改进建议。
+    检查项：核心现象（颜色变化、沉淀、气体等）；实验器材与物质状态；场景、光照与视角；末尾包含 ", realistic photo, high detail, educational illustration, no text, no labels"；适合中学课堂、无危险内容；纯英文、结构清晰、80-120词。
+
+    示例：“A shiny iron nail partially submerged in a clear glass beaker filled with bright blue copper sulfate solution, reddish-brown solid copper depositing on the nail surface, classroom lab setting, natural lighting.” →
+    “Please add details about the solution's color change and ensure to include 'realistic photo, high detail, educational illustration, no text, no labels' at the end of the prompt.”
+    """
+
+COMPACT_EVAL_IMAGE_SYSTEM_PROMPT = """
+    你是具备化学专业知识的多模态审核员，会收到【提示词】（英文文生图描述）与【图像】，判断图像是否准确呈现了提示词中的核心现象、实验器材、物质外观（颜色、状态、形态），并适合中学课堂。
+    - 一致时只输出：ok
+    - 不一致（缺失关键元素、颜色或现象错误、出现文字/卡通/无关人物）时输出：Refine prompt to: [改进后的完整英文提示词]，保留合理部分，补充缺失细节，修正错误描述。
+    - 只输出英文，不解释原因，不评价清晰度，不引入新的化学知识。
+
+    示例：提示词 "Magnesium ribbon burning with bright white flame, producing white ash, dark background"，图像中火焰为黄色且无白色灰烬 →
+    Refine prompt to: Magnesium ribbon burning with intense bright white flame (not yellow), producing visible white powdery ash (magnesium oxide), dark background to enhance contrast, realistic photo, high detail, educational illustration, no text, no labels
+    """
+
+GENERATE_PROMPT_SYSTEM_PROMPT = prompts.register(
+    "image_prompt", GENERATE_PROMPT_SYSTEM_PROMPT, COMPACT_GENERATE_PROMPT_SYSTEM_PROMPT
+).text
+EVAL_PROMPT_SYSTEM_PROMPT = prompts.register(
+    "image_prompt_eval", EVAL_PROMPT_SYSTEM_PROMPT, COMPACT_EVAL_PROMPT_SYSTEM_PROMPT
+).text
+EVAL_IMAGE_SYSTEM_PROMPT = prompts.register(
+    "image_eval", EVAL_IMAGE_SYSTEM_PROMPT, COMPACT_EVAL_IMAGE_SYSTEM_PROMPT
+).text
+
+# 系统消息在模块加载时构建一次，各节点直接复用
+GENERATE_PROMPT_SYSTEM_MESSAGE = SystemMessage(content=GENERATE_PROMPT_SYSTEM_PROMPT)
+EVAL_PROMPT_SYSTEM_MESSAGE = SystemMessage(content=EVAL_PROMPT_SYSTEM_PROMPT)
+
+
+# ===================== 图状态与上下文 =====================
+
+class State(TypedDict):
+    messages: Annotated[list[AnyMessage], operator.add]
+    prompt: str
+    eval_prompt: str
+    image_url: str
+    eval_image: str
+    prompt_generation_count: int
+    image_generation_count: int
+
+
+class ContextSchema(TypedDict):
+    api_key: str
+
+
+# ===================== 图节点 =====================
+
+@traced_node
+async def generate_prompt_node(state: State, runtime: Runtime[ContextSchema]):
+    """
+    调用提示词生成模型，生成增强后的提示词
+    """
+    model = registry.get_model(runtime.context["api_key"], feature="image_prompt")
+    
+    response = await resilience.acall(UPSTREAM_CHAT, lambda: model.ainvoke(
+        [GENERATE_PROMPT_SYSTEM_MESSAGE]
+        + state["messages"]
+    ))
+    
+    return {
+        "messages": [response],
+        "prompt": response.content,
+        "prompt_generation_count": state.get('prompt_generation_count', 0) + 1
+    }
+
+
+@traced_node
+async def eval_prompt_node(state: State, runtime: Runtime[ContextSchema]):
+    """
+    调用提示词评估模型，评估生成的提示词是否符合规范
+    """
+    model = registry.get_model(runtime.context["api_key"], feature="image_eval_prompt")
+    
+    response = await resilience.acall(UPSTREAM_CHAT, lambda: model.ainvoke(
+        [EVAL_PROMPT_SYSTEM_MESSAGE]
+        + [state["prompt"]]
+    ))
+    
+    eval_result = response.content.strip()
+    current_span().set_attribute("eval.ok", eval_result == "ok")
+    
+    return {
+        "messages": [response],
+        "eval_prompt": eval_result,
+    }
+
+
+@traced_node
+async def generate_image_node(state: State, runtime: Runtime[ContextSchema]):
+    """
+    调用图像生成模型，根据评估后的提示词生成图像
+    """
+    api_key = runtime.context["api_key"]
+    prompt = state["prompt"]
+    
+    # 设置请求头
+    common_headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+                    
+    # 提交异步图像生成任务
+    async def submit():
+        response = await registry.async_http_client.post(
+            f"{MODELSCOPE_API_BASE}v1/images/generations",
+            headers={**common_headers, "X-ModelScope-Async-Mode": "true"},
+            content=json.dumps({
+                "model": IMAGE_MODEL,
+                "prompt": prompt
+            }, ensure_ascii=False).encode('utf-8')
+            )
+        response.raise_for_status()
+        return response.json()["task_id"]
+
+    # 提交任务不是幂等操作，只在请求确定未送达时重试，避免重复创建任务
+    task_id = await resilience.acall(UPSTREAM_IMAGE, submit, idempotent=False)
             
-            response = eval_image_model.invoke([
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": f"【提示词】: {prompt}\n【图像】: {image_url}"}
-            ])
-            
-            eval_result = response.content.strip()
-            
-            output = {
-                "messages": [response],
-                "eval_image": eval_result,
+    # 由共享轮询器跟踪任务状态，任务结束时立即唤醒
+    try:
+        with tracer.span("image.poll", {"image.task_id": task_id}) as span:
+            outcome = await poller.wait(task_id, api_key)
+            span.set_attributes({"image.poll.attempts": outcome.attempts, "image.poll.status": outcome.status})
+    except asyncio.TimeoutError:
+        # 超时处理
+        return {
+            "image_url": PLACEHOLDER_IMAGE_URL + "Generation+Timeout",
+            "image_generation_count": state.get('image_generation_count', 0) + 1
+                }
+    
+    # 任务成功
+    if outcome.status == "SUCCEED":
+        image_url = outcome.data["output_images"][0]
+        return {
+            "image_url": image_url,
+            "image_generation_count": state.get('image_generation_count', 0) + 1
             }
-            
-            if "refine prompt to:" in eval_result.lower():
-                new_prompt = eval_result.split("Refine prompt to: ", 1)[-1].strip()
-                output["prompt"] = new_prompt
+        
+    # 任务失败，返回占位符URL保证前端正常渲染
+    return {
+        "image_url": PLACEHOLDER_IMAGE_URL + "Image+Generation+Failed",
+        "image_generation_count": state.get('image_generation_count', 0) + 1
+        }
 
-            return output
-            
-        builder  = StateGraph(State, context_schema=ContextSchema)
-
-        builder.add_node("generate_prompt_node", generate_prompt_node)
-        builder.add_node("eval_prompt_node", eval_prompt_node)
-        builder.add_node("generate_image_node", generate_image_node)
-        builder.add_node("eval_image_node", eval_image_node)
-
-        builder.add_edge(START, "generate_prompt_node")
-        builder.add_edge("generate_prompt_node", "eval_prompt_node")
-
-        def route_1(state: State) -> Literal["generate_prompt_node", "generate_image_node"]:
-            if state["eval_prompt"] == "ok":
-                return "generate_image_node"
-            elif state["prompt_generation_count"] > 2:
-                return "generate_image_node"
-            else:
-                return "generate_prompt_node"
-        builder.add_conditional_edges("eval_prompt_node", route_1)
-
-        builder.add_edge("generate_image_node", "eval_image_node")
-
-        def route_2(state: State) -> Literal["generate_image_node", END]:
-            if state["eval_image"] == "ok":
-                return END
-            elif state["image_generation_count"] > 2:
-                return END
-            else:
-                return "generate_image_node"
-        builder.add_conditional_edges("eval_image_node", route_2)
-            
-        graph = builder.compile()
+
+@traced_node
+async def eval_image_node(state: State, runtime: Runtime[ContextSchema]):
+    """
+    调用图像评估模型，根据图像URL评估图像质量
+    """
+    prompt = state["prompt"]
+    image_url = state["image_url"]
+    model = registry.get_model(runtime.context["api_key"], feature="image_eval")
+    
+    response = await resilience.acall(UPSTREAM_CHAT, lambda: model.ainvoke([
+        {"role": "system", "content": EVAL_IMAGE_SYSTEM_PROMPT},
+        {"role": "user", "content": f"【提示词】: {prompt}\n【图像】: {image_url}"}
+    ]))
+    
+    eval_result = response.content.strip()
+    current_span().set_attribute("eval.ok", eval_result == "ok")
+    
+    output = {
+        "messages": [response],
+        "eval_image": eval_result,
+    }
+    
+    if "refine prompt to:" in eval_result.lower():
+        new_prompt = eval_result.split("Refine prompt to: ", 1)[-1].strip()
+        output["prompt"] = new_prompt
+
+    return output
+
+
+# ===================== 路由 =====================
+
+def route_1(state: State) -> Literal["generate_prompt_node", "generate_image_node"]:
+    if state["eval_prompt"] == "ok":
+        return "generate_image_node"
+    elif state["prompt_generation_count"] > 2:
+        return "generate_image_node"
+    else:
+        return "generate_prompt_node"
+
+
+def route_2(state: State) -> Literal["generate_image_node", END]:
+    if state["eval_image"] == "ok":
+        return END
+    elif state["image_generation_count"] > 2:
+        return END
+    else:
+        return "generate_image_node"
+
+
+# ===================== 图构建 =====================
+
+def build_graph():
+    """构建并编译反应现象文生图工作流"""
+    builder  = StateGraph(State, context_schema=ContextSchema)
+
+    builder.add_node("generate_prompt_node", generate_prompt_node)
+    builder.add_node("eval_prompt_node", eval_prompt_node)
+    builder.add_node("generate_image_node", generate_image_node)
+    builder.add_node("eval_image_node", eval_image_node)
+
+    builder.add_edge(START, "generate_prompt_node")
+    builder.add_edge("generate_prompt_node", "eval_prompt_node")
+    builder.add_conditional_edges("eval_prompt_node", route_1)
+    builder.add_edge("generate_image_node", "eval_image_node")
+    builder.add_conditional_edges("eval_image_node", route_2)
+
+    return builder.compile()
+
+
+# 模块导入时编译一次，所有请求共享
+graph = build_graph()
+
+
+# ===================== 对外接口 =====================
+
+def generate_reaction_image(prompt: str, api_key: str) -> str:
+    """
+    同步入口：在后台事件循环中执行异步图像生成流程
+    
+    Args:
+        prompt: 简要反应现象描述
+        api_key: ModelScope API密钥（必需）
         
-        response = graph.invoke({"messages": [{"role": "user", "content": prompt}]}, context={"api_key": api_key})
+    Returns:
+        图像URL或占位符URL（生成失败时）
+    """
+    return run_coroutine_sync(agenerate_reaction_image(prompt, api_key))
+
+
+async def arun_reaction_image_graph(
+    prompt: str,
+    api_key: str,
+    on_node: Optional[Callable[[str], None]] = None,
+) -> str:
+    """
+    执行文生图工作流，逐个节点上报进度（异常直接抛出）
+    
+    Args:
+        prompt: 简要反应现象描述
+        api_key: ModelScope API密钥（必需）
+        on_node: 每个节点开始执行时的回调，参数为节点名称
+        
+    Returns:
+        最终图像URL（通过评估并保存到本地存储时为 /api/images/{digest}）
+    """
+    async with tracer.atrace("reaction_image", {"reaction.prompt": prompt}) as root:
+        # 本地存储以规范化的用户输入为键：重复请求在任何模型调用之前命中，直接返回
+        digest = image_store.digest(canonicalize(prompt), IMAGE_MODEL)
+        stored = await image_store.aget(digest)
+        root.set_attribute("image.store_hit", stored is not None)
+        if stored is not None:
+            logger.info(f"[图像存储] 命中 {digest[:12]}")
+            return stored.url
+
+        image_url = None
+        # 最新生成的图像是否通过评估
+        image_accepted = False
+        # 各节点的开始时间（按任务ID），节点结束时记入 image.node.<节点名> 阶段耗时
+        node_started = {}
+        async for event in graph.astream(
+            {"messages": [{"role": "user", "content": prompt}]},
+            context={"api_key": api_key},
+            stream_mode="tasks",
+        ):
+            # tasks 模式：节点开始时事件含 input，结束时事件含 result
+            if "input" in event:
+                node_started[event["id"]] = time.perf_counter()
+                if on_node is not None:
+                    on_node(event["name"])
+                continue
+            started = node_started.pop(event.get("id"), None)
+            if started is not None:
+                latency(f"image.node.{event['name']}").observe(time.perf_counter() - started)
+            if isinstance(event.get("result"), dict) and event["result"].get("image_url"):
+                image_url = event["result"]["image_url"]
+                image_accepted = False
+            if event["name"] == "eval_image_node" and isinstance(event.get("result"), dict):
+                image_accepted = event["result"].get("eval_image") == "ok"
+        
+        if image_url is None:
+            raise RuntimeError("工作流未产生图像")
+        
+        # 通过评估的最终图像下载到本地存储，远程URL过期后仍可访问；
+        # 评估未通过（重试次数用尽）或生成失败的图像只返回远程URL，避免之后命中存储时跳过评估
+        if image_accepted and not image_url.startswith(PLACEHOLDER_IMAGE_URL):
+            with tracer.span("image.store", {"image.digest": digest}) as span:
+                try:
+                    stored = await image_store.save_from_url(digest, image_url, registry.async_http_client)
+                    image_url = stored.url
+                except ImageDownloadError as e:
+                    span.set_error(e)
+                    logger.warning(f"[图像存储] {str(e)}，返回远程URL")
+        return image_url
+
+
+async def agenerate_reaction_image(prompt: str, api_key: str) -> str:
+    """
+    Args:
+        prompt: 简要反应现象描述
+        api_key: ModelScope API密钥（必需）
         
-        return response["image_url"]
+    Returns:
+        图像URL或占位符URL（生成失败时）
+    """
+    try:
+        return await arun_reaction_image_graph(prompt, api_key)
         
     except Exception as e:
         logger.error(f"生成图像失败: {str(e)}")
         # 返回占位符URL保证前端正常渲染
-        return "https://via.placeholder.com/512x512?text=Generation+Error"
+        return PLACEHOLDER_IMAGE_URL + "Generation+Error"
@@ -0,0 +1,222 @@
+"""
+识别缓存模块 - 物质识别结果的图像内容缓存
+
+- 精确键：图片字节的 sha256（同一文件重复上传）
+- 近似键：64 位差值哈希（dHash）+ 4×4 分块平均颜色。dHash 汉明距离不超过阈值、
+  且各分块颜色差不超过阈值才视为同一张照片（同一烧杯拍两次、不同班级重新压缩后上传）；
+  dHash 只看灰度明暗，颜色不同的溶液（CuSO₄ 蓝色、FeCl₃ 黄色）需由颜色区分
+- 条目数有上限，按最近访问（LRU）淘汰
+- 提示词版本参与匹配，修改提示词后旧结果自动失效
+
+近似键需要 Pillow 与 NumPy 解码图片；未安装时只做精确匹配。NumPy 导入较慢，首次计算近似键时才导入。
+"""
+
+import base64
+import binascii
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+HAS_IMAGING = all(importlib.util.find_spec(name) is not None for name in ("numpy", "PIL"))
+
+logger = logging.getLogger(__name__)
+
+# 缓存条目数、近似匹配的最大汉明距离（64 位中不同的位数，负数表示只做精确匹配）
+RECOGNIZE_CACHE_SIZE = int(os.getenv("CHEM_RECOGNIZE_CACHE_SIZE", "256"))
+RECOGNIZE_HASH_DISTANCE = int(os.getenv("CHEM_RECOGNIZE_HASH_DISTANCE", "6"))
+# 近似匹配时各分块平均颜色（RGB 通道，0-255）的最大差值
+RECOGNIZE_COLOR_DISTANCE = int(os.getenv("CHEM_RECOGNIZE_COLOR_DISTANCE", "24"))
+
+# dHash 尺寸：缩放为 (HASH_SIZE + 1) × HASH_SIZE 灰度图，比较相邻像素得到 HASH_SIZE² 位
+HASH_SIZE = 8
+# 颜色签名尺寸：缩放为 COLOR_GRID × COLOR_GRID 彩色图，每块一个平均 RGB
+COLOR_GRID = 4
+
+
+@dataclass(frozen=True)
+class ImageFingerprint:
+    """图片指纹"""
+    sha256: str
+    dhash: Optional[int]
+    # 各分块平均 RGB（COLOR_GRID² × 3 字节），无法解码时为 None
+    colors: Optional[bytes] = None
+
+
+def decode_data_url(image_url: str) -> Optional[bytes]:
+    """解码 base64 data URL，不是 data URL 或格式错误时返回 None"""
+    if not image_url.startswith("data:"):
+        return None
+    header, sep, payload = image_url.partition(",")
+    if not sep or not header.endswith(";base64"):
+        return None
+    try:
+        return base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def perceptual_key(data: bytes) -> Tuple[Optional[int], Optional[bytes]]:
+    """
+    计算图片的差值哈希与分块颜色签名（只解码一次）
+
+    Args:
+        data: 图片文件字节
+
+    Returns:
+        (64 位 dHash, 分块平均 RGB)，无法解码或未安装 Pillow/NumPy 时均为 None
+    """
+    if not HAS_IMAGING:
+        return None, None
+    import numpy as np
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # JPEG 直接按缩小尺寸解码，大照片无需完整解码
+            image.draft("RGB", (HASH_SIZE * 4, HASH_SIZE * 4))
+            rgb = image.convert("RGB")
+            small = rgb.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BILINEAR)
+            pixels = np.asarray(small, dtype=np.int16)
+            colors = rgb.resize((COLOR_GRID, COLOR_GRID), Image.Resampling.BOX).tobytes()
+    except Exception as e:
+        logger.warning(f"[识别缓存] 图片解码失败: {str(e)}")
+        return None, None
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big"), colors
+
+
+def color_distance(a: bytes, b: bytes) -> int:
+    """两个颜色签名中对应分块、对应通道的最大差值"""
+    return max(abs(x - y) for x, y in zip(a, b))
+
+
+def fingerprint(image_url: str) -> ImageFingerprint:
+    """
+    计算图片指纹（CPU 密集，调用方应在线程池中执行）
+
+    data URL 按解码后的图片字节计算；普通 URL 只按地址计算精确键。
+    """
+    data = decode_data_url(image_url)
+    if data is None:
+        return ImageFingerprint(hashlib.sha256(image_url.encode("utf-8")).hexdigest(), None)
+    return fingerprint_bytes(data)
+
+
+def fingerprint_bytes(data: bytes, sha256: Optional[str] = None) -> ImageFingerprint:
+    """
+    计算图片字节的指纹（CPU 密集，调用方应在线程池中执行）
+
+    Args:
+        data: 图片文件字节
+        sha256: 已在接收时增量计算的摘要，可省去重复计算
+    """
+    return ImageFingerprint(sha256 or hashlib.sha256(data).hexdigest(), *perceptual_key(data))
+
+
+class RecognitionCache:
+    """物质识别结果缓存（精确 + 感知哈希近似匹配，LRU 淘汰）"""
+
+    def __init__(
+        self,
+        max_size: int = RECOGNIZE_CACHE_SIZE,
+        max_distance: int = RECOGNIZE_HASH_DISTANCE,
+        max_color_distance: int = RECOGNIZE_COLOR_DISTANCE,
+    ):
+        """
+        Args:
+            max_size: 最大条目数
+            max_distance: 近似匹配的最大汉明距离，负数表示只做精确匹配
+            max_color_distance: 近似匹配时分块平均颜色的最大差值
+        """
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.max_color_distance = max_color_distance
+
+        # sha256 → (dhash, 颜色签名, 提示词版本, 结果)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, fp: ImageFingerprint, version: str) -> Optional[str]:
+        """
+        查询识别结果
+
+        Args:
+            fp: 图片指纹
+            version: 提示词版本
+
+        Returns:
+            缓存的识别结果，未命中时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(fp.sha256)
+            if entry is not None and entry[2] == version:
+                self._entries.move_to_end(fp.sha256)
+                self.exact_hits += 1
+                return entry[3]
+
+            key = self._nearest(fp, version)
+            if key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.near_hits += 1
+            return self._entries[key][3]
+
+    def set(self, fp: ImageFingerprint, version: str, value: str) -> None:
+        """写入识别结果"""
+        with self._lock:
+            self._entries[fp.sha256] = (fp.dhash, fp.colors, version, value)
+            self._entries.move_to_end(fp.sha256)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """导出命中率与淘汰统计"""
+        hits = self.exact_hits + self.near_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "max_distance": self.max_distance,
+            "max_color_distance": self.max_color_distance,
+            "perceptual_hash": HAS_IMAGING,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def _nearest(self, fp: ImageFingerprint, version: str) -> Optional[str]:
+        """查找汉明距离最近且不超过阈值、颜色也相近的条目（调用方需持有锁）"""
+        if fp.dhash is None or fp.colors is None or self.max_distance < 0:
+            return None
+        best_key, best_distance = None, self.max_distance + 1
+        for key, (other, colors, entry_version, _) in self._entries.items():
+            if other is None or colors is None or entry_version != version:
+                continue
+            distance = (fp.dhash ^ other).bit_count()
+            if distance < best_distance and color_distance(fp.colors, colors) <= self.max_color_distance:
+                best_key, best_distance = key, distance
+        return best_key
+
+
+# 进程级单例
+recognition_cache = RecognitionCache()
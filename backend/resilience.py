@@ -0,0 +1,368 @@
+"""
+上游容错模块 - ModelScope 调用的重试与熔断
+
+- 重试：只重试暂时性故障（网络错误、超时、HTTP 429 / 5xx），指数退避 + 全抖动
+  非幂等调用（提交文生图任务）只在请求确定未被服务端接收时重试（连接失败、429）
+- 熔断：每个上游连续失败 CHEM_BREAKER_THRESHOLD 次后断开，期间请求立即失败（CircuitOpenError），
+  CHEM_BREAKER_RESET_TIMEOUT 秒后进入半开状态放行一个探测请求，成功则恢复，失败则重新断开
+- 4xx（密钥错误、参数错误等）说明上游可用，不重试也不计入熔断
+- 429 多为单个密钥的配额耗尽：照常退避重试，但不计入熔断，避免一个密钥的限流让所有用户的调用被拒
+- 流式调用只在尚未产出任何片段时重试；agent_text_chunks 把智能体的流式输出转换为文本片段，供 astream 使用
+- 成功调用的耗时记入 upstream.<上游> 阶段，流式调用另记首个片段耗时 upstream.<上游>.ttft
+- 在追踪中时，非流式调用记录 upstream.<上游> span（含重试事件与 token 用量）
+
+ChatOpenAI 自带的重试已关闭（max_retries=0），统一由本模块处理，避免重试次数叠加。
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+
+try:
+    from .metrics import latency
+    from .tracing import record_usage, tracer
+except ImportError:
+    from backend.metrics import latency
+    from backend.tracing import record_usage, tracer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 每次调用的最多尝试次数（含首次）、退避基数与上限（秒）
+RETRY_ATTEMPTS = int(os.getenv("CHEM_RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.getenv("CHEM_RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("CHEM_RETRY_MAX_DELAY", "8"))
+# 熔断阈值（连续失败次数）与断开后进入半开状态的等待时间（秒）
+BREAKER_THRESHOLD = int(os.getenv("CHEM_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("CHEM_BREAKER_RESET_TIMEOUT", "30"))
+
+# 上游名称
+UPSTREAM_CHAT = "chat"
+UPSTREAM_IMAGE = "image"
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# 请求确定没有到达服务端的异常（非幂等调用也可以安全重试）
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CircuitOpenError(Exception):
+    """上游熔断中，请求未发出"""
+
+    def __init__(self, upstream: str, retry_after: float):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        super().__init__(f"上游服务暂时不可用，请 {self.retry_after_seconds} 秒后重试")
+
+    @property
+    def retry_after_seconds(self) -> int:
+        """Retry-After 响应头使用的整数秒"""
+        return max(1, int(self.retry_after + 0.999))
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """提取 HTTP 状态码（httpx 与 openai SDK 的状态码异常）"""
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code
+    status = getattr(exc, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(exc: BaseException) -> bool:
+    """是否为暂时性故障（可重试；除 429 外计入熔断）"""
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(exc, (httpx.TransportError, asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    # openai SDK 的连接错误与超时（APIConnectionError / APITimeoutError）
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """是否为上游限流（HTTP 429）"""
+    return _status_code(exc) == 429
+
+
+def is_not_sent(exc: BaseException) -> bool:
+    """请求是否确定未被服务端接收"""
+    if isinstance(exc, _NOT_SENT_ERRORS) or is_rate_limited(exc):
+        return True
+    cause = exc.__cause__ or exc.__context__
+    return isinstance(cause, _NOT_SENT_ERRORS)
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """第 attempt 次重试前的等待时间（全抖动：0 到指数上限之间均匀分布）"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """单个上游的熔断器（线程安全，同步与异步调用共用）"""
+
+    def __init__(self, name: str, threshold: int = BREAKER_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.successes = 0
+        self.errors = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.short_circuited = 0
+        self.opens = 0
+
+    def before_call(self) -> None:
+        """
+        发起调用前检查
+
+        Raises:
+            CircuitOpenError: 熔断中，或半开状态下已有探测请求在进行
+        """
+        with self._lock:
+            if self.state == STATE_OPEN:
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.short_circuited += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self.state = STATE_HALF_OPEN
+                logger.info(f"[熔断] {self.name} 进入半开状态，放行探测请求")
+            if self.state == STATE_HALF_OPEN:
+                if self._probing:
+                    self.short_circuited += 1
+                    raise CircuitOpenError(self.name, self.reset_timeout)
+                self._probing = True
+            self.calls += 1
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.successes += 1
+            self.failures = 0
+            self._probing = False
+            if self.state != STATE_CLOSED:
+                logger.info(f"[熔断] {self.name} 已恢复")
+                self.state = STATE_CLOSED
+
+    def on_failure(self, exc: BaseException) -> None:
+        with self._lock:
+            self._probing = False
+            if is_rate_limited(exc):
+                # 限流按密钥计算，不代表上游故障：既不计入也不清零连续失败，半开状态由下一个请求继续探测
+                self.rate_limited += 1
+                return
+            if not is_transient(exc):
+                # 上游有响应（如 401 / 400），不计入熔断；半开探测也视为恢复
+                if self.state == STATE_HALF_OPEN:
+                    self.state = STATE_CLOSED
+                self.failures = 0
+                return
+            self.errors += 1
+            self.failures += 1
+            if self.state == STATE_HALF_OPEN or self.failures >= self.threshold:
+                if self.state != STATE_OPEN:
+                    self.opens += 1
+                    logger.warning(f"[熔断] {self.name} 连续失败 {self.failures} 次，断开 {self.reset_timeout:.0f}s")
+                self.state = STATE_OPEN
+                self.opened_at = time.monotonic()
+
+    def on_retry(self) -> None:
+        """记录一次重试"""
+        with self._lock:
+            self.retries += 1
+
+    def on_cancel(self) -> None:
+        """调用被取消（客户端断开），不计入成功或失败"""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "calls": self.calls,
+                "successes": self.successes,
+                "errors": self.errors,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "short_circuited": self.short_circuited,
+                "opens": self.opens,
+            }
+
+
+class Resilience:
+    """按上游划分熔断器，并提供带重试的调用入口"""
+
+    def __init__(
+        self,
+        attempts: int = RETRY_ATTEMPTS,
+        threshold: int = BREAKER_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        self.attempts = max(1, attempts)
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, upstream: str) -> CircuitBreaker:
+        """获取（必要时创建）上游的熔断器"""
+        breaker = self._breakers.get(upstream)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    upstream, CircuitBreaker(upstream, self.threshold, self.reset_timeout)
+                )
+        return breaker
+
+    def _should_retry(self, exc: BaseException, attempt: int, idempotent: bool) -> bool:
+        if attempt + 1 >= self.attempts or not is_transient(exc):
+            return False
+        return idempotent or is_not_sent(exc)
+
+    async def acall(
+        self, upstream: str, factory: Callable[[], Awaitable[T]], idempotent: bool = True
+    ) -> T:
+        """
+        调用上游（异步），暂时性故障按退避重试
+
+        Args:
+            upstream: 上游名称（UPSTREAM_CHAT / UPSTREAM_IMAGE）
+            factory: 每次尝试时创建调用协程的函数
+            idempotent: 调用是否幂等；非幂等调用只在请求未发出时重试
+
+        Raises:
+            CircuitOpenError: 上游熔断中
+        """
+        breaker = self.breaker(upstream)
+        tracker = latency(f"upstream.{upstream}")
+        attempt = 0
+        with tracer.span(f"upstream.{upstream}") as span:
+            while True:
+                breaker.before_call()
+                start = time.perf_counter()
+                try:
+                    result = await factory()
+                except asyncio.CancelledError:
+                    breaker.on_cancel()
+                    raise
+                except Exception as e:
+                    breaker.on_failure(e)
+                    if not self._should_retry(e, attempt, idempotent):
+                        raise
+                    delay = backoff_delay(attempt)
+                    breaker.on_retry()
+                    attempt += 1
+                    logger.warning(f"[重试] {upstream} 第{attempt}次重试（{delay:.2f}s 后）: {type(e).__name__}: {str(e)}")
+                    span.add_event("retry", {"attempt": attempt, "delay": delay, "error": type(e).__name__})
+                    await asyncio.sleep(delay)
+                    continue
+                breaker.on_success()
+                tracker.observe(time.perf_counter() - start)
+                span.set_attribute("retry.count", attempt)
+                record_usage(span, result)
+                return result
+
+    def call(self, upstream: str, fn: Callable[[], T], idempotent: bool = True) -> T:
+        """调用上游（同步版本，在工作线程中使用）"""
+        breaker = self.breaker(upstream)
+        tracker = latency(f"upstream.{upstream}")
+        attempt = 0
+        with tracer.span(f"upstream.{upstream}") as span:
+            while True:
+                breaker.before_call()
+                start = time.perf_counter()
+                try:
+                    result = fn()
+                except Exception as e:
+                    breaker.on_failure(e)
+                    if not self._should_retry(e, attempt, idempotent):
+                        raise
+                    delay = backoff_delay(attempt)
+                    breaker.on_retry()
+                    attempt += 1
+                    logger.warning(f"[重试] {upstream} 第{attempt}次重试（{delay:.2f}s 后）: {type(e).__name__}: {str(e)}")
+                    span.add_event("retry", {"attempt": attempt, "delay": delay, "error": type(e).__name__})
+                    time.sleep(delay)
+                    continue
+                breaker.on_success()
+                tracker.observe(time.perf_counter() - start)
+                span.set_attribute("retry.count", attempt)
+                record_usage(span, result)
+                return result
+
+    async def astream(self, upstream: str, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        调用上游流式接口，只在尚未产出任何片段时重试
+
+        Args:
+            upstream: 上游名称
+            factory: 每次尝试时创建异步迭代器的函数
+        """
+        breaker = self.breaker(upstream)
+        ttft = latency(f"upstream.{upstream}.ttft")
+        tracker = latency(f"upstream.{upstream}")
+        attempt = 0
+        while True:
+            breaker.before_call()
+            started = False
+            start = time.perf_counter()
+            try:
+                async for chunk in factory():
+                    if not started:
+                        started = True
+                        ttft.observe(time.perf_counter() - start)
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                breaker.on_cancel()
+                raise
+            except Exception as e:
+                breaker.on_failure(e)
+                if started or not self._should_retry(e, attempt, True):
+                    raise
+                delay = backoff_delay(attempt)
+                breaker.on_retry()
+                attempt += 1
+                logger.warning(f"[重试] {upstream} 流式第{attempt}次重试（{delay:.2f}s 后）: {type(e).__name__}: {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+            breaker.on_success()
+            tracker.observe(time.perf_counter() - start)
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        """导出各上游的熔断与重试统计"""
+        return {
+            "attempts": self.attempts,
+            "threshold": self.threshold,
+            "reset_timeout": self.reset_timeout,
+            "upstreams": {name: breaker.snapshot() for name, breaker in sorted(self._breakers.items())},
+        }
+
+
+async def agent_text_chunks(agent: Any, agent_input: dict) -> AsyncIterator[str]:
+    """只转发智能体中模型节点产出的文本片段（讲解、配平等流式接口共用）"""
+    async for chunk, metadata in agent.astream(agent_input, stream_mode="messages"):
+        if metadata.get("langgraph_node") != "model":
+            continue
+        if isinstance(chunk.content, str) and chunk.content:
+            yield chunk.content
+
+
+# 进程级单例
+resilience = Resilience()
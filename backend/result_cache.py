@@ -0,0 +1,286 @@
+"""
+结果缓存模块 - 讲解反应 / 配平方程式的两级结果缓存
+
+- 内存 LRU 层：进程内热点结果
+- SQLite 磁盘层：重启后仍然有效，按最近访问时间淘汰
+- 缓存键 = 功能 + 提示词版本 + 规范化输入
+  规范化由 chem_parser 完成，统一空白、反应箭头（= / → / ->）、下标数字（₂ → 2）和反应物顺序；
+  提示词版本由系统提示词、模型和温度计算，修改提示词后旧结果自动失效
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    from .executor import run_sync
+    from .chem_parser import split_equation, try_parse_equation
+except ImportError:
+    from backend.executor import run_sync
+    from backend.chem_parser import split_equation, try_parse_equation
+
+logger = logging.getLogger(__name__)
+
+# 内存层容量、磁盘层容量、结果有效期（秒）
+RESULT_CACHE_MEMORY_SIZE = int(os.getenv("CHEM_RESULT_CACHE_MEMORY_SIZE", "512"))
+RESULT_CACHE_DISK_SIZE = int(os.getenv("CHEM_RESULT_CACHE_DISK_SIZE", "20000"))
+RESULT_CACHE_TTL = float(os.getenv("CHEM_RESULT_CACHE_TTL", str(30 * 24 * 3600)))
+# 磁盘层文件路径，设为空字符串则只使用内存层
+RESULT_CACHE_PATH = os.getenv(
+    "CHEM_RESULT_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "results.sqlite3"),
+)
+
+
+def prompt_version(system_prompt: str, model: str, temperature: float) -> str:
+    """根据系统提示词、模型和温度计算提示词版本"""
+    raw = f"{model}\n{temperature}\n{system_prompt}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def canonicalize(text: str) -> str:
+    """
+    规范化化学输入，使等价写法得到相同的缓存键
+
+    例如 "H2O = O2 + H2"、"H₂O → H₂ + O₂"、"2H2O->2H2+O2" 规范化结果相同（"H2O=H2+O2"）。
+    无法解析为方程式的输入按词法拆分后各侧排序（如 "Na + Cl2"），
+    普通描述（如 "镁条燃烧"）只做字符与空白规范化。
+    """
+    equation = try_parse_equation(text)
+    if equation is not None:
+        return equation.canonical()
+    return "=".join("+".join(sorted(side)) for side in split_equation(text))
+
+
+class ResultCache:
+    """两级结果缓存（内存 LRU + SQLite）"""
+
+    def __init__(
+        self,
+        path: Optional[str] = RESULT_CACHE_PATH,
+        memory_size: int = RESULT_CACHE_MEMORY_SIZE,
+        disk_size: int = RESULT_CACHE_DISK_SIZE,
+        ttl: float = RESULT_CACHE_TTL,
+    ):
+        """
+        Args:
+            path: SQLite 文件路径，为空时不使用磁盘层
+            memory_size: 内存层最大条目数
+            disk_size: 磁盘层最大条目数
+            ttl: 结果有效期（秒）
+        """
+        self.path = path or None
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.ttl = ttl
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+
+    @staticmethod
+    def make_key(feature: str, text: str, version: str) -> str:
+        """构建缓存键"""
+        raw = f"{feature}\n{version}\n{canonicalize(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    # ===================== 同步接口 =====================
+
+    def get(self, feature: str, text: str, version: str) -> Optional[str]:
+        """
+        查询缓存结果
+
+        Args:
+            feature: 功能标识（如 "explain"、"balance"）
+            text: 用户输入
+            version: 提示词版本
+
+        Returns:
+            缓存的结果文本，未命中时返回 None
+        """
+        key = self.make_key(feature, text, version)
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        value = self._disk_get(key)
+        self._record_lookup(key, value)
+        return value
+
+    def set(self, feature: str, text: str, version: str, value: str) -> None:
+        """写入缓存结果"""
+        key = self.make_key(feature, text, version)
+        self._memory_set(key, value)
+        self._disk_set(key, feature, value)
+
+    # ===================== 异步接口（磁盘读写在线程池中执行） =====================
+
+    async def aget(self, feature: str, text: str, version: str) -> Optional[str]:
+        """查询缓存结果（异步）"""
+        key = self.make_key(feature, text, version)
+        value = self._memory_get(key)
+        if value is not None:
+            return value
+        if self.path is not None:
+            value = await run_sync(self._disk_get, key)
+        self._record_lookup(key, value)
+        return value
+
+    async def aset(self, feature: str, text: str, version: str, value: str) -> None:
+        """写入缓存结果（异步）"""
+        key = self.make_key(feature, text, version)
+        self._memory_set(key, value)
+        if self.path is not None:
+            await run_sync(self._disk_set, key, feature, value)
+
+    def warm_up(self) -> None:
+        """预先打开磁盘缓存（建库、切换 WAL），避免计入首个请求"""
+        if self.path is not None:
+            with self._db_lock:
+                self._connect()
+
+    def clear(self) -> None:
+        """清空内存层与磁盘层"""
+        with self._lock:
+            self._memory.clear()
+        if self.path is not None:
+            with self._db_lock:
+                db = self._connect()
+                db.execute("DELETE FROM results")
+                db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """导出命中率与淘汰统计"""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_size": len(self._memory),
+            "memory_max_size": self.memory_size,
+            "disk_enabled": self.path is not None,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "memory_evictions": self.memory_evictions,
+            "disk_evictions": self.disk_evictions,
+        }
+
+    # ===================== 内存层 =====================
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if now - created_at > self.ttl:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return value
+
+    def _memory_set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._memory[key] = (value, time.time())
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+                self.memory_evictions += 1
+
+    def _record_lookup(self, key: str, value: Optional[str]) -> None:
+        """记录内存层未命中后的查询结果，磁盘命中回填内存层"""
+        if value is None:
+            with self._lock:
+                self.misses += 1
+            return
+        with self._lock:
+            self.disk_hits += 1
+        self._memory_set(key, value)
+
+    # ===================== 磁盘层 =====================
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开（必要时创建）SQLite 数据库，调用方需持有 _db_lock"""
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " feature TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS idx_results_accessed ON results (accessed_at)")
+            db.commit()
+            self._db = db
+            logger.info(f"[结果缓存] 磁盘缓存: {self.path}")
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        if self.path is None:
+            return None
+        now = time.time()
+        try:
+            with self._db_lock:
+                db = self._connect()
+                row = db.execute(
+                    "SELECT value, created_at FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl:
+                    db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    db.commit()
+                    return None
+                db.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+                db.commit()
+                return row[0]
+        except sqlite3.Error as e:
+            # 磁盘缓存故障不影响主流程
+            logger.warning(f"[结果缓存] 读取失败: {str(e)}")
+            return None
+
+    def _disk_set(self, key: str, feature: str, value: str) -> None:
+        if self.path is None:
+            return
+        now = time.time()
+        try:
+            with self._db_lock:
+                db = self._connect()
+                db.execute(
+                    "INSERT OR REPLACE INTO results (key, feature, value, created_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (key, feature, value, now, now),
+                )
+                overflow = db.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.disk_size
+                if overflow > 0:
+                    db.execute(
+                        "DELETE FROM results WHERE key IN"
+                        " (SELECT key FROM results ORDER BY accessed_at LIMIT ?)",
+                        (overflow,),
+                    )
+                    self.disk_evictions += overflow
+                db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"[结果缓存] 写入失败: {str(e)}")
+
+
+# 进程级单例
+result_cache = ResultCache()
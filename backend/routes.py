@@ -2,22 +2,101 @@
 API路由层 - HTTP端点定义
 """
 
+import json
 import logging
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse, Response
+import time
+from typing import AsyncIterator
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 
 from .models import (
     ReactionExplainRequest,
+    ReactionExplainBatchRequest,
     EquationBalanceRequest,
+    EquationBalanceBatchRequest,
     ReactionImageRequest,
     MaterialRecognizeRequest,
     BaseResponse,
 )
-from .services import ChemistryService
+from .services import ChemistryService, image_jobs, single_flight
+from .jobs import JobQueueFullError
+from .admission import RateLimitedError, admission
+from .resilience import CircuitOpenError, resilience
+from .hedging import hedger
+from .metrics import CONTENT_TYPE, CollectedMetric, latency_snapshot, register_collector, render_metrics
+from .client_registry import registry
+from .task_poller import poller
+from .result_cache import result_cache
+from .image_store import image_store
+from .recognition_cache import recognition_cache
+from .image_preprocess import image_preprocessor
+from .prompts import prompts
+from .upload import UploadError, UploadTooLargeError, receive_image
+from .executor import run_sync
+from .warmup import warmup
+from .tracing import tracer
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["Chemistry Teaching"])
+# Prometheus 抓取接口（/metrics，不带 /api 前缀）
+metrics_router = APIRouter(tags=["Monitoring"])
+
+
+def _sse_event(data: dict, event: str = None) -> str:
+    """格式化一条 Server-Sent Event"""
+    payload = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+
+def _retry_later(status_code: int, e) -> HTTPException:
+    """
+    稍后重试类错误，通过 Retry-After 告知客户端何时重试
+
+    - 429：超出速率限制（RateLimitedError）
+    - 503：上游熔断中（CircuitOpenError）
+    """
+    return HTTPException(
+        status_code=status_code,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after_seconds)},
+    )
+
+
+def _sse_response(chunks: AsyncIterator[str], error_message: str) -> StreamingResponse:
+    """
+    将文本片段流包装为 SSE 响应
+
+    - 每个片段：data: {"token": "..."}
+    - 结束：event: done，附带首字节时间与总耗时（秒）
+    - 出错：event: error（限流或上游熔断时附带 retry_after 秒数）
+    """
+    async def event_stream():
+        start = time.perf_counter()
+        ttfb = None
+        try:
+            async for chunk in chunks:
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                yield _sse_event({"token": chunk})
+            yield _sse_event({"ttfb": ttfb, "total": time.perf_counter() - start}, event="done")
+        except (RateLimitedError, CircuitOpenError) as e:
+            yield _sse_event({"error": str(e), "retry_after": e.retry_after_seconds}, event="error")
+        except Exception as e:
+            logger.error(f"{error_message}: {str(e)}")
+            yield _sse_event({"error": "处理请求失败"}, event="error")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
 
 
 # ===================== 健康检查 =====================
@@ -32,6 +111,14 @@ async def health_check():
     }
 
 
+@router.get("/ready")
+async def readiness_check():
+    """就绪检查接口：启动预热完成前返回 503"""
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "warmup": warmup.stats()})
+    return {"status": "ready", "warmup": warmup.stats()}
+
+
 @router.get("/config")
 async def get_config():
     """获取API配置信息"""
@@ -46,13 +133,97 @@ async def get_config():
         ],
         "endpoints": {
             "explain_reaction": "/api/reaction/explain",
+            "explain_reaction_stream": "/api/reaction/explain/stream",
+            "explain_reaction_batch": "/api/reaction/explain/batch",
             "balance_equation": "/api/equation/balance",
+            "balance_equation_stream": "/api/equation/balance/stream",
+            "balance_equation_batch": "/api/equation/balance/batch",
             "generate_image": "/api/reaction/image",
-            "recognize_material": "/api/material/recognize"
+            "image_job_status": "/api/reaction/image/{job_id}",
+            "stored_image": "/api/images/{digest}",
+            "recognize_material": "/api/material/recognize",
+            "recognize_material_upload": "/api/material/recognize/upload"
         }
     }
 
 
+@router.get("/stats")
+async def get_stats():
+    """获取运行时统计信息（客户端缓存、连接复用等）"""
+    return {
+        "client_registry": registry.stats(),
+        "image_task_poller": poller.stats(),
+        "image_jobs": image_jobs.stats(),
+        "single_flight": single_flight.stats(),
+        "result_cache": result_cache.stats(),
+        "image_store": image_store.stats(),
+        "recognition_cache": recognition_cache.stats(),
+        "image_preprocess": image_preprocessor.stats(),
+        "admission": admission.stats(),
+        "resilience": resilience.stats(),
+        "hedging": hedger.stats(),
+        "prompts": prompts.stats(),
+        "warmup": warmup.stats(),
+        "tracing": tracer.stats(),
+        "latency": latency_snapshot(),
+    }
+
+
+def _collect_component_metrics():
+    """导出时读取各组件已有的计数（缓存命中、任务状态、熔断与限流），不增加请求路径开销"""
+    result = result_cache.stats()
+    recognition = recognition_cache.stats()
+    images = image_store.stats()
+    flights = single_flight.stats()
+    yield CollectedMetric("chem_cache_requests_total", "counter", "缓存查询次数（按缓存与结果）", [
+        ({"cache": "result", "result": "memory_hit"}, result["memory_hits"]),
+        ({"cache": "result", "result": "disk_hit"}, result["disk_hits"]),
+        ({"cache": "result", "result": "miss"}, result["misses"]),
+        ({"cache": "recognition", "result": "exact_hit"}, recognition["exact_hits"]),
+        ({"cache": "recognition", "result": "near_hit"}, recognition["near_hits"]),
+        ({"cache": "recognition", "result": "miss"}, recognition["misses"]),
+        ({"cache": "image_store", "result": "hit"}, images["hits"]),
+        ({"cache": "image_store", "result": "miss"}, images["misses"]),
+        ({"cache": "single_flight", "result": "joined"}, flights["joined"]),
+        ({"cache": "single_flight", "result": "leader"}, flights["leaders"]),
+    ])
+    yield CollectedMetric("chem_image_jobs", "gauge", "文生图任务数（按状态）", [
+        ({"status": status}, count) for status, count in image_jobs.stats()["jobs"].items()
+    ])
+    yield CollectedMetric("chem_image_tasks_active", "gauge", "正在轮询的 ModelScope 图像任务数", [
+        ({}, poller.stats()["active_tasks"]),
+    ])
+    upstreams = resilience.stats()["upstreams"]
+    yield CollectedMetric("chem_upstream_circuit_open", "gauge", "上游熔断器是否断开（1 为断开或半开）", [
+        ({"upstream": name}, int(snap["state"] != "closed")) for name, snap in upstreams.items()
+    ])
+    yield CollectedMetric("chem_upstream_retries_total", "counter", "上游调用重试次数", [
+        ({"upstream": name}, snap["retries"]) for name, snap in upstreams.items()
+    ])
+    yield CollectedMetric("chem_upstream_short_circuited_total", "counter", "熔断期间直接拒绝的上游调用次数", [
+        ({"upstream": name}, snap["short_circuited"]) for name, snap in upstreams.items()
+    ])
+    features = admission.stats()["features"]
+    yield CollectedMetric("chem_admission_total", "counter", "准入控制结果（按功能与结果）", [
+        ({"feature": name, "outcome": outcome}, snap[outcome])
+        for name, snap in features.items()
+        for outcome in ("admitted", "delayed", "rejected", "degraded")
+    ])
+    yield CollectedMetric("chem_hedge_extra_calls_total", "counter", "对冲请求发起的额外上游调用次数", [
+        ({"feature": name}, snap["extra_calls"]) for name, snap in hedger.stats()["stats"].items()
+    ])
+    yield CollectedMetric("chem_ready", "gauge", "启动预热是否完成", [({}, int(warmup.ready))])
+
+
+register_collector(_collect_component_metrics)
+
+
+@metrics_router.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    """Prometheus 文本格式指标"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE)
+
+
 # ===================== 化学功能API =====================
 
 @router.post("/reaction/explain")
@@ -68,7 +239,7 @@ async def explain_reaction(request: ReactionExplainRequest) -> Response:
         }
     """
     try:
-        explanation = ChemistryService.explain_reaction(
+        explanation = await ChemistryService.aexplain_reaction(
             reaction=request.reaction,
             api_key=request.api_key
         )
@@ -84,6 +255,10 @@ async def explain_reaction(request: ReactionExplainRequest) -> Response:
         )
         return response
         
+    except RateLimitedError as e:
+        raise _retry_later(429, e)
+    except CircuitOpenError as e:
+        raise _retry_later(503, e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -104,9 +279,10 @@ async def balance_equation(request: EquationBalanceRequest) -> Response:
         }
     """
     try:
-        result = ChemistryService.balance_equation(
+        result = await ChemistryService.abalance_equation(
             equation=request.equation,
-            api_key=request.api_key
+            api_key=request.api_key,
+            narrative=request.narrative
         )
         # 返回哯持但不超时的响应
         response = JSONResponse(
@@ -120,6 +296,10 @@ async def balance_equation(request: EquationBalanceRequest) -> Response:
         )
         return response
         
+    except RateLimitedError as e:
+        raise _retry_later(429, e)
+    except CircuitOpenError as e:
+        raise _retry_later(503, e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -127,12 +307,89 @@ async def balance_equation(request: EquationBalanceRequest) -> Response:
         raise HTTPException(status_code=500, detail="处理请求失败")
 
 
-@router.post("/reaction/image")
+@router.post("/reaction/explain/batch")
+async def explain_reaction_batch(request: ReactionExplainBatchRequest) -> Response:
+    """
+    批量讲解反应接口
+
+    等价输入只处理一次，按 concurrency 限制并发，结果按输入顺序返回，
+    单条失败记录在该条的 error 中。
+
+    Example:
+        {
+            "reactions": ["铁与硫酸铜反应", "镁条燃烧"]
+        }
+    """
+    result = await ChemistryService.aexplain_batch(
+        reactions=request.reactions,
+        api_key=request.api_key,
+        concurrency=request.concurrency
+    )
+    return JSONResponse(status_code=200, content=BaseResponse(success=True, data=result).dict())
+
+
+@router.post("/equation/balance/batch")
+async def balance_equation_batch(request: EquationBalanceBatchRequest) -> Response:
+    """
+    批量配平方程式接口
+
+    等价写法（如 "H2 + O2 = H2O" 与 "O₂ + H₂ → H₂O"）只配平一次，按 concurrency 限制并发，
+    结果按输入顺序返回，单条失败记录在该条的 error 中。
+
+    Example:
+        {
+            "equations": ["Fe + O2 → Fe2O3", "H2 + O2 → H2O"],
+            "narrative": false
+        }
+    """
+    result = await ChemistryService.abalance_batch(
+        equations=request.equations,
+        api_key=request.api_key,
+        narrative=request.narrative,
+        concurrency=request.concurrency
+    )
+    return JSONResponse(status_code=200, content=BaseResponse(success=True, data=result).dict())
+
+
+@router.post("/reaction/explain/stream")
+async def explain_reaction_stream(request: ReactionExplainRequest) -> StreamingResponse:
+    """
+    化学反应智能讲解接口（SSE 流式输出）
+    
+    模型生成的文本以 Server-Sent Events 逐段返回
+    """
+    return _sse_response(
+        ChemistryService.astream_explain_reaction(
+            reaction=request.reaction,
+            api_key=request.api_key
+        ),
+        error_message="讲解反应失败",
+    )
+
+
+@router.post("/equation/balance/stream")
+async def balance_equation_stream(request: EquationBalanceRequest) -> StreamingResponse:
+    """
+    化学方程式自动配平接口（SSE 流式输出）
+    
+    模型生成的文本以 Server-Sent Events 逐段返回
+    """
+    return _sse_response(
+        ChemistryService.astream_balance_equation(
+            equation=request.equation,
+            api_key=request.api_key,
+            narrative=request.narrative
+        ),
+        error_message="配平方程式失败",
+    )
+
+
+@router.post("/reaction/image", status_code=202)
 async def generate_reaction_image(request: ReactionImageRequest) -> Response:
     """
-    反应现象文生图接口
+    反应现象文生图接口（异步任务）
     
-    根据反应现象描述生成对应的图像
+    提交后立即返回任务ID，通过 GET /api/reaction/image/{job_id} 查询进度和结果
     
     Example:
         {
@@ -140,29 +397,69 @@ async def generate_reaction_image(request: ReactionImageRequest) -> Response:
         }
     """
     try:
-        image_url = ChemistryService.generate_reaction_image(
+        job = await ChemistryService.submit_reaction_image_job(
             prompt=request.prompt,
             api_key=request.api_key
         )
-        # 返回哯持但不超时的响应
-        response = JSONResponse(
-            status_code=200,
-            content=BaseResponse(success=True, data=image_url).dict(),
-            headers={
-                'Connection': 'keep-alive',
-                'Keep-Alive': 'timeout=300, max=1000',
-                'Cache-Control': 'no-cache'
-            }
+        return JSONResponse(
+            status_code=202,
+            content=BaseResponse(success=True, data={
+                "job_id": job.job_id,
+                "status": job.status,
+                "status_url": f"/api/reaction/image/{job.job_id}",
+            }).dict(),
         )
-        return response
         
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except RateLimitedError as e:
+        raise _retry_later(429, e)
+    except CircuitOpenError as e:
+        raise _retry_later(503, e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"生成图像失败: {str(e)}")
+        logger.error(f"提交图像生成任务失败: {str(e)}")
         raise HTTPException(status_code=500, detail="处理请求失败")
 
 
+@router.get("/reaction/image/{job_id}")
+async def get_reaction_image_job(job_id: str) -> Response:
+    """
+    查询文生图任务状态
+    
+    返回任务状态（pending/running/succeeded/failed）、当前执行的图节点和最终图像URL
+    """
+    job = ChemistryService.get_reaction_image_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return JSONResponse(
+        status_code=200,
+        content=BaseResponse(success=True, data=job.to_dict()).dict(),
+        headers={'Cache-Control': 'no-cache'}
+    )
+
+
+@router.get("/images/{digest}")
+async def get_stored_image(digest: str, request: Request) -> Response:
+    """
+    获取本地存储的生成图像
+    
+    内容寻址、不可变：支持 ETag 条件请求与 Range 分段下载，并允许客户端长期缓存
+    """
+    image = await image_store.aget(digest)
+    if image is None:
+        raise HTTPException(status_code=404, detail="图像不存在或已被清理")
+    
+    headers = {
+        "ETag": image.etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+    }
+    if request.headers.get("if-none-match") in (image.etag, "*"):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(image.path, media_type=image.media_type, headers=headers)
+
+
 @router.post("/material/recognize")
 async def recognize_material(request: MaterialRecognizeRequest) -> Response:
     """
@@ -176,7 +473,7 @@ async def recognize_material(request: MaterialRecognizeRequest) -> Response:
         }
     """
     try:
-        result = ChemistryService.recognize_material(
+        result = await ChemistryService.arecognize_material(
             image_url=request.image_url,
             api_key=request.api_key
         )
@@ -192,8 +489,61 @@ async def recognize_material(request: MaterialRecognizeRequest) -> Response:
         )
         return response
         
+    except RateLimitedError as e:
+        raise _retry_later(429, e)
+    except CircuitOpenError as e:
+        raise _retry_later(503, e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"识别物质失败: {str(e)}")
+        raise HTTPException(status_code=500, detail="处理请求失败")
+
+
+@router.post("/material/recognize/upload")
+async def recognize_material_upload(request: Request) -> Response:
+    """
+    实验物质图生文识别接口（multipart/form-data 文件上传）
+
+    表单字段：
+        image: 图片文件（JPEG / PNG / GIF / WebP / BMP）
+        api_key: ModelScope API密钥
+
+    图片流式写入临时文件，超过大小上限返回 413；无需在 JSON 中内联 base64。
+    """
+    try:
+        upload = await receive_image(request)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        api_key = upload.fields.get("api_key", "").strip()
+        if not api_key:
+            raise HTTPException(status_code=400, detail="缺少 api_key")
+        data = await run_sync(upload.read)
+        result = await ChemistryService.arecognize_image(
+            data=data,
+            media_type=upload.media_type,
+            api_key=api_key,
+            sha256=upload.sha256,
+        )
+        return JSONResponse(
+            status_code=200,
+            content=BaseResponse(success=True, data=result).dict(),
+            headers={'Cache-Control': 'no-cache'},
+        )
+    except HTTPException:
+        raise
+    except RateLimitedError as e:
+        raise _retry_later(429, e)
+    except CircuitOpenError as e:
+        raise _retry_later(503, e)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"识别物质失败: {str(e)}")
         raise HTTPException(status_code=500, detail="处理请求失败")
+    finally:
+        upload.close()
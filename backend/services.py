@@ -2,17 +2,333 @@
 业务逻辑服务层 - 核心化学教学功能调用
 """
 
+import asyncio
 import logging
+import re
+import time
+import unicodedata
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
 
-
-from .reaction_explainer import explain_reaction
-from .equation_balancer import balance_equation
-from .reaction_image_generator import generate_reaction_image
-from .material_recognizer import recognize_material
+from . import reaction_explainer, equation_balancer
+from .reaction_explainer import explain_reaction, aexplain_reaction, astream_explain_reaction
+from .equation_balancer import (
+    balance_equation,
+    abalance_equation,
+    astream_balance_equation,
+    local_balance_equation,
+)
+from . import material_recognizer
+from .material_recognizer import recognize_material, arecognize_material
+from .jobs import ImageJob, ImageJobManager
+from .metrics import latency
+from .client_registry import DEFAULT_CHAT_MODEL, DEFAULT_TEMPERATURE
+from .result_cache import result_cache, prompt_version, canonicalize
+from .recognition_cache import ImageFingerprint, recognition_cache, fingerprint, fingerprint_bytes
+from .image_preprocess import image_preprocessor
+from .executor import run_sync
+from .batch import BATCH_CONCURRENCY, run_batch
+from .admission import RateLimitedError, admission, key_id
+from .resilience import CircuitOpenError
+from .hedging import hedger
 
 logger = logging.getLogger(__name__)
 
 
+# ===================== 文生图模块（延迟导入） =====================
+# 文生图工作流依赖 langgraph 与 langchain 消息类型（导入约 0.5 秒），首次生成图像时再导入
+
+def generate_reaction_image(prompt: str, api_key: str) -> str:
+    from .reaction_image_generator import generate_reaction_image as generate
+    return generate(prompt, api_key)
+
+
+async def agenerate_reaction_image(prompt: str, api_key: str) -> str:
+    from .reaction_image_generator import agenerate_reaction_image as agenerate
+    return await agenerate(prompt, api_key)
+
+
+async def arun_reaction_image_graph(
+    prompt: str, api_key: str, on_node: Optional[Callable[[str], None]] = None
+) -> str:
+    from .reaction_image_generator import arun_reaction_image_graph as arun
+    return await arun(prompt, api_key, on_node)
+
+
+def is_placeholder_image(url: str) -> bool:
+    """是否为生成失败时返回的占位图地址"""
+    from .reaction_image_generator import PLACEHOLDER_IMAGE_URL
+    return url.startswith(PLACEHOLDER_IMAGE_URL)
+
+
+# 文生图任务管理器（进程级）
+image_jobs = ImageJobManager(runner=arun_reaction_image_graph)
+
+# 各功能的提示词版本（参与结果缓存键，修改提示词后旧缓存自动失效）
+PROMPT_VERSIONS = {
+    "explain": prompt_version(
+        reaction_explainer.SYSTEM_PROMPT, DEFAULT_CHAT_MODEL, reaction_explainer.TEMPERATURE
+    ),
+    "balance": prompt_version(
+        equation_balancer.SYSTEM_PROMPT + "".join(equation_balancer.LOCAL_CHECK_PROMPTS.values()),
+        DEFAULT_CHAT_MODEL,
+        equation_balancer.TEMPERATURE,
+    ),
+    "recognize": prompt_version(material_recognizer.SYSTEM_PROMPT, DEFAULT_CHAT_MODEL, DEFAULT_TEMPERATURE),
+}
+
+
+# ===================== 请求合并（single-flight） =====================
+
+def normalize_input(text: str) -> str:
+    """
+    规范化用户输入，用于合并相同请求
+
+    - NFKC 归一化（全角字符、下标数字 ₂ → 2）
+    - 去除首尾空白并合并连续空白
+    """
+    text = unicodedata.normalize("NFKC", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class _Call:
+    """一次正在执行的上游调用"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _StreamCall:
+    """一次正在执行的上游流式调用，已产出的片段会重放给后加入的订阅者"""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """
+    相同请求合并：同一键的并发请求共享一次上游调用
+
+    - 所有等待方得到同一个结果或同一个异常
+    - 某个等待方被取消只影响它自己；所有等待方都离开后上游调用被取消
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _StreamCall] = {}
+        self.leaders = 0
+        self.joined = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        执行（或加入正在执行的）调用
+
+        Args:
+            key: 合并键（功能 + 规范化输入）
+            factory: 创建上游调用协程的函数，仅由首个请求调用
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+            self.leaders += 1
+        else:
+            self.joined += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # 所有等待方都已离开：新请求不应再加入即将取消的调用
+                self._forget(self._calls, key, call)
+                call.task.cancel()
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        订阅（或发起）流式调用，后加入的订阅者先收到已产出的片段
+
+        Args:
+            key: 合并键（功能 + 规范化输入）
+            factory: 创建上游异步迭代器的函数，仅由首个订阅者调用
+        """
+        call = self._streams.get(key)
+        if call is None:
+            call = _StreamCall()
+            self._streams[key] = call
+            call.task = asyncio.ensure_future(self._drive(call, factory))
+            call.task.add_done_callback(lambda _: self._forget(self._streams, key, call))
+            self.leaders += 1
+        else:
+            self.joined += 1
+
+        call.subscribers += 1
+        index = 0
+        try:
+            while True:
+                changed = call.changed
+                while index < len(call.chunks):
+                    yield call.chunks[index]
+                    index += 1
+                if call.done:
+                    if call.error is not None:
+                        raise call.error
+                    return
+                await changed.wait()
+        finally:
+            call.subscribers -= 1
+            if call.subscribers == 0 and not call.task.done():
+                self._forget(self._streams, key, call)
+                call.task.cancel()
+
+    async def _drive(self, call: _StreamCall, factory: Callable[[], AsyncIterator[str]]) -> None:
+        try:
+            async for chunk in factory():
+                call.chunks.append(chunk)
+                call.notify()
+        except asyncio.CancelledError:
+            call.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            call.error = e
+        finally:
+            call.done = True
+            call.notify()
+
+    @staticmethod
+    def _forget(calls: Dict[Hashable, Any], key: Hashable, call: Any) -> None:
+        if calls.get(key) is call:
+            del calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """导出合并统计"""
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "leaders": self.leaders,
+            "joined": self.joined,
+        }
+
+
+single_flight = SingleFlight()
+
+
+def _flight_key(feature: str, text: str, api_key: str) -> tuple:
+    """合并键包含密钥摘要：只合并同一密钥的相同请求，失败（限流、鉴权）不会传给其他用户"""
+    return (feature, normalize_input(text), key_id(api_key))
+
+
+def _cached(feature: str, text: str, call: Callable[[], str]) -> str:
+    """先查结果缓存，未命中时执行同步调用并写入缓存"""
+    version = PROMPT_VERSIONS[feature]
+    cached = result_cache.get(feature, text, version)
+    if cached is not None:
+        logger.info(f"[结果缓存] 命中 {feature}")
+        return cached
+    result = call()
+    result_cache.set(feature, text, version, result)
+    return result
+
+
+async def _acached(feature: str, text: str, api_key: str, factory: Callable[[], Awaitable[str]]) -> str:
+    """先查结果缓存，未命中时合并相同请求，经准入控制后执行上游调用（可对冲）并写入缓存"""
+    version = PROMPT_VERSIONS[feature]
+    cached = await result_cache.aget(feature, text, version)
+    if cached is not None:
+        logger.info(f"[结果缓存] 命中 {feature}")
+        return cached
+
+    async def call() -> str:
+        # 只有发起上游调用的首个请求消耗令牌，合并进来的请求不受限制；
+        # 合并键包含密钥摘要，限流错误只会传给同一密钥的请求。
+        # 对冲调用由服务端发起，不额外消耗调用方的令牌，由对冲预算限制
+        await admission.acquire(api_key, feature)
+        result = await hedger.run(feature, factory)
+        await result_cache.aset(feature, text, version, result)
+        return result
+
+    # 与缓存键一致，同一密钥下等价写法的并发请求也合并为一次调用
+    return await single_flight.do((feature, canonicalize(text), key_id(api_key)), call)
+
+
+async def _acached_stream(
+    feature: str, text: str, api_key: str, factory: Callable[[], AsyncIterator[str]]
+) -> AsyncIterator[str]:
+    """流式版本的结果缓存：命中时一次性产出完整结果，未命中时在流结束后写入缓存"""
+    version = PROMPT_VERSIONS[feature]
+    cached = await result_cache.aget(feature, text, version)
+    if cached is not None:
+        logger.info(f"[结果缓存] 命中 {feature}（流式）")
+        yield cached
+        return
+
+    async def upstream() -> AsyncIterator[str]:
+        await admission.acquire(api_key, feature)
+        parts = []
+        async for chunk in factory():
+            parts.append(chunk)
+            yield chunk
+        await result_cache.aset(feature, text, version, "".join(parts))
+
+    async for chunk in single_flight.stream((feature, canonicalize(text), key_id(api_key)), upstream):
+        yield chunk
+
+
+async def _arecognize_cached(
+    fp: ImageFingerprint, prepare: Callable[[], Awaitable[str]], api_key: str
+) -> str:
+    """先查识别缓存，未命中时合并相同图片的请求，预处理后调用视觉模型并写入缓存"""
+    version = PROMPT_VERSIONS["recognize"]
+    cached = recognition_cache.get(fp, version)
+    if cached is not None:
+        logger.info("[识别缓存] 命中 recognize")
+        return cached
+
+    async def call() -> str:
+        await admission.acquire(api_key, "recognize")
+        # 仅在未命中时压缩图片（进程池），缓存按原图指纹查询
+        image_url = await prepare()
+        result = await arecognize_material(image_url, api_key)
+        recognition_cache.set(fp, version, result)
+        return result
+
+    # 图片字节摘要与密钥摘要作为合并键
+    return await single_flight.do(("recognize", fp.sha256, key_id(api_key)), call)
+
+
+def _degraded_balance(equation: str) -> Optional[str]:
+    """过载或上游熔断时的降级结果：本地精确配平（不含讲解），无法本地配平时返回 None"""
+    if not admission.degrade:
+        return None
+    local = local_balance_equation(equation)
+    if local is not None:
+        admission.record_degraded("balance")
+        logger.warning(f"[准入控制] 配平方程式降级为本地配平结果: {equation}")
+    return local
+
+
+async def _timed_stream(feature: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """转发流式片段，并记录首字节时间（ttfb）与总耗时（total）"""
+    start = time.perf_counter()
+    first = True
+    async for chunk in chunks:
+        if first:
+            latency(f"{feature}.ttfb").observe(time.perf_counter() - start)
+            first = False
+        yield chunk
+    latency(f"{feature}.total").observe(time.perf_counter() - start)
+
+
 class ChemistryService:
     """化学教学助手服务 - 调用各功能模块"""
     
@@ -30,26 +346,31 @@ class ChemistryService:
         """
         try:
             logger.info(f"[调用讲解反应模块] 反应: {reaction}")
-            return explain_reaction(reaction, api_key)
+            return _cached("explain", reaction, lambda: explain_reaction(reaction, api_key))
         except Exception as e:
             logger.error(f"讲解反应失败: {str(e)}")
             raise
 
     @staticmethod
-    def balance_equation(equation: str, api_key: str) -> str:
+    def balance_equation(equation: str, api_key: str, narrative: bool = True) -> str:
         """
         化学方程式自动配平
         
         Args:
             equation: 未配平的方程式
             api_key: ModelScope API密钥（必需）
+            narrative: 是否生成教学讲解；为 False 时优先使用本地配平结果
             
         Returns:
             配平结果
         """
         try:
             logger.info(f"[调用配平方程式模块] 方程式: {equation}")
-            return balance_equation(equation, api_key)
+            if not narrative:
+                local = local_balance_equation(equation)
+                if local is not None:
+                    return local
+            return _cached("balance", equation, lambda: balance_equation(equation, api_key))
         except Exception as e:
             logger.error(f"配平方程式失败: {str(e)}")
             raise
@@ -87,7 +408,206 @@ class ChemistryService:
         """
         try:
             logger.info(f"[调用物质识别模块] 图片URL: {image_url}")
-            return recognize_material(image_url, api_key)
+            fp = fingerprint(image_url)
+            version = PROMPT_VERSIONS["recognize"]
+            cached = recognition_cache.get(fp, version)
+            if cached is not None:
+                logger.info("[识别缓存] 命中 recognize")
+                return cached
+            result = recognize_material(image_preprocessor.prepare(image_url), api_key)
+            recognition_cache.set(fp, version, result)
+            return result
+        except Exception as e:
+            logger.error(f"识别物质失败: {str(e)}")
+            raise
+
+    # ===================== 异步接口（供FastAPI路由使用） =====================
+
+    @staticmethod
+    async def aexplain_reaction(reaction: str, api_key: str) -> str:
+        """化学反应智能讲解（异步）"""
+        try:
+            logger.info(f"[调用讲解反应模块] 反应: {reaction}")
+            start = time.perf_counter()
+            result = await _acached("explain", reaction, api_key, lambda: aexplain_reaction(reaction, api_key))
+            latency("explain.total").observe(time.perf_counter() - start)
+            return result
+        except Exception as e:
+            logger.error(f"讲解反应失败: {str(e)}")
+            raise
+
+    @staticmethod
+    async def abalance_equation(equation: str, api_key: str, narrative: bool = True, degrade: bool = True) -> str:
+        """
+        化学方程式自动配平（异步）
+
+        degrade 为 False 时，限流或熔断直接抛出异常，不返回降级的本地配平结果（批量处理使用）
+        """
+        try:
+            logger.info(f"[调用配平方程式模块] 方程式: {equation}")
+            start = time.perf_counter()
+            if not narrative:
+                local = local_balance_equation(equation)
+                if local is not None:
+                    latency("balance.local").observe(time.perf_counter() - start)
+                    return local
+            try:
+                result = await _acached("balance", equation, api_key, lambda: abalance_equation(equation, api_key))
+            except (RateLimitedError, CircuitOpenError):
+                result = _degraded_balance(equation) if degrade else None
+                if result is None:
+                    raise
+                return result
+            latency("balance.total").observe(time.perf_counter() - start)
+            return result
+        except Exception as e:
+            logger.error(f"配平方程式失败: {str(e)}")
+            raise
+
+    @staticmethod
+    async def agenerate_reaction_image(prompt: str, api_key: str, degrade: bool = True) -> str:
+        """
+        反应现象文生图（异步）
+
+        degrade 为 False 时，工作流异常直接抛出，不返回占位图（批量处理使用）；
+        工作流内部任务超时或失败时仍可能返回占位图，可用 is_placeholder_image 判断
+        """
+        try:
+            logger.info(f"[调用图像生成模块] 提示词: {prompt}")
+
+            async def call() -> str:
+                # 只有发起调用的首个请求消耗令牌
+                await admission.acquire(api_key, "image")
+                if not degrade:
+                    return await arun_reaction_image_graph(prompt, api_key)
+                return await agenerate_reaction_image(prompt, api_key)
+
+            feature = "image" if degrade else "image.strict"
+            return await single_flight.do(_flight_key(feature, prompt, api_key), call)
+        except Exception as e:
+            logger.error(f"生成图像失败: {str(e)}")
+            raise
+
+    @staticmethod
+    async def arecognize_material(image_url: str, api_key: str) -> str:
+        """实验物质图生文识别（异步）"""
+        try:
+            logger.info(f"[调用物质识别模块] 图片URL: {image_url}")
+            # 图片可能是很大的 data URL，解码与感知哈希放到线程池中计算
+            fp = await run_sync(fingerprint, image_url)
+            return await _arecognize_cached(fp, lambda: image_preprocessor.aprepare(image_url), api_key)
         except Exception as e:
             logger.error(f"识别物质失败: {str(e)}")
             raise
+
+    @staticmethod
+    async def arecognize_image(
+        data: bytes, media_type: str, api_key: str, sha256: Optional[str] = None
+    ) -> str:
+        """
+        实验物质图生文识别（异步，直接接收图片字节，供文件上传使用）
+
+        Args:
+            data: 图片文件字节
+            media_type: 图片媒体类型
+            api_key: ModelScope API密钥（必需）
+            sha256: 接收时已计算的摘要（可选）
+
+        Returns:
+            物质识别结果
+        """
+        try:
+            logger.info(f"[调用物质识别模块] 上传图片: {media_type}, {len(data)} 字节")
+            fp = await run_sync(fingerprint_bytes, data, sha256)
+            # base64 编码只在未命中、调用上游前进行一次
+            return await _arecognize_cached(
+                fp, lambda: image_preprocessor.aprepare_bytes(data, media_type), api_key
+            )
+        except Exception as e:
+            logger.error(f"识别物质失败: {str(e)}")
+            raise
+
+    # ===================== 批量接口 =====================
+
+    @staticmethod
+    async def aexplain_batch(
+        reactions: List[str], api_key: str, concurrency: int = BATCH_CONCURRENCY
+    ) -> Dict[str, Any]:
+        """批量讲解反应：等价输入去重，限制并发，按输入顺序返回"""
+        logger.info(f"[批量讲解反应] {len(reactions)} 条")
+        result = await run_batch(
+            reactions,
+            lambda reaction: ChemistryService.aexplain_reaction(reaction, api_key),
+            key=canonicalize,
+            concurrency=concurrency,
+        )
+        latency("explain.batch").observe(result["elapsed"])
+        return result
+
+    @staticmethod
+    async def abalance_batch(
+        equations: List[str], api_key: str, narrative: bool = True, concurrency: int = BATCH_CONCURRENCY
+    ) -> Dict[str, Any]:
+        """批量配平方程式：等价输入去重，限制并发，按输入顺序返回"""
+        logger.info(f"[批量配平方程式] {len(equations)} 条")
+        result = await run_batch(
+            equations,
+            lambda equation: ChemistryService.abalance_equation(equation, api_key, narrative=narrative),
+            key=canonicalize,
+            concurrency=concurrency,
+        )
+        latency("balance.batch").observe(result["elapsed"])
+        return result
+
+    # ===================== 流式接口 =====================
+
+    @staticmethod
+    async def astream_explain_reaction(reaction: str, api_key: str) -> AsyncIterator[str]:
+        """化学反应智能讲解（流式），逐段产出文本"""
+        logger.info(f"[调用讲解反应模块] 反应: {reaction}（流式）")
+        chunks = _acached_stream("explain", reaction, api_key, lambda: astream_explain_reaction(reaction, api_key))
+        async for chunk in _timed_stream("explain", chunks):
+            yield chunk
+
+    @staticmethod
+    async def astream_balance_equation(equation: str, api_key: str, narrative: bool = True) -> AsyncIterator[str]:
+        """化学方程式自动配平（流式），逐段产出文本"""
+        logger.info(f"[调用配平方程式模块] 方程式: {equation}（流式）")
+        if not narrative:
+            local = local_balance_equation(equation)
+            if local is not None:
+                yield local
+                return
+        chunks = _acached_stream("balance", equation, api_key, lambda: astream_balance_equation(equation, api_key))
+        try:
+            async for chunk in _timed_stream("balance", chunks):
+                yield chunk
+        except (RateLimitedError, CircuitOpenError):
+            # 准入与熔断检查在产出首个片段之前进行，被拒绝时尚未输出任何内容
+            local = _degraded_balance(equation)
+            if local is None:
+                raise
+            yield local
+
+    # ===================== 文生图任务接口 =====================
+
+    @staticmethod
+    async def submit_reaction_image_job(prompt: str, api_key: str) -> ImageJob:
+        """
+        提交反应现象文生图任务（立即返回）
+        
+        Args:
+            prompt: 反应现象描述
+            api_key: ModelScope API密钥（必需）
+            
+        Returns:
+            已排队的任务
+        """
+        logger.info(f"[提交图像生成任务] 提示词: {prompt}")
+        await admission.acquire(api_key, "image")
+        return await image_jobs.submit(prompt, api_key)
+
+    @staticmethod
+    def get_reaction_image_job(job_id: str) -> Optional[ImageJob]:
+        """查询文生图任务，不存在时返回 None"""
+        return image_jobs.get(job_id)
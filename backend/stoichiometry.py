@@ -0,0 +1,132 @@
+"""
+化学计量模块 - 本地确定性方程式配平
+
+由 chem_parser 解析方程式，构建 元素×物质 矩阵（离子方程式额外加一行电荷），
+用有理数精确求解零空间，得到最小正整数系数。
+
+- 元素/电荷不守恒、系数无法全部为正 → NoSolutionError
+- 存在多组相互独立的配平系数（如两个反应叠加）→ AmbiguousBalanceError
+- 输入无法解析（含反应条件、中文描述等）→ FormulaParseError，由调用方回退到大模型
+"""
+
+from dataclasses import dataclass
+from fractions import Fraction
+from functools import reduce
+from math import gcd
+from typing import List, Tuple
+
+try:
+    from .chem_parser import ChemParseError, Equation, parse_equation
+except ImportError:
+    from backend.chem_parser import ChemParseError, Equation, parse_equation
+
+
+class StoichiometryError(ValueError):
+    """本地配平失败"""
+
+
+class FormulaParseError(StoichiometryError):
+    """化学式或方程式无法解析"""
+
+
+class NoSolutionError(StoichiometryError):
+    """无法通过调整系数配平（元素或电荷不守恒）"""
+
+
+class AmbiguousBalanceError(StoichiometryError):
+    """存在多组相互独立的配平系数"""
+
+    def __init__(self, message: str, dimension: int):
+        super().__init__(message)
+        self.dimension = dimension
+
+
+@dataclass(frozen=True)
+class BalanceResult:
+    """配平结果"""
+    equation: Equation
+    coefficients: Tuple[int, ...]
+
+    def render(self) -> str:
+        """渲染为规范方程式，如 2H₂O → 2H₂ + O₂"""
+        return self.equation.render(self.coefficients)
+
+    def render_input(self) -> str:
+        """渲染未配平的方程式"""
+        return self.equation.render()
+
+
+def _null_space(matrix: List[List[Fraction]], columns: int) -> List[List[Fraction]]:
+    """有理数高斯消元求零空间基"""
+    rows = [row[:] for row in matrix]
+    pivots: List[int] = []
+    rank = 0
+    for col in range(columns):
+        pivot = next((r for r in range(rank, len(rows)) if rows[r][col] != 0), None)
+        if pivot is None:
+            continue
+        rows[rank], rows[pivot] = rows[pivot], rows[rank]
+        lead = rows[rank][col]
+        rows[rank] = [v / lead for v in rows[rank]]
+        for r in range(len(rows)):
+            if r != rank and rows[r][col] != 0:
+                factor = rows[r][col]
+                rows[r] = [a - factor * b for a, b in zip(rows[r], rows[rank])]
+        pivots.append(col)
+        rank += 1
+
+    basis = []
+    for free in (c for c in range(columns) if c not in pivots):
+        vector = [Fraction(0)] * columns
+        vector[free] = Fraction(1)
+        for r, col in enumerate(pivots):
+            vector[col] = -rows[r][free]
+        basis.append(vector)
+    return basis
+
+
+def balance(text: str) -> BalanceResult:
+    """
+    本地精确配平化学方程式
+
+    Args:
+        text: 方程式，如 "H2O = O2 + H2"、"Fe3+ + OH- → Fe(OH)3"
+
+    Returns:
+        配平结果（最小正整数系数）
+
+    Raises:
+        FormulaParseError: 无法解析
+        NoSolutionError: 无法配平
+        AmbiguousBalanceError: 存在多组独立配平系数
+    """
+    try:
+        equation = parse_equation(text)
+    except ChemParseError as e:
+        raise FormulaParseError(str(e)) from e
+
+    # 列：物质（生成物取负）；行：元素，离子方程式再加一行电荷
+    n = len(equation.reactants)
+    signs = [1 if j < n else -1 for j in range(len(equation.species))]
+    columns = [
+        [sign * v for v in s.vector(equation.elements)] + ([sign * s.charge] if equation.has_charge else [])
+        for sign, s in zip(signs, equation.species)
+    ]
+    matrix = [[Fraction(col[i]) for col in columns] for i in range(len(columns[0]))]
+
+    basis = _null_space(matrix, len(columns))
+    if not basis:
+        raise NoSolutionError("方程式两边元素或电荷无法守恒")
+    if len(basis) > 1:
+        raise AmbiguousBalanceError(f"存在 {len(basis)} 组相互独立的配平系数", len(basis))
+
+    vector = basis[0]
+    denominator = reduce(lambda a, b: a * b // gcd(a, b), (v.denominator for v in vector), 1)
+    integers = [int(v * denominator) for v in vector]
+    if all(v < 0 for v in integers):
+        integers = [-v for v in integers]
+    if any(v <= 0 for v in integers):
+        raise NoSolutionError("无法使所有物质的系数均为正数")
+    divisor = reduce(gcd, integers)
+
+    return BalanceResult(equation=equation, coefficients=tuple(v // divisor for v in integers))
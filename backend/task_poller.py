@@ -0,0 +1,289 @@
+"""
+图像任务轮询模块 - 单个后台协程统一轮询所有 ModelScope 图像任务
+
+- 所有未完成的 task_id 由同一个后台协程跟踪，每个任务独立调度
+- 自适应轮询间隔：前几次快速轮询，之后指数退避并加入随机抖动
+- 任务进入 SUCCEED / FAILED 状态时立即通过 Future 唤醒等待方
+- 每个事件循环（uvicorn 主循环、同步调用方使用的后台循环）各自跟踪任务、运行轮询协程，
+  Future 只在所属循环上完成，HTTP 客户端也按循环区分
+"""
+
+import asyncio
+import logging
+import os
+import random
+import weakref
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import httpx
+
+try:
+    from .client_registry import registry
+    from .metrics import latency
+except ImportError:
+    from backend.client_registry import registry
+    from backend.metrics import latency
+
+logger = logging.getLogger(__name__)
+
+MODELSCOPE_API_BASE = os.getenv("CHEM_MODELSCOPE_API_BASE", "https://api-inference.modelscope.cn/")
+
+# 轮询调度参数（秒）
+POLL_INITIAL_INTERVAL = float(os.getenv("CHEM_POLL_INITIAL_INTERVAL", "1.0"))
+POLL_FAST_ATTEMPTS = int(os.getenv("CHEM_POLL_FAST_ATTEMPTS", "3"))
+POLL_BACKOFF = float(os.getenv("CHEM_POLL_BACKOFF", "1.5"))
+POLL_MAX_INTERVAL = float(os.getenv("CHEM_POLL_MAX_INTERVAL", "5.0"))
+POLL_JITTER = float(os.getenv("CHEM_POLL_JITTER", "0.2"))
+POLL_TIMEOUT = float(os.getenv("CHEM_POLL_TIMEOUT", "300"))
+
+TERMINAL_STATUSES = ("SUCCEED", "FAILED")
+
+
+@dataclass
+class TaskOutcome:
+    """任务轮询结果"""
+    task_id: str
+    status: str
+    data: Dict[str, Any]
+    attempts: int
+    elapsed: float
+
+
+@dataclass
+class _PendingTask:
+    task_id: str
+    api_key: str
+    future: asyncio.Future
+    started: float
+    deadline: float
+    next_due: float
+    attempts: int = 0
+    errors: int = 0
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class _LoopState:
+    """单个事件循环上的轮询状态"""
+    tasks: Dict[str, _PendingTask] = field(default_factory=dict)
+    runner: Optional[asyncio.Task] = None
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class TaskPollError(Exception):
+    """任务查询返回不可重试的错误"""
+
+
+class ImageTaskPoller:
+    """多路复用的异步任务轮询器"""
+
+    def __init__(
+        self,
+        base_url: str = MODELSCOPE_API_BASE,
+        client: Optional[httpx.AsyncClient] = None,
+        initial_interval: float = POLL_INITIAL_INTERVAL,
+        fast_attempts: int = POLL_FAST_ATTEMPTS,
+        backoff: float = POLL_BACKOFF,
+        max_interval: float = POLL_MAX_INTERVAL,
+        jitter: float = POLL_JITTER,
+        timeout: float = POLL_TIMEOUT,
+    ):
+        self.base_url = base_url
+        self._client = client
+        self.initial_interval = initial_interval
+        self.fast_attempts = fast_attempts
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.timeout = timeout
+
+        # 按事件循环区分的轮询状态，循环关闭回收后自动清理
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+        self.polls = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or registry.async_http_client
+
+    def next_interval(self, attempts: int) -> float:
+        """
+        计算第 attempts 次轮询之后的等待间隔
+
+        前 fast_attempts 次使用固定的短间隔，之后按 backoff 指数增长，
+        上限为 max_interval，并乘以 [1 - jitter, 1 + jitter] 的随机抖动。
+        """
+        if attempts < self.fast_attempts:
+            interval = self.initial_interval
+        else:
+            exponent = attempts - self.fast_attempts + 1
+            interval = min(self.max_interval, self.initial_interval * self.backoff ** exponent)
+        if self.jitter:
+            interval *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return interval
+
+    async def wait(self, task_id: str, api_key: str, timeout: Optional[float] = None) -> TaskOutcome:
+        """
+        等待任务进入终止状态
+
+        Args:
+            task_id: ModelScope 任务ID
+            api_key: ModelScope API密钥
+            timeout: 最长等待时间（秒），默认使用轮询器配置
+
+        Returns:
+            任务轮询结果
+
+        Raises:
+            asyncio.TimeoutError: 超过最长等待时间仍未完成
+            TaskPollError: 查询接口返回不可重试的错误
+        """
+        loop = asyncio.get_running_loop()
+        state = self._state(loop)
+
+        now = loop.time()
+        pending = _PendingTask(
+            task_id=task_id,
+            api_key=api_key,
+            future=loop.create_future(),
+            started=now,
+            deadline=now + (timeout or self.timeout),
+            next_due=now + self.next_interval(0),
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+                "X-ModelScope-Task-Type": "image_generation",
+            },
+        )
+        state.tasks[task_id] = pending
+        self._ensure_runner(loop, state)
+
+        try:
+            return await pending.future
+        finally:
+            # 等待方离开（完成或被取消）后不再跟踪该任务，并唤醒轮询协程重新检查
+            if state.tasks.get(task_id) is pending:
+                del state.tasks[task_id]
+            state.wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """导出轮询统计"""
+        finished = self.completed + self.failed
+        return {
+            "active_tasks": sum(len(state.tasks) for state in list(self._states.values())),
+            "polls": self.polls,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "avg_wait_seconds": self.total_wait / finished if finished else 0.0,
+        }
+
+    # ===================== 内部实现 =====================
+
+    def _state(self, loop: asyncio.AbstractEventLoop) -> _LoopState:
+        """获取（必要时创建）事件循环上的轮询状态（只在该循环的线程中调用）"""
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState()
+        return state
+
+    def _ensure_runner(self, loop: asyncio.AbstractEventLoop, state: _LoopState) -> None:
+        if state.runner is None or state.runner.done():
+            state.runner = loop.create_task(self._run(state), name="image-task-poller")
+        else:
+            state.wakeup.set()
+
+    async def _run(self, state: _LoopState) -> None:
+        loop = asyncio.get_running_loop()
+        while state.tasks:
+            now = loop.time()
+            self._expire(state, now)
+            active = [t for t in state.tasks.values() if not t.future.done()]
+            if not active:
+                # 已完成的任务等待调用方取走结果，调用方离开时唤醒
+                state.wakeup.clear()
+                await state.wakeup.wait()
+                continue
+
+            due = [t for t in active if t.next_due <= now]
+            if due:
+                await asyncio.gather(*(self._poll(t) for t in due))
+                continue
+
+            next_due = min(min(t.next_due, t.deadline) for t in active)
+            state.wakeup.clear()
+            try:
+                await asyncio.wait_for(state.wakeup.wait(), timeout=next_due - now)
+            except asyncio.TimeoutError:
+                pass
+
+    def _expire(self, state: _LoopState, now: float) -> None:
+        for task in list(state.tasks.values()):
+            if now >= task.deadline and not task.future.done():
+                self.timeouts += 1
+                task.future.set_exception(asyncio.TimeoutError(f"任务 {task.task_id} 轮询超时"))
+
+    async def _poll(self, task: _PendingTask) -> None:
+        try:
+            await self._poll_once(task)
+        except Exception as e:
+            # 意外错误只让这一个任务失败，不能中断轮询协程、拖住同一循环上的其他等待方
+            logger.exception(f"[任务轮询] {task.task_id} 处理查询结果出错: {str(e)}")
+            if not task.future.done():
+                task.future.set_exception(e)
+
+    async def _poll_once(self, task: _PendingTask) -> None:
+        loop = asyncio.get_running_loop()
+        task.attempts += 1
+        self.polls += 1
+        try:
+            response = await self.client.get(
+                f"{self.base_url}v1/tasks/{task.task_id}",
+                headers=task.headers,
+            )
+            if 400 <= response.status_code < 500 and response.status_code != 429:
+                raise TaskPollError(f"查询任务失败: HTTP {response.status_code}")
+            response.raise_for_status()
+            data = response.json()
+            if not isinstance(data, dict):
+                raise TaskPollError(f"查询任务失败: 响应格式异常（{type(data).__name__}）")
+        except TaskPollError as e:
+            if not task.future.done():
+                task.future.set_exception(e)
+            return
+        except (httpx.HTTPError, ValueError) as e:
+            # 网络抖动或服务端错误：按退避间隔继续轮询
+            task.errors += 1
+            logger.warning(f"[任务轮询] {task.task_id} 第{task.attempts}次查询失败: {str(e)}")
+            task.next_due = loop.time() + self.next_interval(task.attempts)
+            return
+
+        status = data.get("task_status")
+        if status in TERMINAL_STATUSES:
+            elapsed = loop.time() - task.started
+            self.total_wait += elapsed
+            latency("image.poll_wait").observe(elapsed)
+            if status == "SUCCEED":
+                self.completed += 1
+            else:
+                self.failed += 1
+            if not task.future.done():
+                task.future.set_result(TaskOutcome(
+                    task_id=task.task_id,
+                    status=status,
+                    data=data,
+                    attempts=task.attempts,
+                    elapsed=elapsed,
+                ))
+            return
+
+        task.next_due = loop.time() + self.next_interval(task.attempts)
+
+
+# 进程级单例
+poller = ImageTaskPoller()
@@ -0,0 +1,525 @@
+"""
+请求追踪模块 - 记录文生图工作流每个节点的执行过程，导出为 OTLP JSON 文件
+
+一次文生图请求可能经历多轮提示词改写、多次生图和长时间轮询，只看总耗时无法判断慢在哪里：
+- tracer.trace(name)：开始一次追踪（已在追踪中时作为子 span），结束时导出到 CHEM_TRACE_DIR/<trace_id>.json
+- async with tracer.atrace(name)：异步代码使用的版本，序列化、写入与清理旧文件在线程池中执行，不阻塞事件循环
+- tracer.span(name)：当前追踪下的子 span；不在追踪中时为空操作，调用方无需判断
+- traced_node：LangGraph 节点装饰器，记录节点耗时与本次请求中第几次执行
+- 上游调用记录重试次数与 token 用量，图像任务记录轮询次数
+
+导出文件为单行 OTLP/JSON（ExportTraceServiceRequest），不需要运行 collector，
+也可以由 OpenTelemetry Collector 的 otlpjsonfile receiver 直接读取。
+查看单次请求的时间线：python -m backend.tracing [trace_id]
+（--chrome 输出 Chrome trace 格式，可在 Perfetto / chrome://tracing 中以火焰图查看）
+"""
+
+import argparse
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import Any, AsyncIterator, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from .executor import run_sync
+except ImportError:
+    from backend.executor import run_sync
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("CHEM_TRACING", "1") == "1"
+TRACE_DIR = os.getenv(
+    "CHEM_TRACE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "traces"),
+)
+# 保留的追踪文件数量，超出时删除最早的文件
+TRACE_KEEP = int(os.getenv("CHEM_TRACE_KEEP", "200"))
+
+SERVICE_NAME = "chem-edu-backend"
+
+# OTLP 状态码与 span 类型
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+SPAN_KIND_INTERNAL = 1
+
+
+# ===================== Span =====================
+
+class Span:
+    """一次操作的起止时间、属性与事件"""
+
+    __slots__ = (
+        "trace", "name", "span_id", "parent_id", "start_ns", "end_ns",
+        "attributes", "events", "status", "status_message",
+    )
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[str], attributes: Optional[Dict[str, Any]]):
+        self.trace = trace
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[Tuple[int, str, Dict[str, Any]]] = []
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        if attributes:
+            self.set_attributes(attributes)
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        """记录一个时间点事件（如重试）"""
+        self.events.append((time.time_ns(), name, attributes or {}))
+
+    def set_error(self, exc: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(exc).__name__}: {str(exc)}"
+
+
+class _NoopSpan:
+    """不在追踪中时返回的空 span"""
+
+    trace = None
+    trace_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict[str, Any]) -> None:
+        pass
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        pass
+
+    def set_error(self, exc: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_NOOP_CONTEXT = nullcontext(NOOP_SPAN)
+
+
+class Trace:
+    """一次请求的全部 span"""
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+        self._iterations: Dict[str, int] = {}
+
+    def next_iteration(self, name: str) -> int:
+        """返回同名操作在本次追踪中是第几次执行（从 1 开始）"""
+        self._iterations[name] = self._iterations.get(name, 0) + 1
+        return self._iterations[name]
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """转换为 OTLP/JSON 的 ExportTraceServiceRequest"""
+        spans = []
+        for span in self.spans:
+            item = {
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": SPAN_KIND_INTERNAL,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns or span.start_ns),
+                "attributes": _otlp_attributes(span.attributes),
+                "events": [
+                    {"timeUnixNano": str(ts), "name": name, "attributes": _otlp_attributes(attributes)}
+                    for ts, name, attributes in span.events
+                ],
+                "status": {"code": span.status, "message": span.status_message} if span.status_message
+                else {"code": span.status},
+            }
+            if span.parent_id:
+                item["parentSpanId"] = span.parent_id
+            spans.append(item)
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+            }]
+        }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # OTLP/JSON 中 64 位整数以字符串表示
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+# ===================== 导出 =====================
+
+class OTLPFileExporter:
+    """每次追踪写入一个单行 OTLP/JSON 文件"""
+
+    def __init__(self, directory: str = TRACE_DIR, keep: int = TRACE_KEEP):
+        """
+        Args:
+            directory: 追踪文件目录
+            keep: 保留的文件数量
+        """
+        self.directory = directory
+        self.keep = keep
+
+    def export(self, trace: Trace) -> str:
+        """写入追踪文件，返回文件路径"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{trace.trace_id}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(trace.to_otlp(), f, ensure_ascii=False, separators=(",", ":"))
+            f.write("\n")
+        os.replace(tmp_path, path)
+        self._prune()
+        return path
+
+    def paths(self) -> List[str]:
+        """全部追踪文件，按修改时间从旧到新排列"""
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith(".json")]
+        except FileNotFoundError:
+            return []
+        paths = [os.path.join(self.directory, name) for name in names]
+        return sorted(paths, key=os.path.getmtime)
+
+    def _prune(self) -> None:
+        paths = self.paths()
+        for path in paths[:max(0, len(paths) - self.keep)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# ===================== 追踪器 =====================
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("chem_current_span", default=None)
+
+
+def current_span() -> Any:
+    """当前 span，不在追踪中时返回空 span"""
+    return _current_span.get() or NOOP_SPAN
+
+
+class Tracer:
+    """按请求记录 span，追踪结束时导出到文件"""
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, exporter: Optional[OTLPFileExporter] = None):
+        self.enabled = enabled
+        self.exporter = exporter or OTLPFileExporter()
+        self.exported = 0
+        self.export_errors = 0
+        self.last_trace_id: Optional[str] = None
+
+    @contextmanager
+    def trace(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """
+        开始一次追踪，结束时在当前线程中导出；已在追踪中时作为当前 span 的子 span
+
+        供同步代码使用，异步代码使用 atrace()
+
+        Args:
+            name: 根 span 名称
+            attributes: 根 span 属性
+        """
+        if not self.enabled or _current_span.get() is not None:
+            with self.span(name, attributes) as span:
+                yield span
+            return
+
+        trace = Trace()
+        try:
+            with self._span(trace, None, name, attributes) as span:
+                yield span
+        finally:
+            self._export(trace)
+
+    @asynccontextmanager
+    async def atrace(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> AsyncIterator[Any]:
+        """trace() 的异步版本：结束时在线程池中序列化并写入追踪文件，不阻塞事件循环"""
+        if not self.enabled or _current_span.get() is not None:
+            with self.span(name, attributes) as span:
+                yield span
+            return
+
+        trace = Trace()
+        try:
+            with self._span(trace, None, name, attributes) as span:
+                yield span
+        finally:
+            await run_sync(self._export, trace)
+
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> ContextManager[Any]:
+        """当前追踪下的子 span；不在追踪中时返回空 span（不创建生成器，上游调用等热路径开销可忽略）"""
+        parent = _current_span.get()
+        if parent is None:
+            return _NOOP_CONTEXT
+        return self._span(parent.trace, parent.span_id, name, attributes)
+
+    @contextmanager
+    def _span(
+        self, trace: Trace, parent_id: Optional[str], name: str, attributes: Optional[Dict[str, Any]]
+    ) -> Iterator[Span]:
+        span = Span(trace, name, parent_id, attributes)
+        trace.spans.append(span)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            _current_span.reset(token)
+
+    def _export(self, trace: Trace) -> None:
+        """导出追踪；写入失败只记录日志，不影响请求"""
+        root = trace.spans[0]
+        try:
+            path = self.exporter.export(trace)
+        except OSError as e:
+            self.export_errors += 1
+            logger.warning(f"[追踪] 写入 {trace.trace_id} 失败: {str(e)}")
+            return
+        self.exported += 1
+        self.last_trace_id = trace.trace_id
+        seconds = (root.end_ns - root.start_ns) / 1e9
+        logger.info(f"[追踪] {root.name} 耗时 {seconds:.2f}s，{len(trace.spans)} 个 span，已写入 {path}")
+
+    def stats(self) -> Dict[str, Any]:
+        """导出追踪统计"""
+        return {
+            "enabled": self.enabled,
+            "directory": self.exporter.directory,
+            "exported": self.exported,
+            "export_errors": self.export_errors,
+            "last_trace_id": self.last_trace_id,
+        }
+
+
+# 进程级单例
+tracer = Tracer()
+
+
+def record_usage(span: Any, result: Any) -> None:
+    """结果为模型消息时，把 token 用量记入 span"""
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        span.set_attributes({
+            "gen_ai.usage.input_tokens": usage.get("input_tokens"),
+            "gen_ai.usage.output_tokens": usage.get("output_tokens"),
+        })
+
+
+def traced_node(fn: Callable) -> Callable:
+    """LangGraph 异步节点装饰器：每次执行记录一个 span，并标注是本次请求中的第几次执行"""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with tracer.span(name, {"langgraph.node": name}) as span:
+            if span.trace is not None:
+                span.set_attribute("langgraph.node.iteration", span.trace.next_iteration(name))
+            return await fn(*args, **kwargs)
+
+    return wrapper
+
+
+# ===================== 查看追踪（命令行） =====================
+
+def load_trace(ref: Optional[str] = None, directory: str = TRACE_DIR) -> Dict[str, Any]:
+    """
+    读取追踪文件
+
+    Args:
+        ref: 文件路径、trace_id 或其前缀；为空时读取最新的追踪
+        directory: 追踪文件目录
+    """
+    if ref and os.path.isfile(ref):
+        path = ref
+    else:
+        paths = OTLPFileExporter(directory).paths()
+        if ref:
+            paths = [p for p in paths if os.path.basename(p).startswith(ref)]
+        if not paths:
+            raise FileNotFoundError(f"{directory} 中没有匹配的追踪文件")
+        path = paths[-1]
+    with open(path, encoding="utf-8") as f:
+        return json.loads(f.readline())
+
+
+def _attribute_value(value: Dict[str, Any]) -> Any:
+    kind, raw = next(iter(value.items()))
+    return int(raw) if kind == "intValue" else raw
+
+
+def flatten_spans(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """把 OTLP/JSON 展开为 span 列表（按开始时间排序）"""
+    spans = []
+    for resource_spans in data.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                spans.append({
+                    "trace_id": span["traceId"],
+                    "span_id": span["spanId"],
+                    "parent_id": span.get("parentSpanId") or None,
+                    "name": span["name"],
+                    "start": int(span["startTimeUnixNano"]),
+                    "end": int(span["endTimeUnixNano"]),
+                    "attributes": {a["key"]: _attribute_value(a["value"]) for a in span.get("attributes", [])},
+                    "events": [
+                        (int(e["timeUnixNano"]), e["name"]) for e in span.get("events", [])
+                    ],
+                    "error": span.get("status", {}).get("message")
+                    if span.get("status", {}).get("code") == STATUS_ERROR else None,
+                })
+    return sorted(spans, key=lambda s: s["start"])
+
+
+def _span_label(span: Dict[str, Any]) -> str:
+    attributes = span["attributes"]
+    parts = [span["name"]]
+    if "langgraph.node.iteration" in attributes:
+        parts[0] += f" #{attributes['langgraph.node.iteration']}"
+    if "gen_ai.usage.input_tokens" in attributes:
+        parts.append(f"tokens {attributes['gen_ai.usage.input_tokens']}→{attributes.get('gen_ai.usage.output_tokens')}")
+    if "image.poll.attempts" in attributes:
+        parts.append(f"轮询 {attributes['image.poll.attempts']} 次")
+    if attributes.get("retry.count"):
+        parts.append(f"重试 {attributes['retry.count']} 次")
+    if "eval.ok" in attributes:
+        parts.append("评估通过" if attributes["eval.ok"] else "评估未通过")
+    if attributes.get("image.store_hit"):
+        parts.append("图像存储命中")
+    if span["error"]:
+        parts.append(f"错误: {span['error']}")
+    return "  ".join(parts)
+
+
+def format_timeline(spans: List[Dict[str, Any]], width: int = 40) -> str:
+    """以文本瀑布图展示一次追踪，并汇总各节点次数与耗时、token 和轮询次数"""
+    if not spans:
+        return "（空追踪）"
+    origin = min(s["start"] for s in spans)
+    total = max(max(s["end"] for s in spans) - origin, 1)
+    depth: Dict[str, int] = {}
+    for span in spans:
+        depth[span["span_id"]] = depth.get(span["parent_id"], -1) + 1
+
+    root = spans[0]
+    lines = [f"追踪 {root['trace_id']}  {root['name']}  共 {total / 1e9:.2f}s", ""]
+    # 中文标题占两列宽度
+    lines.append(f"{'开始':>7}{'耗时':>8}  {'':{width + 2}}  操作")
+    for span in spans:
+        begin = (span["start"] - origin) / total
+        length = (span["end"] - span["start"]) / total
+        left = min(width - 1, int(begin * width))
+        bar = " " * left + "█" * max(1, round(length * width))
+        lines.append(
+            f"{(span['start'] - origin) / 1e9:>8.2f}s{(span['end'] - span['start']) / 1e9:>9.2f}s"
+            f"  |{bar[:width]:<{width}}|  {'  ' * depth[span['span_id']]}{_span_label(span)}"
+        )
+
+    nodes: Dict[str, List[float]] = {}
+    input_tokens = output_tokens = poll_attempts = retries = 0
+    poll_seconds = 0.0
+    for span in spans:
+        attributes = span["attributes"]
+        if "langgraph.node" in attributes:
+            nodes.setdefault(attributes["langgraph.node"], []).append((span["end"] - span["start"]) / 1e9)
+        input_tokens += attributes.get("gen_ai.usage.input_tokens", 0)
+        output_tokens += attributes.get("gen_ai.usage.output_tokens", 0)
+        retries += attributes.get("retry.count", 0)
+        if "image.poll.attempts" in attributes:
+            poll_attempts += attributes["image.poll.attempts"]
+            poll_seconds += (span["end"] - span["start"]) / 1e9
+    if nodes:
+        lines += ["", "节点汇总："]
+        for name, durations in nodes.items():
+            lines.append(f"  {name:<24}{len(durations):>3} 次{sum(durations):>10.2f}s")
+    lines.append("")
+    lines.append(
+        f"token：输入 {input_tokens}，输出 {output_tokens}；"
+        f"图像任务轮询 {poll_attempts} 次（{poll_seconds:.2f}s）；上游重试 {retries} 次"
+    )
+    return "\n".join(lines)
+
+
+def to_chrome_trace(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """转换为 Chrome trace 事件格式（时间单位为微秒）"""
+    origin = min((s["start"] for s in spans), default=0)
+    events = []
+    for span in spans:
+        events.append({
+            "name": span["name"],
+            "cat": "node" if "langgraph.node" in span["attributes"] else "span",
+            "ph": "X",
+            "ts": (span["start"] - origin) / 1000,
+            "dur": (span["end"] - span["start"]) / 1000,
+            "pid": 1,
+            "tid": 1,
+            "args": span["attributes"],
+        })
+        for ts, name in span["events"]:
+            events.append({"name": name, "ph": "i", "s": "t", "ts": (ts - origin) / 1000, "pid": 1, "tid": 1})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="查看文生图请求的追踪时间线")
+    parser.add_argument("trace", nargs="?", help="trace_id（或前缀）、追踪文件路径；默认最新的追踪")
+    parser.add_argument("--dir", default=TRACE_DIR, help="追踪文件目录")
+    parser.add_argument("--list", action="store_true", help="列出最近的追踪")
+    parser.add_argument("--chrome", metavar="PATH", help="另存为 Chrome trace 格式（Perfetto / chrome://tracing）")
+    parser.add_argument("--width", type=int, default=40, help="时间条宽度")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for path in OTLPFileExporter(args.dir).paths()[-20:]:
+            spans = flatten_spans(load_trace(path))
+            root = spans[0]
+            print(f"{root['trace_id']}  {root['name']:<16}{(root['end'] - root['start']) / 1e9:>9.2f}s  {len(spans)} 个 span")
+        return
+
+    try:
+        spans = flatten_spans(load_trace(args.trace, args.dir))
+    except FileNotFoundError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+    print(format_timeline(spans, args.width))
+    if args.chrome:
+        with open(args.chrome, "w", encoding="utf-8") as f:
+            json.dump(to_chrome_trace(spans), f, ensure_ascii=False)
+        print(f"\nChrome trace 已写入 {args.chrome}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+上传模块 - multipart/form-data 图片流式接收
+
+浏览器直接上传图片文件，不再在 JSON 中内联 base64：
+- 边接收边写入 SpooledTemporaryFile（小图留在内存，大图落盘），同时增量计算 sha256；
+  落盘后（含转存到磁盘的那一次）的解析与写入在线程池中执行，不阻塞事件循环
+- 超过大小上限立即中止（Content-Length 预检 + 接收过程中计数）
+- 请求体只解析一次，base64 编码推迟到调用上游模型前
+"""
+
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+try:
+    from .executor import run_sync
+except ImportError:
+    from backend.executor import run_sync
+
+# 单个请求的大小上限（MB）、内存中暂存的最大字节数（KB，超出后写入临时文件）
+UPLOAD_MAX_MB = float(os.getenv("CHEM_UPLOAD_MAX_MB", "20"))
+UPLOAD_SPOOL_KB = int(os.getenv("CHEM_UPLOAD_SPOOL_KB", "1024"))
+
+# 允许的图片类型
+IMAGE_MEDIA_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp", "image/bmp")
+
+# 普通表单字段（如 api_key）的大小上限
+_MAX_FIELD_BYTES = 4096
+
+
+class UploadError(ValueError):
+    """上传请求格式错误"""
+
+
+class UploadTooLargeError(UploadError):
+    """上传内容超过大小上限"""
+
+
+@dataclass
+class SpooledUpload:
+    """已接收的上传文件"""
+    file: tempfile.SpooledTemporaryFile
+    filename: str
+    media_type: str
+    size: int
+    sha256: str
+    fields: Dict[str, str] = field(default_factory=dict)
+
+    def read(self) -> bytes:
+        """读取文件内容（只在调用上游前读取一次）"""
+        self.file.seek(0)
+        return self.file.read()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _FormReceiver:
+    """python-multipart 回调：文件部分写入临时文件，其余字段收集为文本"""
+
+    def __init__(self, file_field: str, max_bytes: int):
+        self.file_field = file_field
+        self.max_bytes = max_bytes
+        self.file: Optional[tempfile.SpooledTemporaryFile] = None
+        self.filename = ""
+        self.media_type = ""
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.fields: Dict[str, str] = {}
+
+        self._headers: Dict[str, str] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._name: Optional[str] = None
+        self._is_file = False
+        self._value = bytearray()
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def spills(self, chunk: bytes) -> bool:
+        """写入这段请求体后临时文件是否会落盘（已落盘或即将超出内存暂存上限）"""
+        return self.size + len(chunk) > UPLOAD_SPOOL_KB * 1024
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+        self._name = None
+        self._is_file = False
+        self._value = bytearray()
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[self._header_field.decode("latin-1").lower()] = self._header_value.decode("latin-1")
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get("content-disposition", ""))
+        name = options.get(b"name")
+        self._name = name.decode("utf-8", "replace") if name is not None else None
+        if self._name != self.file_field:
+            return
+        if self.file is not None:
+            raise UploadError(f"字段 {self.file_field} 只能包含一个文件")
+        media_type, _ = parse_options_header(self._headers.get("content-type", ""))
+        self.media_type = media_type.decode("latin-1").lower()
+        if self.media_type not in IMAGE_MEDIA_TYPES:
+            raise UploadError(f"不支持的图片类型: {self.media_type or '未知'}")
+        self.filename = options.get(b"filename", b"").decode("utf-8", "replace")
+        self.file = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_KB * 1024)
+        self._is_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        chunk = data[start:end]
+        if self._is_file:
+            self.size += len(chunk)
+            if self.size > self.max_bytes:
+                raise UploadTooLargeError(f"图片超过大小上限 {self.max_bytes // (1024 * 1024)} MB")
+            self.digest.update(chunk)
+            self.file.write(chunk)
+        elif self._name is not None:
+            self._value += chunk
+            if len(self._value) > _MAX_FIELD_BYTES:
+                raise UploadError(f"字段 {self._name} 过长")
+
+    def on_part_end(self) -> None:
+        if not self._is_file and self._name is not None:
+            self.fields[self._name] = self._value.decode("utf-8", "replace")
+
+
+async def receive_image(
+    request: Request,
+    file_field: str = "image",
+    max_bytes: int = int(UPLOAD_MAX_MB * 1024 * 1024),
+) -> SpooledUpload:
+    """
+    流式接收 multipart/form-data 中的图片文件
+
+    Args:
+        request: 请求对象
+        file_field: 文件字段名
+        max_bytes: 文件大小上限（字节）
+
+    Returns:
+        已接收的上传文件（调用方负责 close）
+
+    Raises:
+        UploadTooLargeError: 超过大小上限
+        UploadError: 不是 multipart 请求、缺少文件或图片类型不支持
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadError("请求必须是 multipart/form-data")
+
+    # 表单其他字段与 multipart 分隔符的开销很小，预留 64KB 余量
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + 65536:
+        raise UploadTooLargeError(f"图片超过大小上限 {max_bytes // (1024 * 1024)} MB")
+
+    receiver = _FormReceiver(file_field, max_bytes)
+    parser = MultipartParser(boundary, receiver.callbacks())
+    try:
+        async for chunk in request.stream():
+            if receiver.spills(chunk):
+                # 磁盘写入放到线程池；分块按顺序等待，解析器不会被并发调用
+                await run_sync(parser.write, chunk)
+            else:
+                parser.write(chunk)
+        parser.finalize()
+    except UploadError:
+        if receiver.file is not None:
+            receiver.file.close()
+        raise
+    except Exception as e:
+        if receiver.file is not None:
+            receiver.file.close()
+        raise UploadError(f"multipart 解析失败: {str(e)}") from e
+
+    if receiver.file is None or receiver.size == 0:
+        raise UploadError(f"缺少图片文件字段 {file_field}")
+    return SpooledUpload(
+        file=receiver.file,
+        filename=receiver.filename,
+        media_type=receiver.media_type,
+        size=receiver.size,
+        sha256=receiver.digest.hexdigest(),
+        fields=receiver.fields,
+    )
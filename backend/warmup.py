@@ -0,0 +1,188 @@
+"""
+启动预热模块 - 在接收课堂请求前完成冷启动开销
+
+部署后的首个请求原本要承担：智能体编译（LangChain / LangGraph 的延迟导入与 schema 生成）、
+文生图模块导入与工作流编译、到 ModelScope 的 DNS 解析与 TLS 握手、图片预处理进程池启动、
+tiktoken 编码加载、磁盘结果缓存建库与图片存储目录扫描。应用启动时在后台并发完成这些步骤：
+
+- 预热期间 GET /api/ready 返回 503，完成后返回 200（个别步骤失败不阻止就绪，失败原因见统计）
+- 请求使用各自的 API 密钥，智能体按密钥缓存：默认用占位密钥编译一次后丢弃，
+  使首个真实请求只需轻量构建；配置 CHEM_WARMUP_API_KEY（或 modelscope_API_KEY）时直接预建该密钥的智能体
+- CHEM_WARMUP=0 关闭预热，启动后立即就绪
+"""
+
+import asyncio
+import importlib
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+try:
+    from .client_registry import MODELSCOPE_BASE_URL, registry
+    from .task_poller import MODELSCOPE_API_BASE
+    from .executor import run_sync
+    from .prompts import load_encoder
+    from .result_cache import result_cache
+    from .image_store import image_store
+    from .image_preprocess import image_preprocessor
+    from .equation_balancer import local_balance_equation
+    from . import equation_balancer, material_recognizer, reaction_explainer
+except ImportError:
+    from backend.client_registry import MODELSCOPE_BASE_URL, registry
+    from backend.task_poller import MODELSCOPE_API_BASE
+    from backend.executor import run_sync
+    from backend.prompts import load_encoder
+    from backend.result_cache import result_cache
+    from backend.image_store import image_store
+    from backend.image_preprocess import image_preprocessor
+    from backend.equation_balancer import local_balance_equation
+    from backend import equation_balancer, material_recognizer, reaction_explainer
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("CHEM_WARMUP", "1") == "1"
+WARMUP_API_KEY = os.getenv("CHEM_WARMUP_API_KEY") or os.getenv("modelscope_API_KEY")
+# 单个步骤的超时时间（秒）与每个上游预先建立的连接数
+WARMUP_TIMEOUT = float(os.getenv("CHEM_WARMUP_TIMEOUT", "15"))
+WARMUP_CONNECTIONS = int(os.getenv("CHEM_WARMUP_CONNECTIONS", "2"))
+
+# 未配置密钥时编译智能体使用的占位密钥（不发起模型调用，编译后丢弃）
+PLACEHOLDER_API_KEY = "warmup-placeholder"
+
+STATE_PENDING = "pending"
+STATE_RUNNING = "running"
+STATE_READY = "ready"
+STATE_DISABLED = "disabled"
+
+# 预热本地配平与化学式解析代码路径使用的方程式
+_SAMPLE_EQUATION = "Fe + CuSO4 = FeSO4 + Cu"
+
+
+def upstream_urls() -> List[str]:
+    """需要预先建连的上游地址（同一主机只保留一个）"""
+    urls: Dict[tuple, str] = {}
+    for url in (f"{MODELSCOPE_BASE_URL.rstrip('/')}/models", MODELSCOPE_API_BASE):
+        parts = urlsplit(url)
+        urls.setdefault((parts.scheme, parts.netloc), url)
+    return list(urls.values())
+
+
+class Warmup:
+    """启动预热执行器，记录各步骤耗时与就绪状态"""
+
+    def __init__(
+        self,
+        enabled: bool = WARMUP_ENABLED,
+        api_key: Optional[str] = WARMUP_API_KEY,
+        timeout: float = WARMUP_TIMEOUT,
+        connections: int = WARMUP_CONNECTIONS,
+    ):
+        """
+        Args:
+            enabled: 是否开启预热
+            api_key: 预建智能体使用的密钥，为空时使用占位密钥
+            timeout: 单个步骤的超时时间（秒）
+            connections: 每个上游预先建立的连接数
+        """
+        self.enabled = enabled
+        self.api_key = api_key
+        self.timeout = timeout
+        self.connections = connections
+        self.state = STATE_PENDING if enabled else STATE_DISABLED
+        self.seconds: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state in (STATE_READY, STATE_DISABLED)
+
+    def start(self) -> Optional[asyncio.Task]:
+        """在后台启动预热（需在事件循环中调用），未开启时直接返回"""
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self) -> None:
+        """取消尚未完成的预热（应用关闭时调用）"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self) -> None:
+        """并发执行全部预热步骤"""
+        self.state = STATE_RUNNING
+        start = time.perf_counter()
+        await asyncio.gather(
+            self._step("agents", self._warm_agents),
+            self._step("connections", self._warm_connections),
+            self._step("image_preprocess", image_preprocessor.warm_up),
+            self._step("tokenizer", lambda: run_sync(load_encoder)),
+            self._step("caches", self._warm_caches),
+        )
+        self.seconds = time.perf_counter() - start
+        self.state = STATE_READY
+        failed = [name for name, step in self.steps.items() if not step["ok"]]
+        if failed:
+            logger.warning(f"[预热] 完成，耗时 {self.seconds:.2f}s，失败步骤: {', '.join(failed)}")
+        else:
+            logger.info(f"[预热] 完成，耗时 {self.seconds:.2f}s")
+
+    async def _step(self, name: str, fn: Callable[[], Awaitable[Any]]) -> None:
+        """执行单个步骤并记录耗时；失败或超时只记录，不影响其他步骤"""
+        start = time.perf_counter()
+        error = None
+        try:
+            await asyncio.wait_for(fn(), self.timeout)
+        except asyncio.TimeoutError:
+            error = f"超时（{self.timeout:g}s）"
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+        self.steps[name] = {"ok": error is None, "seconds": time.perf_counter() - start, "error": error}
+        if error is not None:
+            logger.warning(f"[预热] {name} 失败: {error}")
+
+    async def _warm_agents(self) -> None:
+        """
+        编译讲解、配平、识别的智能体，并导入文生图模块（编译工作流）
+
+        在同一线程中依次执行：两个线程同时首次导入 langchain 会触发导入死锁（_DeadlockError）。
+        """
+        api_key = self.api_key or PLACEHOLDER_API_KEY
+
+        def build() -> None:
+            for module in (reaction_explainer, equation_balancer, material_recognizer):
+                module._build_agent(api_key)
+            if not self.api_key:
+                registry.discard(PLACEHOLDER_API_KEY)
+            importlib.import_module(f"{__package__}.reaction_image_generator")
+
+        await run_sync(build)
+
+    async def _warm_connections(self) -> None:
+        """预先完成 DNS 解析、TCP 建连与 TLS 握手"""
+        await registry.warm_up(upstream_urls(), self.connections, self.timeout)
+
+    async def _warm_caches(self) -> None:
+        """打开磁盘结果缓存、扫描图片存储目录，并走一遍本地配平"""
+        await run_sync(result_cache.warm_up)
+        await run_sync(image_store.warm_up)
+        await run_sync(local_balance_equation, _SAMPLE_EQUATION)
+
+    def stats(self) -> Dict[str, Any]:
+        """导出预热状态与各步骤耗时"""
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "seconds": self.seconds,
+            "steps": self.steps,
+        }
+
+
+# 进程级单例
+warmup = Warmup()
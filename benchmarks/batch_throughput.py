@@ -0,0 +1,103 @@
+"""
+基准：练习卷批量配平 / 讲解 vs 逐条调用
+
+以一份 40 条左右、含重复与等价写法的练习卷为输入，上游模型替换为带随机延迟的假实现
+（不访问网络，结果缓存关闭），统计：
+- 逐条顺序调用 ChemistryService（旧方式：前端逐条 POST）的总耗时
+- 批量接口在不同并发上限下的总耗时、去重后的上游调用次数
+同时校验：批量结果与逐条结果一致，且按输入顺序返回。
+
+使用：
+    python benchmarks/batch_throughput.py [--latency 0.5] [--concurrency 1 4 8]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import services
+from backend.result_cache import ResultCache
+from backend.services import ChemistryService
+
+# 一份练习卷：常见方程式，含重复题与不同写法
+WORKSHEET = [
+    "H2 + O2 = H2O", "Fe + O2 = Fe3O4", "Mg + O2 = MgO", "C + O2 = CO2", "S + O2 = SO2",
+    "P + O2 = P2O5", "Al + O2 = Al2O3", "CH4 + O2 = CO2 + H2O", "C2H5OH + O2 = CO2 + H2O",
+    "KClO3 = KCl + O2", "KMnO4 = K2MnO4 + MnO2 + O2", "H2O2 = H2O + O2", "CaCO3 = CaO + CO2",
+    "CaCO3 + HCl = CaCl2 + H2O + CO2", "Zn + H2SO4 = ZnSO4 + H2", "Fe + HCl = FeCl2 + H2",
+    "Al + HCl = AlCl3 + H2", "Fe + CuSO4 = FeSO4 + Cu", "Cu + AgNO3 = Cu(NO3)2 + Ag",
+    "NaOH + HCl = NaCl + H2O", "Ca(OH)2 + CO2 = CaCO3 + H2O", "Na2CO3 + HCl = NaCl + H2O + CO2",
+    "CuSO4 + NaOH = Cu(OH)2 + Na2SO4", "FeCl3 + NaOH = Fe(OH)3 + NaCl", "Fe2O3 + CO = Fe + CO2",
+    "CuO + H2 = Cu + H2O", "N2 + H2 = NH3", "Cu + HNO3 = Cu(NO3)2 + NO + H2O",
+    "Na + H2O = NaOH + H2", "Cl2 + NaOH = NaCl + NaClO + H2O", "MnO2 + HCl = MnCl2 + Cl2 + H2O",
+    "Al + NaOH + H2O = NaAlO2 + H2",
+    # 重复题与等价写法
+    "H₂ + O₂ → H₂O", "O2 + H2 = H2O", "CH₄ + 2O₂ → CO₂ + 2H₂O", "Mg + O2 = MgO",
+    "CaCO₃ → CaO + CO₂", "NaOH + HCl → NaCl + H₂O", "Fe+CuSO4=FeSO4+Cu", "Zn + H₂SO₄ → ZnSO₄ + H₂",
+]
+
+
+def install_fake_upstream(mean_latency: float, rng: random.Random) -> dict:
+    """替换上游模型调用，返回调用计数"""
+    counter = {"calls": 0}
+
+    async def fake(text: str, api_key: str) -> str:
+        counter["calls"] += 1
+        await asyncio.sleep(mean_latency * rng.uniform(0.6, 1.4))
+        return f"讲解：{services.canonicalize(text)}"
+
+    services.aexplain_reaction = fake
+    services.abalance_equation = fake
+    return counter
+
+
+def reset_cache() -> None:
+    """关闭结果缓存，各轮之间互不命中"""
+    services.result_cache = ResultCache(path=None, memory_size=0)
+
+
+async def sequential(worksheet) -> list:
+    return [await ChemistryService.abalance_equation(eq, "bench") for eq in worksheet]
+
+
+async def main_async(args) -> None:
+    rng = random.Random(args.seed)
+    counter = install_fake_upstream(args.latency, rng)
+
+    reset_cache()
+    start = time.perf_counter()
+    expected = await sequential(WORKSHEET)
+    baseline = time.perf_counter() - start
+    print(f"练习卷 {len(WORKSHEET)} 条，上游平均延迟 {args.latency:.2f}s\n")
+    print(f"{'方式':<16}{'上游调用':>8}{'总耗时':>10}{'加速比':>8}{'顺序估计':>10}")
+    print(f"{'逐条调用':<16}{counter['calls']:>8}{baseline:>9.2f}s{1:>8.1f}{'-':>10}")
+
+    for concurrency in args.concurrency:
+        reset_cache()
+        counter["calls"] = 0
+        result = await ChemistryService.abalance_batch(WORKSHEET, "bench", concurrency=concurrency)
+        got = [item["data"] for item in result["results"]]
+        assert got == expected, "批量结果与逐条结果不一致"
+        assert [item["input"] for item in result["results"]] == WORKSHEET
+        print(
+            f"{f'批量 并发={concurrency}':<16}{counter['calls']:>8}{result['elapsed']:>9.2f}s"
+            f"{baseline / result['elapsed']:>8.1f}{result['sequential_estimate']:>9.2f}s"
+        )
+    print("\n自检通过：批量结果与逐条结果一致，顺序保持")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量接口基准")
+    parser.add_argument("--latency", type=float, default=0.5, help="上游平均延迟（秒）")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--seed", type=int, default=16)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+演示与自检：上游故障下的重试与熔断
+
+在本地线程中启动一个模拟 ModelScope 的 HTTP 服务（OpenAI 兼容的 /v1/chat/completions 与
+/v1/images/generations），按场景注入故障，通过 ChemistryService 真实走完智能体调用链：
+
+1. 正常调用
+2. 暂时性故障：前两次返回 503，重试后成功
+3. 客户端错误：返回 401，不重试、不计入熔断
+4. 持续故障：每次 0.3s 后返回 500，连续失败达到阈值后熔断，后续请求立即失败
+5. 恢复：上游恢复后等待半开时间，探测请求成功，熔断器闭合
+6. 提交文生图任务（非幂等）：500 不重试；连接失败（请求未送达）才重试
+7. 半开探测：熔断后的探测请求在送达后失败时，非幂等的任务提交不重试；
+   对冲调用在探测期间被熔断器拦截，不会向上游发出第二个请求，失败后重新熔断
+8. 单个密钥限流：密钥 A 持续收到 429（照常重试），熔断器保持闭合，密钥 B 的调用不受影响
+
+每个场景校验上游实际收到的请求数、重试次数与熔断状态，全部通过时输出“自检通过”。
+
+使用：
+    python benchmarks/fault_injection.py
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+THRESHOLD = 3
+RESET_TIMEOUT = 1.0
+
+
+class FaultState:
+    """模拟服务的故障配置与请求计数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.fail_next = 0
+        self.fail_status = 503
+        self.down = False
+        self.delay = 0.0
+        self.throttled = ""
+
+    def reset(self, **kwargs) -> None:
+        with self.lock:
+            self.requests = 0
+            self.fail_next = kwargs.get("fail_next", 0)
+            self.fail_status = kwargs.get("fail_status", 503)
+            self.down = kwargs.get("down", False)
+            self.delay = kwargs.get("delay", 0.0)
+            self.throttled = kwargs.get("throttled", "")
+
+    def next_status(self, authorization: str = "") -> int:
+        with self.lock:
+            self.requests += 1
+            if self.throttled and authorization == f"Bearer {self.throttled}":
+                return 429
+            if self.down:
+                return 500
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                return self.fail_status
+            return 200
+
+
+state = FaultState()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if state.delay:
+            time.sleep(state.delay)
+        status = state.next_status(self.headers.get("Authorization", ""))
+        if status != 200:
+            self._send(status, {"error": {"message": f"injected {status}", "type": "server_error"}})
+            return
+        if self.path.endswith("/images/generations"):
+            self._send(200, {"task_id": "task-1"})
+            return
+        self._send(200, {
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "stand-in",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "【反应名称】模拟讲解"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server() -> int:
+    port = free_port()
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return port
+
+
+PORT = start_server()
+os.environ.update({
+    "CHEM_MODELSCOPE_BASE_URL": f"http://127.0.0.1:{PORT}/v1",
+    "CHEM_MODELSCOPE_API_BASE": f"http://127.0.0.1:{PORT}/",
+    "CHEM_BREAKER_THRESHOLD": str(THRESHOLD),
+    "CHEM_BREAKER_RESET_TIMEOUT": str(RESET_TIMEOUT),
+    "CHEM_RETRY_BASE_DELAY": "0.05",
+    "CHEM_RESULT_CACHE_PATH": "",
+    "CHEM_RATE_LIMIT_RPS": "0",
+})
+
+from backend.client_registry import registry  # noqa: E402
+from backend.hedging import Hedger  # noqa: E402
+from backend.metrics import latency  # noqa: E402
+from backend.resilience import UPSTREAM_CHAT, UPSTREAM_IMAGE, CircuitOpenError, resilience  # noqa: E402
+from backend.services import ChemistryService  # noqa: E402
+
+_counter = 0
+
+
+async def explain(api_key: str = "stand-in-key") -> tuple:
+    """调用一次讲解（每次输入不同，不命中缓存），返回 (结果, 耗时)"""
+    global _counter
+    _counter += 1
+    start = time.perf_counter()
+    try:
+        await ChemistryService.aexplain_reaction(f"测试反应{_counter}", api_key)
+        outcome = "成功"
+    except CircuitOpenError:
+        outcome = "熔断"
+    except Exception as e:
+        outcome = f"失败({getattr(e, 'status_code', type(e).__name__)})"
+    return outcome, time.perf_counter() - start
+
+
+def breaker(name: str = UPSTREAM_CHAT) -> dict:
+    return resilience.breaker(name).snapshot()
+
+
+async def submit_image(url: str) -> str:
+    async def submit():
+        response = await registry.async_http_client.post(url, content=b"{}")
+        response.raise_for_status()
+        return response.json()["task_id"]
+
+    try:
+        return await resilience.acall(UPSTREAM_IMAGE, submit, idempotent=False)
+    except Exception as e:
+        return type(e).__name__
+
+
+async def chat_call() -> dict:
+    """直接调用一次对话接口（不经过缓存与请求合并）"""
+    response = await registry.async_http_client.post(f"http://127.0.0.1:{PORT}/v1/chat/completions", content=b"{}")
+    response.raise_for_status()
+    return response.json()
+
+
+async def open_breaker(upstream: str, call) -> None:
+    """连续注入 500 使上游熔断"""
+    state.reset(down=True)
+    while breaker(upstream)["state"] != "open":
+        try:
+            await call()
+        except Exception:
+            pass
+
+
+async def half_open_probes() -> None:
+    """场景 7：半开探测请求送达后失败时不重试，对冲调用不绕过探测"""
+    submit_url = f"http://127.0.0.1:{PORT}/v1/images/generations"
+
+    # 非幂等提交：探测请求收到 500 后不重试，熔断器重新断开
+    await open_breaker(UPSTREAM_IMAGE, lambda: submit_image(submit_url))
+    await asyncio.sleep(RESET_TIMEOUT)
+    state.reset(down=True)
+    before = breaker(UPSTREAM_IMAGE)
+    results = await asyncio.gather(submit_image(submit_url), submit_image(submit_url))
+    after = breaker(UPSTREAM_IMAGE)
+    assert sorted(results) == ["CircuitOpenError", "HTTPStatusError"], results
+    assert state.requests == 1, "半开期间只允许一个探测请求送达上游"
+    assert after["retries"] == before["retries"], "送达后失败的任务提交不应重试"
+    assert after["state"] == "open" and after["opens"] == before["opens"] + 1
+
+    # 对冲：探测请求变慢触发对冲，对冲调用被熔断器拦截；探测失败后的重试遇到熔断直接失败
+    await open_breaker(UPSTREAM_CHAT, lambda: resilience.acall(UPSTREAM_CHAT, chat_call))
+    await asyncio.sleep(RESET_TIMEOUT)
+    state.reset(down=True, delay=0.5)
+    # 独立的功能名与样本，对冲等待固定为 min_delay
+    latency("probe.upstream").observe(0.01)
+    hedger = Hedger(enabled=True, features=("probe",), budget=1.0, min_samples=1, min_delay=0.05)
+    before = breaker(UPSTREAM_CHAT)
+    try:
+        await hedger.run("probe", lambda: resilience.acall(UPSTREAM_CHAT, chat_call))
+        raise AssertionError("探测失败时对冲调用不应成功")
+    except CircuitOpenError:
+        pass
+    after = breaker(UPSTREAM_CHAT)
+    stats = hedger.stats()["stats"]["probe"]
+    assert stats["extra_calls"] == 1, "探测请求变慢时应发起对冲调用"
+    assert state.requests == 1, "对冲调用与探测失败后的重试都不应送达上游"
+    assert after["short_circuited"] >= before["short_circuited"] + 2
+    assert after["state"] == "open"
+    print("半开探测：任务提交送达后失败不重试；对冲调用与重试均被熔断器拦截（上游只收到 1 次探测）")
+
+
+async def rate_limited_key() -> None:
+    """场景 8：密钥 A 的 429 风暴不让熔断器断开，密钥 B 照常调用"""
+    state.reset(throttled="key-a")
+    before = breaker()
+    results = await asyncio.gather(*(explain("key-a") for _ in range(THRESHOLD * 2)))
+    after = breaker()
+    assert all(outcome == "失败(429)" for outcome, _ in results), results
+    assert state.requests == THRESHOLD * 2 * resilience.attempts, "429 应照常重试"
+    assert after["state"] == "closed" and after["consecutive_failures"] == before["consecutive_failures"]
+    assert after["rate_limited"] - before["rate_limited"] == state.requests
+
+    state.reset(throttled="key-a")
+    results = await asyncio.gather(*(explain("key-b") for _ in range(THRESHOLD)))
+    assert all(outcome == "成功" for outcome, _ in results), results
+    assert state.requests == THRESHOLD and breaker()["short_circuited"] == after["short_circuited"]
+    print(f"单个密钥限流：密钥 A 的 {after['rate_limited'] - before['rate_limited']} 次 429 不计入熔断，密钥 B 的调用全部成功")
+
+
+async def main() -> None:
+    rows = []
+
+    def row(name, outcome, elapsed, retries_before):
+        snap = breaker()
+        rows.append((name, outcome, state.requests, snap["retries"] - retries_before, elapsed, snap["state"]))
+
+    # 1. 正常
+    state.reset()
+    r0 = breaker()["retries"]
+    outcome, elapsed = await explain()
+    row("正常调用", outcome, elapsed, r0)
+    assert outcome == "成功" and state.requests == 1
+
+    # 2. 暂时性故障
+    state.reset(fail_next=2, fail_status=503)
+    r0 = breaker()["retries"]
+    outcome, elapsed = await explain()
+    row("前两次 503", outcome, elapsed, r0)
+    assert outcome == "成功" and state.requests == 3 and breaker()["state"] == "closed"
+
+    # 3. 客户端错误
+    state.reset(fail_next=1, fail_status=401)
+    r0 = breaker()["retries"]
+    outcome, elapsed = await explain()
+    row("401 密钥错误", outcome, elapsed, r0)
+    assert outcome.startswith("失败") and state.requests == 1 and breaker()["consecutive_failures"] == 0
+
+    # 4. 持续故障
+    state.reset(down=True, delay=0.3)
+    for i in range(5):
+        r0 = breaker()["retries"]
+        outcome, elapsed = await explain()
+        row(f"持续 500 #{i + 1}", outcome, elapsed, r0)
+    assert breaker()["state"] == "open"
+    assert state.requests == THRESHOLD, "熔断后不应再访问上游"
+    assert rows[-1][1] == "熔断" and rows[-1][4] < 0.05
+
+    # 5. 恢复
+    state.reset()
+    await asyncio.sleep(RESET_TIMEOUT)
+    r0 = breaker()["retries"]
+    outcome, elapsed = await explain()
+    row("恢复（半开探测）", outcome, elapsed, r0)
+    assert outcome == "成功" and breaker()["state"] == "closed"
+
+    print(f"模拟上游 127.0.0.1:{PORT}，熔断阈值 {THRESHOLD}，半开等待 {RESET_TIMEOUT}s\n")
+    print(f"{'场景':<16}{'结果':<12}{'上游请求':>8}{'重试':>6}{'耗时':>10}{'熔断器':>12}")
+    for name, outcome, requests, retries, elapsed, br_state in rows:
+        print(f"{name:<16}{outcome:<12}{requests:>8}{retries:>6}{elapsed * 1000:>8.0f}ms{br_state:>12}")
+
+    # 6. 非幂等提交
+    state.reset(fail_next=1, fail_status=500)
+    result = await submit_image(f"http://127.0.0.1:{PORT}/v1/images/generations")
+    assert result == "HTTPStatusError" and state.requests == 1, "500 时不应重复提交任务"
+    state.reset()
+    assert await submit_image(f"http://127.0.0.1:{PORT}/v1/images/generations") == "task-1"
+    before = breaker(UPSTREAM_IMAGE)["retries"]
+    result = await submit_image(f"http://127.0.0.1:{free_port()}/v1/images/generations")
+    retried = breaker(UPSTREAM_IMAGE)["retries"] - before
+    assert result == "ConnectError" and retried == resilience.attempts - 1
+    print(f"\n文生图任务提交：500 时不重试（上游收到 1 次）；连接失败时重试 {retried} 次")
+
+    # 7. 半开探测
+    await half_open_probes()
+
+    # 8. 单个密钥限流（等待上一场景的熔断进入半开，先用一次成功调用让熔断器闭合）
+    state.reset()
+    await asyncio.sleep(RESET_TIMEOUT)
+    assert (await explain())[0] == "成功" and breaker()["state"] == "closed"
+    await rate_limited_key()
+
+    print("\n自检通过")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""
+基准：对冲请求对讲解反应尾延迟的影响
+
+上游替换为延迟呈长尾分布的假实现（不访问网络）：大部分调用耗时约 --latency 秒，
+--slow-ratio 比例的调用落在慢副本上，耗时为 --slow-factor 倍。结果缓存与限流关闭，
+经 ChemistryService.aexplain_reaction 走完整的服务层路径：
+- 关闭对冲跑一轮，同时积累单次调用延迟样本
+- 开启对冲（p95 触发、10% 预算）再跑一轮相同数量的请求
+对比 p50 / p95 / p99、上游调用总数与额外调用比例，并校验被取消的调用确实停止。
+
+使用：
+    python benchmarks/hedging.py [--requests 400] [--concurrency 8] [--slow-ratio 0.05]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["CHEM_RESULT_CACHE_PATH"] = ""
+os.environ["CHEM_RATE_LIMIT_RPS"] = "0"
+
+from backend import services
+from backend.hedging import Hedger
+from backend.services import ChemistryService
+
+# 预算额度有上限但可以预先积累，额外调用比例允许少量超出预算
+HEDGE_SLACK = 0.05
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))]
+
+
+def install_fake_upstream(args, rng: random.Random) -> dict:
+    counter = {"calls": 0, "cancelled": 0}
+
+    async def fake(text: str, api_key: str) -> str:
+        counter["calls"] += 1
+        slow = rng.random() < args.slow_ratio
+        delay = args.latency * rng.uniform(0.7, 1.3) * (args.slow_factor if slow else 1)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            counter["cancelled"] += 1
+            raise
+        return f"讲解：{text}"
+
+    services.aexplain_reaction = fake
+    return counter
+
+
+async def run_round(args, counter: dict, offset: int) -> dict:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            # 每条输入不同，不命中缓存也不被合并
+            await ChemistryService.aexplain_reaction(f"反应{offset + i}", "bench")
+            latencies.append(time.perf_counter() - start)
+
+    counter["calls"] = counter["cancelled"] = 0
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    return {
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.mean(latencies),
+        "calls": counter["calls"],
+        "cancelled": counter["cancelled"],
+        "elapsed": time.perf_counter() - start,
+    }
+
+
+async def main_async(args) -> None:
+    rng = random.Random(args.seed)
+    counter = install_fake_upstream(args, rng)
+
+    services.hedger = Hedger(enabled=False)
+    baseline = await run_round(args, counter, 0)
+
+    # 保留第一轮积累的单次调用延迟样本，作为对冲分位
+    hedger = Hedger(enabled=True, features=("explain",), percentile=args.percentile, budget=args.budget)
+    services.hedger = hedger
+    hedged = await run_round(args, counter, args.requests)
+    stats = hedger.stats()["stats"]["explain"]
+
+    print(
+        f"{args.requests} 次请求，并发 {args.concurrency}，上游 {args.latency * 1000:.0f}ms，"
+        f"{args.slow_ratio:.0%} 慢调用 ×{args.slow_factor:g}\n"
+    )
+    print(f"{'方式':<12}{'p50':>8}{'p95':>8}{'p99':>8}{'均值':>8}{'上游调用':>10}{'额外调用':>10}")
+    for name, result in (("不对冲", baseline), (f"对冲 p{args.percentile:g}", hedged)):
+        extra = result["calls"] - args.requests
+        print(
+            f"{name:<12}{result['p50'] * 1000:>6.0f}ms{result['p95'] * 1000:>6.0f}ms{result['p99'] * 1000:>6.0f}ms"
+            f"{result['mean'] * 1000:>6.0f}ms{result['calls']:>10}{extra / args.requests:>10.1%}"
+        )
+    print(
+        f"\n对冲 {stats['extra_calls']} 次（预算 {args.budget:.0%}，因预算不足跳过 {stats['budget_denied']} 次），"
+        f"对冲调用胜出 {stats['hedge_wins']} 次，被取消的调用 {hedged['cancelled']} 个"
+    )
+    print(f"p99 降低 {(baseline['p99'] - hedged['p99']) * 1000:.0f}ms（{1 - hedged['p99'] / baseline['p99']:.0%}）")
+
+    assert stats["extra_ratio"] <= args.budget + HEDGE_SLACK, "额外调用超出预算"
+    assert hedged["cancelled"] == stats["extra_calls"], "每次对冲应恰好取消一个落败调用"
+    print("\n自检通过：额外调用未超预算，落败调用均已取消")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对冲请求基准")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="正常调用耗时（秒）")
+    parser.add_argument("--slow-ratio", type=float, default=0.05)
+    parser.add_argument("--slow-factor", type=float, default=10)
+    parser.add_argument("--percentile", type=float, default=95)
+    parser.add_argument("--budget", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=21)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
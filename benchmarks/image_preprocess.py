@@ -0,0 +1,168 @@
+"""
+基准：物质识别上传前的图像预处理
+
+对一组手机照片（默认在内存中合成 8–12MP、带 EXIF 方向的 JPEG；也可传入本地图片路径），统计：
+- 原始 data URL 与预处理后 data URL 的大小
+- 预处理耗时（当前线程 / 进程池），以及预处理期间事件循环的最大停顿
+- 按给定上行带宽估算的上传耗时，以及端到端耗时（预处理 + 上传）前后对比
+同时校验：输出不超过目标大小、已按 EXIF 方向旋转、不含元数据；已在限制内且不含 EXIF 的小图原样返回。
+
+使用：
+    python benchmarks/image_preprocess.py [--uplink-kbps 1000] [--workers 2] [photo.jpg ...]
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from backend.image_preprocess import IMAGE_TARGET_KB, ImagePreprocessor, prepare_image
+
+# (宽, 高, EXIF 方向)
+SYNTHETIC_PHOTOS = [(4000, 3000, 6), (4032, 3024, 1), (3264, 2448, 8), (4624, 3472, 3)]
+
+
+def synthetic_photo(width: int, height: int, orientation: int, seed: int) -> bytes:
+    """合成一张接近手机照片统计特性的 JPEG（平滑色块 + 传感器噪声）"""
+    rng = np.random.default_rng(seed)
+    base = Image.fromarray((rng.random((height // 10, width // 10, 3)) * 255).astype("uint8"))
+    base = base.resize((width, height), Image.Resampling.BICUBIC)
+    noise = Image.fromarray((rng.random((height, width, 3)) * 255).astype("uint8"))
+    photo = Image.blend(base, noise, 0.12)
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    exif[0x010F] = "PhoneCam"
+    buffer = io.BytesIO()
+    photo.save(buffer, "JPEG", quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def to_data_url(data: bytes) -> str:
+    return "data:image/jpeg;base64," + base64.b64encode(data).decode("ascii")
+
+
+def check(data: bytes, orientation: int) -> None:
+    """自检：大小、方向、元数据"""
+    prepared = prepare_image(data)
+    assert len(prepared.data) <= IMAGE_TARGET_KB * 1024, len(prepared.data)
+    with Image.open(io.BytesIO(data)) as original:
+        width, height = original.size
+    rotated = orientation in (5, 6, 7, 8)
+    assert (prepared.width > prepared.height) == ((height > width) if rotated else (width > height))
+    with Image.open(io.BytesIO(prepared.data)) as output:
+        assert not output.getexif(), dict(output.getexif())
+
+
+def check_passthrough() -> None:
+    """自检：已在限制内的小图原样返回，带 EXIF 方向的小图仍旋转并去除元数据"""
+    small = Image.new("RGB", (640, 480), (40, 110, 200))
+    for image_format in ("JPEG", "PNG"):
+        buffer = io.BytesIO()
+        small.save(buffer, image_format)
+        prepared = prepare_image(buffer.getvalue())
+        assert prepared.data == buffer.getvalue() and prepared.quality is None, image_format
+
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    small.save(buffer, "JPEG", exif=exif)
+    prepared = prepare_image(buffer.getvalue())
+    assert prepared.data != buffer.getvalue() and (prepared.width, prepared.height) == (480, 640)
+    with Image.open(io.BytesIO(prepared.data)) as output:
+        assert not output.getexif(), dict(output.getexif())
+
+
+async def run_pool(preprocessor: ImagePreprocessor, urls) -> tuple:
+    """并发预处理，返回 (总耗时, 事件循环最大停顿)"""
+    stall = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal stall
+        while not done:
+            tick = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stall = max(stall, time.perf_counter() - tick - 0.001)
+
+    task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(preprocessor.aprepare(url) for url in urls))
+    elapsed = time.perf_counter() - start
+    done = True
+    await task
+    return elapsed, stall
+
+
+async def warm_up(preprocessor: ImagePreprocessor) -> float:
+    start = time.perf_counter()
+    await preprocessor.warm_up()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图像预处理基准")
+    parser.add_argument("photos", nargs="*", help="本地图片路径（默认使用合成照片）")
+    parser.add_argument("--uplink-kbps", type=float, default=1000, help="上行带宽（kbit/s），用于估算上传耗时")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.photos:
+        photos = [(path, open(path, "rb").read(), None) for path in args.photos]
+    else:
+        photos = [
+            (f"合成 {w}x{h} 方向{o}", synthetic_photo(w, h, o, i), o)
+            for i, (w, h, o) in enumerate(SYNTHETIC_PHOTOS)
+        ]
+        for _, data, orientation in photos:
+            check(data, orientation)
+        check_passthrough()
+        print(f"自检通过：输出 ≤ {IMAGE_TARGET_KB} KB，已按 EXIF 方向旋转，不含元数据；限制内的小图原样返回\n")
+
+    bytes_per_second = args.uplink_kbps * 1000 / 8
+    print(f"上行带宽 {args.uplink_kbps:.0f} kbit/s\n")
+    print(f"{'图片':<24}{'原始 data URL':>14}{'预处理后':>12}{'预处理':>10}{'上传(前)':>10}{'上传(后)':>10}{'端到端(后)':>12}")
+
+    before_total, after_total = [], []
+    for label, data, _ in photos:
+        url = to_data_url(data)
+        start = time.perf_counter()
+        prepared = prepare_image(data)
+        elapsed = time.perf_counter() - start
+        after_url = prepared.data_url
+        upload_before = len(url) / bytes_per_second
+        upload_after = len(after_url) / bytes_per_second
+        before_total.append(upload_before)
+        after_total.append(elapsed + upload_after)
+        print(
+            f"{label:<24}{len(url) / 1e6:>12.2f}MB{len(after_url) / 1e3:>10.0f}KB"
+            f"{elapsed * 1000:>8.0f}ms{upload_before:>9.1f}s{upload_after:>9.1f}s{elapsed + upload_after:>11.1f}s"
+        )
+
+    print(
+        f"\n端到端（不含模型推理）平均：{statistics.mean(before_total):.1f}s → {statistics.mean(after_total):.1f}s"
+    )
+
+    urls = [to_data_url(data) for _, data, _ in photos]
+    preprocessor = ImagePreprocessor(workers=args.workers)
+    cold = asyncio.run(warm_up(preprocessor))
+    warm, warm_stall = asyncio.run(run_pool(preprocessor, urls))
+    threads, threads_stall = asyncio.run(run_pool(ImagePreprocessor(workers=0), urls))
+    preprocessor.shutdown()
+    print(f"\n进程池（{args.workers} 进程）预热启动 {cold * 1000:.0f}ms（CPU 核数 {os.cpu_count()}）")
+    print(f"进程池：并发 {len(urls)} 张 {warm * 1000:.0f}ms，事件循环最大停顿 {warm_stall * 1000:.1f}ms")
+    print(f"线程池：并发 {len(urls)} 张 {threads * 1000:.0f}ms，事件循环最大停顿 {threads_stall * 1000:.1f}ms")
+    stats = preprocessor.stats()
+    print(f"字节节省：{stats['saved_ratio']:.1%}（{stats['bytes_in'] / 1e6:.1f}MB → {stats['bytes_out'] / 1e6:.2f}MB）")
+
+
+if __name__ == "__main__":
+    main()
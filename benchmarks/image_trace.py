@@ -0,0 +1,227 @@
+"""
+演示与自检：文生图请求的追踪
+
+在本地线程中启动一个模拟 ModelScope 的 HTTP 服务（/v1/chat/completions、/v1/images/generations、
+/v1/tasks/{task_id} 与图像下载），让一次文生图任务真实走完工作流：
+- 提示词评估第一次不通过 → 重写一次提示词
+- 图像评估第一次要求改进 → 重新生成一次图像
+- 每个图像任务轮询 POLLS_PER_TASK 次才完成
+
+任务结束后读取导出的 OTLP JSON 文件，打印时间线，并校验：各节点的执行次数、
+节点 span 的父子关系、token 用量与轮询次数；再以等价写法重复请求一次，校验直接命中本地
+图像存储、不调用任何上游模型；另外测量每个 span 的记录开销。
+全部通过时输出“自检通过”，Chrome trace 另存到临时目录。
+
+使用：
+    python benchmarks/image_trace.py
+"""
+
+import asyncio
+import json
+import os
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 模拟上游的耗时（秒）与每个图像任务完成前的轮询次数
+CHAT_DELAY = 0.05
+POLLS_PER_TASK = 3
+SPAN_EVENTS = 20000
+
+
+def tiny_png() -> bytes:
+    """1x1 像素的 PNG"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"\x00\xff\xff\xff")) + chunk(b"IEND", b"")
+
+
+class Upstream:
+    """模拟服务的调用计数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.prompt_evals = 0
+        self.image_evals = 0
+        self.tasks = 0
+        self.polls = {}
+
+
+upstream = Upstream()
+PNG = tiny_png()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, body: dict) -> None:
+        self._send(200, json.dumps(body).encode("utf-8"))
+
+    def do_GET(self):
+        if self.path.startswith("/images/"):
+            self._send(200, PNG, "image/png")
+            return
+        task_id = self.path.rsplit("/", 1)[-1]
+        with upstream.lock:
+            upstream.polls[task_id] = upstream.polls.get(task_id, 0) + 1
+            done = upstream.polls[task_id] >= POLLS_PER_TASK
+        if done:
+            self._json({"task_status": "SUCCEED", "output_images": [f"http://127.0.0.1:{PORT}/images/{task_id}.png"]})
+        else:
+            self._json({"task_status": "PENDING"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        if self.path.endswith("/images/generations"):
+            with upstream.lock:
+                upstream.tasks += 1
+                task_id = f"task-{upstream.tasks}"
+            self._json({"task_id": task_id})
+            return
+
+        time.sleep(CHAT_DELAY)
+        system = json.loads(body)["messages"][0]["content"]
+        with upstream.lock:
+            if "多模态" in system:
+                upstream.image_evals += 1
+                content = "Refine prompt to: magnesium ribbon, bright white flame, white ash" \
+                    if upstream.image_evals == 1 else "ok"
+            elif "审核员" in system:
+                upstream.prompt_evals += 1
+                content = "Please add the flame color." if upstream.prompt_evals == 1 else "ok"
+            else:
+                content = "magnesium ribbon burning with a dazzling white flame, realistic photo"
+        self._json({
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "stand-in",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": len(body) // 4 + len(content) // 4},
+        })
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server() -> int:
+    port = free_port()
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return port
+
+
+PORT = start_server()
+WORK_DIR = tempfile.mkdtemp(prefix="chem-trace-")
+os.environ.update({
+    "CHEM_MODELSCOPE_BASE_URL": f"http://127.0.0.1:{PORT}/v1",
+    "CHEM_MODELSCOPE_API_BASE": f"http://127.0.0.1:{PORT}/",
+    "CHEM_POLL_INITIAL_INTERVAL": "0.05",
+    "CHEM_POLL_JITTER": "0",
+    "CHEM_TRACE_DIR": os.path.join(WORK_DIR, "traces"),
+    "CHEM_IMAGE_STORE_DIR": os.path.join(WORK_DIR, "images"),
+    "CHEM_RESULT_CACHE_PATH": "",
+    "CHEM_RATE_LIMIT_RPS": "0",
+})
+
+from backend.services import image_jobs  # noqa: E402
+from backend.tracing import flatten_spans, format_timeline, load_trace, to_chrome_trace, tracer  # noqa: E402
+
+
+def span_overhead_us() -> tuple:
+    """返回 (追踪中每个 span 的开销, 不在追踪中时的开销)，单位微秒"""
+    start = time.perf_counter()
+    for _ in range(SPAN_EVENTS):
+        with tracer.span("bench"):
+            pass
+    idle = (time.perf_counter() - start) / SPAN_EVENTS * 1e6
+
+    # 只测量记录开销，不写入文件
+    exporter_export = tracer.exporter.export
+    tracer.exporter.export = lambda trace: "（未写入）"
+    try:
+        with tracer.trace("bench"):
+            start = time.perf_counter()
+            for _ in range(SPAN_EVENTS):
+                with tracer.span("bench"):
+                    pass
+            active = (time.perf_counter() - start) / SPAN_EVENTS * 1e6
+    finally:
+        tracer.exporter.export = exporter_export
+    return active, idle
+
+
+async def main() -> None:
+    job = await image_jobs.submit("镁条燃烧", "stand-in-key")
+    while not job.finished:
+        await asyncio.sleep(0.02)
+    assert job.status == "succeeded", job.error
+    assert job.trace_id, "任务未记录 trace_id"
+    assert job.api_key == "", "完成的任务不应保留 API 密钥"
+
+    spans = flatten_spans(load_trace(job.trace_id, tracer.exporter.directory))
+    print(format_timeline(spans))
+
+    by_id = {span["span_id"]: span for span in spans}
+    nodes = [span for span in spans if "langgraph.node" in span["attributes"]]
+    counts = {}
+    for span in nodes:
+        counts[span["name"]] = counts.get(span["name"], 0) + 1
+    expected = {"generate_prompt_node": 2, "eval_prompt_node": 2, "generate_image_node": 2, "eval_image_node": 2}
+    assert counts == expected, f"节点执行次数不符: {counts}"
+    assert spans[0]["name"] == "image_job" and spans[0]["parent_id"] is None
+    assert all(by_id[span["parent_id"]]["name"] == "reaction_image" for span in nodes), "节点 span 的父节点错误"
+    assert [span["attributes"]["langgraph.node.iteration"] for span in nodes if span["name"] == "generate_image_node"] == [1, 2]
+
+    chat_spans = [span for span in spans if span["name"] == "upstream.chat"]
+    assert len(chat_spans) == 6 and all(by_id[span["parent_id"]] in nodes for span in chat_spans)
+    assert all(span["attributes"].get("gen_ai.usage.input_tokens", 0) > 0 for span in chat_spans), "缺少 token 用量"
+    polls = [span["attributes"]["image.poll.attempts"] for span in spans if span["name"] == "image.poll"]
+    assert polls == [POLLS_PER_TASK, POLLS_PER_TASK], f"轮询次数不符: {polls}"
+
+    # 等价写法的重复请求：在任何模型调用之前命中本地存储
+    assert job.image_url.startswith("/api/images/"), job.image_url
+    calls = (upstream.prompt_evals, upstream.image_evals, upstream.tasks)
+    repeat = await image_jobs.submit(" 镁条燃烧 ", "stand-in-key")
+    while not repeat.finished:
+        await asyncio.sleep(0.02)
+    assert repeat.status == "succeeded" and repeat.image_url == job.image_url, (repeat.status, repeat.image_url)
+    assert (upstream.prompt_evals, upstream.image_evals, upstream.tasks) == calls, "重复请求不应调用上游"
+    repeat_spans = flatten_spans(load_trace(repeat.trace_id, tracer.exporter.directory))
+    assert not [span for span in repeat_spans if "langgraph.node" in span["attributes"]], "重复请求不应执行工作流节点"
+    assert any(span["attributes"].get("image.store_hit") for span in repeat_spans)
+    print(f"\n重复请求：命中本地图像存储，耗时 {repeat.finished_at - repeat.started_at:.3f}s，未调用上游")
+
+    chrome_path = os.path.join(WORK_DIR, "trace.chrome.json")
+    with open(chrome_path, "w", encoding="utf-8") as f:
+        json.dump(to_chrome_trace(spans), f, ensure_ascii=False)
+
+    active, idle = span_overhead_us()
+    print(f"\n每个 span 的开销：追踪中 {active:.1f}µs，不在追踪中 {idle:.2f}µs（本次请求共 {len(spans)} 个 span）")
+    print(f"追踪文件：{tracer.exporter.directory}；Chrome trace：{chrome_path}")
+    print("\n自检通过：节点次数、父子关系、token 用量与轮询次数均已记录，重复请求直接命中图像存储")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
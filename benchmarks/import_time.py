@@ -0,0 +1,118 @@
+"""
+基准：后端与 Gradio 入口的冷启动导入耗时（带预算检查）
+
+每个入口在全新的子进程中以 python -X importtime 导入，取 --repeat 次的中位数
+（首次运行生成 .pyc，不计入），并与 benchmarks/import_budget.json 中登记的预算对比：
+- budget_ms：导入耗时上限（毫秒）
+- forbid：导入时不允许加载的重量级依赖（应在首次使用对应功能时才导入）
+
+超出预算或加载了禁止的依赖时以非零状态退出，可在部署前或 CI 中运行。
+调整入口或预算时直接修改 import_budget.json。
+
+使用：
+    python benchmarks/import_time.py [--repeat 5] [--top 5] [entry ...]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_budget.json")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """解析 -X importtime 输出，返回 [(模块名, 自身耗时 us, 累计耗时 us)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        head, cumulative_us, name = line.split("|", 2)
+        self_us = head.split(":", 1)[1]
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def run_import(entry: str) -> List[Tuple[str, int, int]]:
+    """在全新进程中导入入口模块"""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {entry}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {entry} 失败:\n{result.stderr.splitlines()[-1]}")
+    return parse_importtime(result.stderr)
+
+
+def measure(entry: str, startup: set, repeat: int) -> Dict:
+    """多次导入取中位数，并统计各顶层包的自身耗时"""
+    run_import(entry)
+    totals = []
+    packages: Dict[str, List[int]] = defaultdict(list)
+    loaded = set()
+    for _ in range(repeat):
+        rows = [row for row in run_import(entry) if row[0] not in startup]
+        # 解释器启动之后的顶层导入之和即为入口的导入耗时
+        per_package: Dict[str, int] = defaultdict(int)
+        for name, self_us, _ in rows:
+            per_package[name.split(".")[0]] += self_us
+            loaded.add(name.split(".")[0])
+        totals.append(sum(per_package.values()))
+        for package, us in per_package.items():
+            packages[package].append(us)
+    return {
+        "ms": statistics.median(totals) / 1000,
+        "packages": {name: statistics.median(values) / 1000 for name, values in packages.items()},
+        "loaded": loaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导入耗时基准")
+    parser.add_argument("entries", nargs="*", help="要检查的入口（默认为预算文件中的全部入口）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="列出最耗时的顶层包数量")
+    args = parser.parse_args()
+
+    with open(BUDGET_PATH, encoding="utf-8") as f:
+        budgets = json.load(f)
+    entries = args.entries or list(budgets)
+    startup = {name for name, _, _ in run_import("sys")}
+
+    failures = []
+    print(f"Python {sys.version.split()[0]}，每个入口 {args.repeat} 个新进程取中位数\n")
+    print(f"{'入口':<20}{'导入耗时':>10}{'预算':>10}  结果")
+    for entry in entries:
+        budget = budgets.get(entry, {})
+        try:
+            result = measure(entry, startup, args.repeat)
+        except RuntimeError as e:
+            print(f"{entry:<20}{'-':>10}{'-':>10}  跳过（{str(e).splitlines()[-1]}）")
+            continue
+        limit = budget.get("budget_ms")
+        forbidden = sorted(set(budget.get("forbid", [])) & result["loaded"])
+        problems = []
+        if limit is not None and result["ms"] > limit:
+            problems.append(f"超出预算 {result['ms'] - limit:.0f}ms")
+        if forbidden:
+            problems.append(f"加载了 {', '.join(forbidden)}")
+        failures.extend(f"{entry}: {problem}" for problem in problems)
+        limit_text = f"{limit:.0f}ms" if limit is not None else "-"
+        print(f"{entry:<20}{result['ms']:>8.0f}ms{limit_text:>10}  {'；'.join(problems) or '通过'}")
+        heaviest = sorted(result["packages"].items(), key=lambda item: item[1], reverse=True)[:args.top]
+        print(" " * 4 + "，".join(f"{name} {ms:.0f}ms" for name, ms in heaviest))
+
+    if failures:
+        print("\n未通过：\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\n全部入口在预算内")
+
+
+if __name__ == "__main__":
+    main()
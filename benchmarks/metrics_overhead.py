@@ -0,0 +1,110 @@
+"""
+微基准：指标记录的单次开销
+
+测量热路径上每个事件的耗时（标签组合已预先创建）：
+- 计数器 inc()
+- 直方图 observe()
+- 阶段耗时 latency(name).observe()（滑动窗口 + 直方图）
+- 中间件记录一次请求（状态计数 + 耗时直方图 + 错误计数判断）
+另外测量单线程与多线程并发记录，校验未匹配的路径与方法只占一个标签组合，并导出一次 /metrics 文本。每个事件超过 --budget 纳秒时以非零状态退出。
+
+使用：
+    python benchmarks/metrics_overhead.py [--events 200000] [--budget 1000]
+"""
+
+import argparse
+import functools
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.metrics import MetricsMiddleware, counter, histogram, latency, render_metrics
+
+
+def per_event_ns(fn, events: int) -> float:
+    """重复调用 fn，返回每次调用的纳秒数（扣除空循环开销）"""
+    start = time.perf_counter_ns()
+    for _ in range(events):
+        pass
+    empty = time.perf_counter_ns() - start
+    start = time.perf_counter_ns()
+    for _ in range(events):
+        fn()
+    return (time.perf_counter_ns() - start - empty) / events
+
+
+def threaded_ns(fn, events: int, threads: int) -> float:
+    """多个线程同时记录，返回每个事件的平均纳秒数（墙钟时间 / 事件总数）"""
+    per_thread = events // threads
+
+    def work():
+        for _ in range(per_thread):
+            fn()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter_ns()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter_ns() - start) / (per_thread * threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指标记录开销基准")
+    parser.add_argument("--events", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--budget", type=float, default=1000, help="每个事件的开销上限（纳秒）")
+    args = parser.parse_args()
+
+    requests = counter("bench_requests_total", "基准计数器", ("route",)).labels("/api/reaction/explain")
+    seconds = histogram("bench_duration_seconds", "基准直方图", ("route",)).labels("/api/reaction/explain")
+    stage = latency("bench.stage")
+    middleware = MetricsMiddleware(app=None)
+    route = middleware._route_metrics("/api/reaction/explain", "POST")
+    route.record(200, 0.1)
+
+    # 任意方法与路径不产生新的标签组合
+    explain = type("Route", (), {"path": "/api/reaction/explain", "methods": {"POST"}})()
+    assert middleware._metrics_for({"route": explain, "method": "POST"}) is route
+    before = len(middleware._routes)
+    for i in range(100):
+        middleware._metrics_for({"route": explain, "method": f"M{i}"})
+        middleware._metrics_for({"method": f"M{i}", "path": f"/random/{i}"})
+    assert len(middleware._routes) == before, "未匹配的请求不应产生新的标签组合"
+
+    cases = [
+        ("计数器 inc()", requests.inc),
+        ("直方图 observe()", functools.partial(seconds.observe, 0.042)),
+        ("阶段耗时 latency().observe()", functools.partial(stage.observe, 0.042)),
+        ("中间件记录一次请求", functools.partial(route.record, 200, 0.042)),
+    ]
+
+    print(f"{args.events} 个事件，预算 {args.budget:.0f}ns/事件\n")
+    print(f"{'操作':<30}{'单线程':>10}{f'{args.threads} 线程并发':>14}")
+    failures = []
+    for name, fn in cases:
+        single = per_event_ns(fn, args.events)
+        concurrent = threaded_ns(fn, args.events, args.threads)
+        print(f"{name:<30}{single:>8.0f}ns{concurrent:>12.0f}ns")
+        if single > args.budget:
+            failures.append(name)
+
+    expected = 1 + args.events + (args.events // args.threads) * args.threads
+    assert route.statuses[200].value == expected, "并发记录丢失计数"
+
+    start = time.perf_counter()
+    text = render_metrics()
+    print(f"\n导出 /metrics：{len(text.splitlines())} 行，{(time.perf_counter() - start) * 1000:.2f}ms")
+
+    if failures:
+        print(f"\n超出预算：{', '.join(failures)}")
+        sys.exit(1)
+    print("\n自检通过：每个事件的开销在预算内，并发记录无计数丢失，标签组合有界")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+基准与自检：化学式/方程式解析吞吐量
+
+以一组中学教材常见方程式为种子，生成数千条不同写法的变体
+（= / → / -> / ⇌、Unicode 下标与上标、空格、反应物顺序、已写出的系数），统计：
+- 冷解析（清空解析缓存，逐条完整分词与解析）
+- 热解析（命中 lru_cache）
+- 缓存键规范化（result_cache.canonicalize）
+- 本地配平（stoichiometry.balance）
+同时校验：同一方程式的所有变体规范形式一致，配平结果原子/电荷守恒，
+配平结果的输出文本（Fe³⁺ + e⁻ → Fe²⁺）可以再次解析并得到相同结果，
+且大量不同化学式不会让驻留表超过解析缓存容量。
+
+使用：
+    python benchmarks/parser_throughput.py [--variants 60] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import chem_parser
+from backend.chem_parser import parse_equation, parse_term
+from backend.result_cache import canonicalize
+from backend.stoichiometry import balance
+
+# 教材常见方程式（未配平）
+SEED_EQUATIONS = [
+    "H2O = H2 + O2", "H2 + O2 = H2O", "Fe + O2 = Fe3O4", "Fe + O2 = Fe2O3", "Mg + O2 = MgO",
+    "C + O2 = CO2", "C + O2 = CO", "CO + O2 = CO2", "S + O2 = SO2", "P + O2 = P2O5",
+    "Al + O2 = Al2O3", "Cu + O2 = CuO", "CH4 + O2 = CO2 + H2O", "C2H5OH + O2 = CO2 + H2O",
+    "C3H8 + O2 = CO2 + H2O", "C6H12O6 + O2 = CO2 + H2O", "KClO3 = KCl + O2", "KMnO4 = K2MnO4 + MnO2 + O2",
+    "H2O2 = H2O + O2", "CaCO3 = CaO + CO2", "CaCO3 + HCl = CaCl2 + H2O + CO2", "Zn + H2SO4 = ZnSO4 + H2",
+    "Fe + HCl = FeCl2 + H2", "Al + HCl = AlCl3 + H2", "Fe + CuSO4 = FeSO4 + Cu", "Cu + AgNO3 = Cu(NO3)2 + Ag",
+    "NaOH + HCl = NaCl + H2O", "NaOH + H2SO4 = Na2SO4 + H2O", "Ca(OH)2 + CO2 = CaCO3 + H2O",
+    "NaOH + CO2 = Na2CO3 + H2O", "Na2CO3 + HCl = NaCl + H2O + CO2", "NaHCO3 = Na2CO3 + H2O + CO2",
+    "CuSO4 + NaOH = Cu(OH)2 + Na2SO4", "FeCl3 + NaOH = Fe(OH)3 + NaCl", "BaCl2 + H2SO4 = BaSO4 + HCl",
+    "AgNO3 + NaCl = AgCl + NaNO3", "Fe2O3 + CO = Fe + CO2", "Fe2O3 + HCl = FeCl3 + H2O", "CuO + H2 = Cu + H2O",
+    "CuO + C = Cu + CO2", "NH4Cl + Ca(OH)2 = CaCl2 + NH3 + H2O", "N2 + H2 = NH3", "NH3 + O2 = NO + H2O",
+    "NO + O2 = NO2", "NO2 + H2O = HNO3 + NO", "Cu + HNO3 = Cu(NO3)2 + NO + H2O", "Cu + H2SO4 = CuSO4 + SO2 + H2O",
+    "Na + H2O = NaOH + H2", "Na2O2 + H2O = NaOH + O2", "Na2O2 + CO2 = Na2CO3 + O2", "Cl2 + H2O = HCl + HClO",
+    "Cl2 + NaOH = NaCl + NaClO + H2O", "MnO2 + HCl = MnCl2 + Cl2 + H2O", "Al + NaOH + H2O = NaAlO2 + H2",
+    "Al(OH)3 + NaOH = NaAlO2 + H2O", "SiO2 + NaOH = Na2SiO3 + H2O", "FeS2 + O2 = Fe2O3 + SO2",
+    "CuSO4·5H2O = CuSO4 + H2O", "Ca3(PO4)2 + H2SO4 = CaSO4 + H3PO4", "(NH4)2SO4 + NaOH = Na2SO4 + NH3 + H2O",
+    "Fe^3+ + OH^- = Fe(OH)3", "Ba^2+ + SO4^2- = BaSO4", "H^+ + OH^- = H2O", "CO3^2- + H^+ = CO2 + H2O",
+    "MnO4^- + Fe^2+ + H^+ = Mn^2+ + Fe^3+ + H2O", "Cr2O7^2- + Fe^2+ + H^+ = Cr^3+ + Fe^3+ + H2O",
+    "Cu + Ag^+ = Cu^2+ + Ag", "Zn + Cu^2+ = Zn^2+ + Cu", "Cl2 + Br^- = Cl^- + Br2", "NH4^+ + OH^- = NH3 + H2O",
+    "Fe^3+ + e^- = Fe^2+", "Cu^2+ + e^- = Cu", "MnO4^- + H^+ + e^- = Mn^2+ + H2O", "Cl2 + e^- = Cl^-",
+    "K4[Fe(CN)6] + KMnO4 + H2SO4 = KHSO4 + Fe2(SO4)3 + MnSO4 + HNO3 + CO2 + H2O",
+]
+
+# 阴离子后紧跟 "->" 有歧义（SO42-->），这里的 ASCII 箭头两侧带空格
+ARROWS = [" = ", "=", " → ", "→", " -> ", " ==> ", "==>", " ⇌ ", " ⟶ "]
+SUBSCRIPTS = str.maketrans("0123456789", "₀₁₂₃₄₅₆₇₈₉")
+SUPERSCRIPTS = str.maketrans("0123456789+-", "⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻")
+
+
+def _unicode_term(term: str) -> str:
+    """Unicode 写法：H₂O、SO₄²⁻"""
+    body, _, charge = term.partition("^")
+    return body.translate(SUBSCRIPTS) + charge.translate(SUPERSCRIPTS)
+
+
+def _plain_term(term: str) -> str:
+    """键盘写法：去掉 ^（Fe3+、SO42-、NH4+）"""
+    return term.replace("^", "")
+
+
+def make_variant(seed: str, rng: random.Random) -> str:
+    """生成一条同一方程式的不同写法"""
+    left, right = seed.split(" = ")
+    sides = []
+    for side in (left, right):
+        terms = side.split(" + ")
+        rng.shuffle(terms)
+        style = rng.random()
+        if style < 0.3:
+            terms = [_unicode_term(t) for t in terms]
+        elif style < 0.8:
+            terms = [_plain_term(t) for t in terms]
+        if rng.random() < 0.2:
+            terms = [f"{rng.randint(2, 4)}{t}" if rng.random() < 0.5 else t for t in terms]
+        sides.append(rng.choice([" + ", "+", "  +  "]).join(terms))
+    return rng.choice(ARROWS).join(sides)
+
+
+def measure(label: str, func, items, repeat: int) -> float:
+    """返回每秒处理条数（取多次运行中的最佳值）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, time.perf_counter() - start)
+    rate = len(items) / best
+    print(f"{label:<28} {rate:>12,.0f} 条/秒   {best / len(items) * 1e6:8.2f} µs/条")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="化学式/方程式解析吞吐量基准")
+    parser.add_argument("--variants", type=int, default=60, help="每条种子方程式生成的写法数")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [(seed, make_variant(seed, rng)) for seed in SEED_EQUATIONS for _ in range(args.variants)]
+    variants = [variant for _, variant in corpus]
+
+    # 自检：同一方程式的所有写法规范形式一致，配平结果守恒
+    for seed, variant in corpus:
+        expected = parse_equation(seed).canonical()
+        assert canonicalize(variant) == expected, (variant, canonicalize(variant), expected)
+    for seed in SEED_EQUATIONS:
+        result = balance(seed)
+        assert result.equation.is_balanced(result.coefficients), seed
+        rendered = result.render()
+        assert balance(rendered).render() == rendered, (seed, rendered)
+    # 驻留表有上限：超出后淘汰最久未用的物质，再次解析得到的物质与之前的相等
+    water = parse_term("H2O")[1]
+    for i in range(chem_parser.PARSE_CACHE_SIZE + 100):
+        parse_term(f"C{i + 1}H{2 * i + 4}")
+    assert len(chem_parser._INTERNED) <= chem_parser.PARSE_CACHE_SIZE, len(chem_parser._INTERNED)
+    parse_term.cache_clear()
+    assert parse_term("H2O")[1] == water
+    print(f"自检通过：{len(SEED_EQUATIONS)} 条方程式，{len(corpus)} 种写法规范形式一致，配平守恒，输出可再次解析，驻留表有界")
+    print(f"语料：{len(variants)} 条（不同写法 {len(set(variants))} 条）\n")
+
+    def cold_parse(text: str) -> None:
+        parse_equation.cache_clear()
+        parse_term.cache_clear()
+        parse_equation(text)
+
+    measure("冷解析（无缓存）", cold_parse, variants, args.repeat)
+    parse_equation.cache_clear()
+    for text in variants:
+        parse_equation(text)
+    measure("热解析（lru_cache 命中）", parse_equation, variants, args.repeat)
+    measure("缓存键规范化", canonicalize, variants, args.repeat)
+    measure("本地配平", balance, variants, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
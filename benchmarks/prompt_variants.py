@@ -0,0 +1,183 @@
+"""
+基准：完整版 vs 精简版系统提示词
+
+默认（离线）：
+- 各提示词完整版 / 精简版的 token 数与节省比例（tiktoken cl100k_base，不可用时按字符估算）
+- 下标后处理自检：把完整版提示词要求的规范输出（H₂O、Fe³⁺ 等）还原为普通数字，
+  经本地后处理后应与原文完全一致
+
+--live（需要环境变量 modelscope_API_KEY，会真实调用模型）：
+对一组反应 / 方程式分别用两个版本调用讲解与配平，统计上游返回的输入 token 数、
+延迟中位数、输出长度，以及输出质量：
+- 讲解：五个小节标题是否齐全
+- 配平：小节标题是否齐全，【配平结果】是否与本地精确配平一致
+
+使用：
+    python benchmarks/prompt_variants.py
+    python benchmarks/prompt_variants.py --live [--rounds 2]
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend import equation_balancer, material_recognizer, reaction_explainer, reaction_image_generator  # noqa: F401
+from backend.client_registry import registry
+from backend.prompts import VARIANTS, load_encoder, prompts, subscript_formulas, tokenizer_name
+from backend.stoichiometry import StoichiometryError, balance
+
+# 完整版提示词要求模型输出的规范格式（取自各提示词示例）
+FORMATTED_SAMPLE = """
+【原始输入】H₂O → O₂ + H₂
+【配平结果】2H₂O → 2H₂ + O₂
+【配平步骤】
+1. 右边 O₂ 含2个氧原子，左边 H₂O 只有1个氧，左边配2；
+2. 左边现含4个氢原子，右边 H₂ 配2使氢守恒。
+【原始输入】Fe + O₂ → Fe₂O₃
+【配平结果】4Fe + 3O₂ → 2Fe₂O₃
+【教学提示】铁在空气中缓慢氧化生成铁锈（主要成分为Fe₂O₃），燃烧则生成Fe₃O₄，注意区分条件。
+【化学方程式】Fe(s) + CuSO₄(aq) → FeSO₄(aq) + Cu(s)
+【识别结果】五水合硫酸铜（CuSO₄·5H₂O）
+溶液中的 Fe³⁺ 与 OH⁻ 生成 Fe(OH)₃ 沉淀，SO₄²⁻ 与 Ba²⁺ 生成 BaSO₄，NH₄⁺ 遇碱放出 NH₃。
+Na₂CO₃ + 2HCl = 2NaCl + H₂O + CO₂↑，Ca(OH)₂ 溶液变浑浊。第2步：检查 ISO9001 与 Step 2 不受影响。
+"""
+
+# 能被解析但不是化学式的文本，后处理后应保持不变
+NOT_FORMULAS = ["V2 版本", "S3/C4", "Y2K", "B2B", "K2 区域", "A4 纸", "MP3", "Co2"]
+
+_PLAIN = str.maketrans("₀₁₂₃₄₅₆₇₈₉⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻", "01234567890123456789+-")
+
+EXPLAIN_CASES = ["铁钉放入硫酸铜溶液", "镁在空气中燃烧", "NaOH + HCl", "实验室用高锰酸钾制氧气"]
+BALANCE_CASES = ["H2O = O2 + H2", "Fe + O2 = Fe3O4", "CH4 + O2 = CO2 + H2O", "Cu + HNO3 = Cu(NO3)2 + NO + H2O"]
+
+EXPLAIN_SECTIONS = ["【反应名称】", "【反应类型】", "【化学方程式】", "【反应原理】", "【教学提示】"]
+BALANCE_SECTIONS = ["【原始输入】", "【配平结果】", "【配平步骤】", "【教学提示】"]
+
+
+def token_table() -> None:
+    # 服务中由启动预热加载编码，这里直接加载
+    load_encoder()
+    stats = prompts.stats()
+    print(f"token 统计（{tokenizer_name()}）\n")
+    print(f"{'提示词':<20}{'完整版':>8}{'精简版':>8}{'节省':>8}")
+    total_full = total_compact = 0
+    for name, info in stats.items():
+        if name == "tokenizer":
+            continue
+        full, compact = info["tokens"]["full"], info["tokens"].get("compact", info["tokens"]["full"])
+        total_full += full
+        total_compact += compact
+        print(f"{name:<20}{full:>8}{compact:>8}{1 - compact / full:>8.0%}")
+    print(f"{'合计':<20}{total_full:>8}{total_compact:>8}{1 - total_compact / total_full:>8.0%}")
+
+
+def self_check() -> None:
+    plain = FORMATTED_SAMPLE.translate(_PLAIN)
+    restored = subscript_formulas(plain)
+    if restored != FORMATTED_SAMPLE:
+        for expected, got in zip(FORMATTED_SAMPLE.splitlines(), restored.splitlines()):
+            if expected != got:
+                print(f"  期望: {expected}\n  实际: {got}")
+        raise SystemExit("下标后处理自检失败")
+    # 已是规范格式的文本保持不变
+    assert subscript_formulas(FORMATTED_SAMPLE) == FORMATTED_SAMPLE
+    # 版本号、编号与缩写不是化学式
+    for text in NOT_FORMULAS:
+        assert subscript_formulas(text) == text, (text, subscript_formulas(text))
+    start = time.perf_counter()
+    for _ in range(1000):
+        subscript_formulas(plain)
+    cost = (time.perf_counter() - start) / 1000
+    print(f"\n下标后处理自检通过（{len(plain)} 字符，每次 {cost * 1e6:.0f}µs）")
+
+
+# ===================== 真实调用 =====================
+
+def _normalize_equation(text: str) -> str:
+    text = re.sub(r"\((?:s|l|g|aq)\)|[↑↓\s]", "", text)
+    return text.replace("=", "→").replace("->", "→")
+
+
+def _balance_ok(equation: str, output: str) -> bool:
+    try:
+        expected = balance(equation).render()
+    except StoichiometryError:
+        return True
+    match = re.search(r"【配平结果】(.+)", output)
+    return bool(match) and _normalize_equation(match.group(1)) == _normalize_equation(expected)
+
+
+async def _call(name: str, variant: str, module, agent_input: dict, api_key: str):
+    agent = registry.get_agent(
+        api_key=api_key,
+        feature=f"{name}-{variant}",
+        system_prompt=prompts.get(name, variant).text,
+        temperature=module.TEMPERATURE,
+    )
+    start = time.perf_counter()
+    response = await agent.ainvoke(agent_input)
+    elapsed = time.perf_counter() - start
+    message = response["messages"][-1]
+    usage = getattr(message, "usage_metadata", None) or {}
+    return prompts.postprocess(name, message.content), elapsed, usage.get("input_tokens")
+
+
+async def live(rounds: int, api_key: str) -> None:
+    print(f"\n真实调用：每个版本 {rounds} 轮\n")
+    print(f"{'功能':<10}{'版本':<10}{'输入token':>10}{'延迟中位数':>12}{'输出字数':>10}{'质量':>10}")
+    for name, module, cases in (
+        ("explain", reaction_explainer, EXPLAIN_CASES),
+        ("balance", equation_balancer, BALANCE_CASES),
+    ):
+        for variant in VARIANTS:
+            latencies, lengths, input_tokens, passed, total = [], [], [], 0, 0
+            for _ in range(rounds):
+                for case in cases:
+                    if name == "explain":
+                        agent_input = module._build_input(case)
+                    else:
+                        _, check = module._local_check(case)
+                        agent_input = module._build_input(case, check)
+                    output, elapsed, tokens = await _call(name, variant, module, agent_input, api_key)
+                    latencies.append(elapsed)
+                    lengths.append(len(output))
+                    if tokens:
+                        input_tokens.append(tokens)
+                    sections = EXPLAIN_SECTIONS if name == "explain" else BALANCE_SECTIONS
+                    ok = all(s in output for s in sections)
+                    if name == "balance":
+                        ok = ok and _balance_ok(case, output)
+                    passed += ok
+                    total += 1
+            tokens_text = f"{statistics.mean(input_tokens):.0f}" if input_tokens else "-"
+            print(
+                f"{name:<10}{variant:<10}{tokens_text:>10}{statistics.median(latencies):>11.2f}s"
+                f"{statistics.mean(lengths):>10.0f}{f'{passed}/{total}':>10}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="提示词版本基准")
+    parser.add_argument("--live", action="store_true", help="真实调用模型比较延迟与输出质量")
+    parser.add_argument("--rounds", type=int, default=1)
+    args = parser.parse_args()
+
+    token_table()
+    self_check()
+    if args.live:
+        from dotenv import load_dotenv
+        load_dotenv()
+        api_key = os.getenv("modelscope_API_KEY")
+        if not api_key:
+            raise SystemExit("--live 需要环境变量 modelscope_API_KEY")
+        asyncio.run(live(args.rounds, api_key))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+基准：启动预热对首个请求延迟的影响
+
+在本地线程中启动一个模拟 ModelScope 的 HTTP 服务（OpenAI 兼容，保持长连接），
+每个新连接额外等待 --handshake 秒，模拟公网 DNS 解析与 TLS 握手。
+每种方式在全新的子进程中启动应用（TestClient 执行 lifespan），测量：
+- 导入应用耗时
+- 预热耗时（等待 GET /api/ready 返回 200）
+- 首个讲解请求耗时与第二个请求耗时（稳定状态参考）
+
+方式：
+- 不预热（CHEM_WARMUP=0）
+- 预热（占位密钥编译智能体，与按教师密钥调用的部署方式一致）
+- 预热 + CHEM_WARMUP_API_KEY（共享密钥部署，预建该密钥的智能体）
+
+使用：
+    python benchmarks/startup.py [--repeat 3] [--handshake 0.2]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = "bench-key"
+
+MODES = (
+    ("不预热", {"CHEM_WARMUP": "0"}),
+    ("预热", {"CHEM_WARMUP": "1"}),
+    ("预热 + 共享密钥", {"CHEM_WARMUP": "1", "CHEM_WARMUP_API_KEY": API_KEY}),
+)
+
+
+def make_handler(handshake: float, latency: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def setup(self):
+            # 每个连接只握手一次
+            time.sleep(handshake)
+            super().setup()
+
+        def _send(self, status: int, body: dict) -> None:
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            self._send(200, {"object": "list", "data": []})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            self._send(200, {
+                "id": "chatcmpl-1",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": "stand-in",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "【反应名称】铁与硫酸铜溶液反应"},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            })
+
+    return Handler
+
+
+def start_server(handshake: float, latency: float) -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(handshake, latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return port
+
+
+def child() -> None:
+    """在全新进程中启动应用并测量首个请求"""
+    start = time.perf_counter()
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    imported = time.perf_counter() - start
+
+    result = {"import": imported}
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        while client.get("/api/ready").status_code != 200:
+            time.sleep(0.01)
+        result["warmup"] = time.perf_counter() - start
+
+        for name, reaction in (("first", "铁与硫酸铜反应"), ("second", "镁在空气中燃烧")):
+            start = time.perf_counter()
+            response = client.post("/api/reaction/explain", json={"reaction": reaction, "api_key": API_KEY})
+            result[name] = time.perf_counter() - start
+            assert response.status_code == 200, response.text
+    print(json.dumps(result))
+
+
+def run_mode(env_overrides: dict, port: int) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "CHEM_MODELSCOPE_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "CHEM_MODELSCOPE_API_BASE": f"http://127.0.0.1:{port}/",
+        "CHEM_RESULT_CACHE_PATH": "",
+        "CHEM_RATE_LIMIT_RPS": "0",
+        "CHEM_WARMUP_API_KEY": "",
+        "modelscope_API_KEY": "",
+        "PYTHONPATH": ROOT,
+    })
+    env.update(env_overrides)
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        env=env, cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动预热基准")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--handshake", type=float, default=0.2, help="模拟每个新连接的握手耗时（秒）")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟模型响应耗时（秒）")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    port = start_server(args.handshake, args.latency)
+    print(
+        f"模拟上游 127.0.0.1:{port}，新连接握手 {args.handshake * 1000:.0f}ms，"
+        f"模型响应 {args.latency * 1000:.0f}ms，每种方式 {args.repeat} 个新进程取中位数\n"
+    )
+    print(f"{'方式':<14}{'导入应用':>10}{'预热':>10}{'首个请求':>10}{'第二个请求':>10}")
+    results = {}
+    for name, env in MODES:
+        runs = [run_mode(env, port) for _ in range(args.repeat)]
+        results[name] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        r = results[name]
+        print(
+            f"{name:<14}{r['import'] * 1000:>8.0f}ms{r['warmup'] * 1000:>8.0f}ms"
+            f"{r['first'] * 1000:>8.0f}ms{r['second'] * 1000:>8.0f}ms"
+        )
+
+    cold, warm = results["不预热"]["first"], results["预热"]["first"]
+    print(f"\n预热后首个请求 {cold * 1000:.0f}ms → {warm * 1000:.0f}ms（{1 - warm / cold:.0%}）")
+
+
+if __name__ == "__main__":
+    main()
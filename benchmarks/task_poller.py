@@ -0,0 +1,195 @@
+"""
+基准与自检：图像任务轮询器 vs 旧的固定 10 秒轮询
+
+在本地启动一个模拟 ModelScope 任务接口的假服务（/v1/tasks/{task_id}），
+并发提交一批完成时间随机的任务，统计：
+- 任务完成到调用方被唤醒的延迟（自适应轮询 vs 固定 10 秒间隔）
+- 总轮询请求数
+同时校验 FAILED 状态、不可重试错误、格式异常的响应和调用方取消的处理。
+
+使用：
+    python benchmarks/task_poller.py [--tasks 50] [--scale 0.1]
+
+--scale 按比例缩短所有时间（任务耗时与轮询间隔），便于快速运行。
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from backend.task_poller import ImageTaskPoller, TaskPollError
+
+# task_id -> (完成时刻, 终止状态)
+FAKE_TASKS = {}
+
+
+async def fake_task_endpoint(request):
+    task_id = request.path_params["task_id"]
+    if request.headers.get("Authorization") == "Bearer invalid":
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    if task_id.startswith("check-malformed"):
+        return JSONResponse(None if task_id.endswith("null") else ["RUNNING"])
+    if task_id not in FAKE_TASKS:
+        return JSONResponse({"error": "not found"}, status_code=404)
+    ready_at, final_status = FAKE_TASKS[task_id]
+    if time.monotonic() < ready_at:
+        return JSONResponse({"task_status": "RUNNING"})
+    body = {"task_status": final_status}
+    if final_status == "SUCCEED":
+        body["output_images"] = [f"https://example.com/{task_id}.png"]
+    return JSONResponse(body)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_fake_server():
+    port = free_port()
+    app = Starlette(routes=[Route("/v1/tasks/{task_id}", fake_task_endpoint)])
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server, serve_task, f"http://127.0.0.1:{port}/"
+
+
+async def run_checks(poller: ImageTaskPoller, scale: float) -> None:
+    """行为自检：FAILED 唤醒、401 立即报错、取消后停止跟踪、超时"""
+    FAKE_TASKS["check-failed"] = (time.monotonic() + 2 * scale, "FAILED")
+    outcome = await poller.wait("check-failed", "key")
+    assert outcome.status == "FAILED", outcome
+
+    FAKE_TASKS["check-auth"] = (time.monotonic(), "SUCCEED")
+    try:
+        await poller.wait("check-auth", "invalid")
+        raise AssertionError("401 应当抛出 TaskPollError")
+    except TaskPollError:
+        pass
+
+    # 格式异常的响应只让对应任务失败，同时等待的其他任务照常完成
+    FAKE_TASKS["check-neighbour"] = (time.monotonic() + 2 * scale, "SUCCEED")
+    results = await asyncio.gather(
+        poller.wait("check-malformed-list", "key"),
+        poller.wait("check-malformed-null", "key"),
+        poller.wait("check-neighbour", "key"),
+        return_exceptions=True,
+    )
+    assert isinstance(results[0], TaskPollError) and isinstance(results[1], TaskPollError), results
+    assert results[2].status == "SUCCEED", results
+
+    FAKE_TASKS["check-cancel"] = (time.monotonic() + 100, "SUCCEED")
+    waiter = asyncio.create_task(poller.wait("check-cancel", "key"))
+    await asyncio.sleep(scale)
+    waiter.cancel()
+    try:
+        await waiter
+    except asyncio.CancelledError:
+        pass
+    assert poller.stats()["active_tasks"] == 0, poller.stats()
+
+    FAKE_TASKS["check-timeout"] = (time.monotonic() + 100, "SUCCEED")
+    try:
+        await poller.wait("check-timeout", "key", timeout=3 * scale)
+        raise AssertionError("应当超时")
+    except asyncio.TimeoutError:
+        pass
+    print("自检通过：FAILED 唤醒 / 401 报错 / 格式异常只影响单个任务 / 取消停止跟踪 / 超时")
+
+
+async def run_cross_loop_check(base_url: str, scale: float) -> None:
+    """主循环与后台循环（同步调用方）同时等待任务：各自完成，轮询协程随后退出"""
+    poller = ImageTaskPoller(base_url=base_url, initial_interval=scale, max_interval=5.0 * scale)
+    now = time.monotonic()
+    FAKE_TASKS["loop-main"] = (now + 2 * scale, "SUCCEED")
+    FAKE_TASKS["loop-background"] = (now + 3 * scale, "SUCCEED")
+
+    background = asyncio.new_event_loop()
+    thread = threading.Thread(target=background.run_forever, daemon=True)
+    thread.start()
+    try:
+        other = asyncio.wrap_future(
+            asyncio.run_coroutine_threadsafe(poller.wait("loop-background", "key"), background)
+        )
+        outcomes = await asyncio.gather(poller.wait("loop-main", "key"), other)
+        assert [o.status for o in outcomes] == ["SUCCEED", "SUCCEED"], outcomes
+        await asyncio.sleep(scale)
+        assert poller.stats()["active_tasks"] == 0, poller.stats()
+        # 任务取走后轮询协程退出，而不是空转
+        assert all(state.runner.done() for state in poller._states.values())
+    finally:
+        background.call_soon_threadsafe(background.stop)
+        thread.join()
+    print("自检通过：两个事件循环同时等待任务互不影响，空闲后轮询协程退出")
+
+
+async def main_async(args) -> None:
+    server, serve_task, base_url = await start_fake_server()
+    scale = args.scale
+    async with httpx.AsyncClient() as client:
+        poller = ImageTaskPoller(
+            base_url=base_url,
+            client=client,
+            initial_interval=1.0 * scale,
+            max_interval=5.0 * scale,
+        )
+        await run_checks(poller, scale)
+        await run_cross_loop_check(base_url, scale)
+
+        rng = random.Random(args.seed)
+        durations = [rng.uniform(5, 60) * scale for _ in range(args.tasks)]
+        start = time.monotonic()
+        for i, d in enumerate(durations):
+            FAKE_TASKS[f"task-{i}"] = (start + d, "SUCCEED")
+
+        polls_before = poller.polls
+
+        async def waiter(i: int) -> float:
+            await poller.wait(f"task-{i}", "key")
+            return time.monotonic() - FAKE_TASKS[f"task-{i}"][0]
+
+        delays = await asyncio.gather(*(waiter(i) for i in range(args.tasks)))
+        polls = poller.polls - polls_before
+
+    server.should_exit = True
+    await serve_task
+
+    # 旧实现：立即查询一次，之后每 10 秒查询一次
+    fixed = 10.0 * scale
+    baseline_delays = [math.ceil(d / fixed) * fixed - d for d in durations]
+    baseline_polls = sum(math.ceil(d / fixed) + 1 for d in durations)
+
+    print(f"任务数: {args.tasks}（耗时 5–60 秒，时间缩放 {scale}）")
+    print(f"自适应轮询 唤醒延迟 均值 {statistics.mean(delays) / scale:6.2f}s  "
+          f"最大 {max(delays) / scale:6.2f}s  轮询请求 {polls}")
+    print(f"固定10秒   唤醒延迟 均值 {statistics.mean(baseline_delays) / scale:6.2f}s  "
+          f"最大 {max(baseline_delays) / scale:6.2f}s  轮询请求 {baseline_polls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图像任务轮询器基准")
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--scale", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
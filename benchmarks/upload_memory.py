@@ -0,0 +1,164 @@
+"""
+基准：物质识别上传方式的服务端内存占用
+
+在子进程中启动后端（视觉模型替换为立即返回的假实现，预处理在线程池中执行），
+分别用两种方式上传同一张手机照片：
+- JSON：{"image_url": "data:image/jpeg;base64,..."}（旧方式）
+- multipart：POST /api/material/recognize/upload（流式写入临时文件）
+统计每个请求的 Python 堆分配峰值（tracemalloc）与服务进程的峰值 RSS（VmHWM）增量。
+每种方式使用独立的服务进程，互不影响峰值统计。
+
+使用：
+    python benchmarks/upload_memory.py [--mb 8] [--requests 5]
+"""
+
+import argparse
+import base64
+import io
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+
+def serve(port: int) -> None:
+    """子进程：启动带内存统计中间件的后端"""
+    os.environ["CHEM_IMAGE_PREPROCESS_WORKERS"] = "0"
+    os.environ["CHEM_RESULT_CACHE_PATH"] = ""
+    import tracemalloc
+
+    import uvicorn
+
+    from backend import services
+    from backend.main import app
+
+    async def fake_recognize(image_url: str, api_key: str) -> str:
+        return f"识别完成（{len(image_url)} 字符）"
+
+    services.arecognize_material = fake_recognize
+    # 每次都走完整路径，不命中识别缓存
+    services.recognition_cache.max_size = 0
+
+    tracemalloc.start()
+
+    @app.middleware("http")
+    async def peak_memory(request, call_next):
+        tracemalloc.reset_peak()
+        response = await call_next(request)
+        response.headers["X-Peak-Bytes"] = str(tracemalloc.get_traced_memory()[1])
+        return response
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def vm_hwm(pid: int) -> int:
+    """进程峰值 RSS（字节）"""
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_photo(mb: float) -> bytes:
+    """生成指定大小、可被解码的 JPEG"""
+    import numpy as np
+    from PIL import Image
+
+    side = 1000
+    while True:
+        rng = np.random.default_rng(side)
+        image = Image.fromarray((rng.random((side * 3 // 4, side, 3)) * 255).astype("uint8"))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=90)
+        if buffer.tell() >= mb * 1024 * 1024:
+            return buffer.getvalue()
+        side = int(side * 1.25)
+
+
+def run_mode(mode: str, photo_path: str, requests: int) -> dict:
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, __file__, "--serve", str(port)], cwd=ROOT)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        with httpx.Client(base_url=base, timeout=120) as client:
+            for _ in range(100):
+                try:
+                    client.get("/api/health")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+            baseline = vm_hwm(proc.pid)
+
+            peaks, latencies = [], []
+            for _ in range(requests):
+                start = time.perf_counter()
+                if mode == "json":
+                    with open(photo_path, "rb") as f:
+                        image_url = "data:image/jpeg;base64," + base64.b64encode(f.read()).decode("ascii")
+                    response = client.post(
+                        "/api/material/recognize", json={"image_url": image_url, "api_key": "bench"}
+                    )
+                else:
+                    with open(photo_path, "rb") as f:
+                        response = client.post(
+                            "/api/material/recognize/upload",
+                            files={"image": ("photo.jpg", f, "image/jpeg")},
+                            data={"api_key": "bench"},
+                        )
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+                peaks.append(int(response.headers["X-Peak-Bytes"]))
+            return {
+                "peak": statistics.median(peaks),
+                "rss": vm_hwm(proc.pid) - baseline,
+                "latency": statistics.median(latencies),
+            }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="物质识别上传内存基准")
+    parser.add_argument("--mb", type=float, default=8, help="测试照片大小（MB）")
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    photo = make_photo(args.mb)
+    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
+        f.write(photo)
+    try:
+        print(f"照片 {len(photo) / 1e6:.1f}MB，每种方式 {args.requests} 次请求\n")
+        print(f"{'方式':<12}{'堆分配峰值/请求':>16}{'峰值 RSS 增量':>16}{'延迟中位数':>12}")
+        for mode in ("json", "multipart"):
+            result = run_mode(mode, f.name, args.requests)
+            print(
+                f"{mode:<12}{result['peak'] / 1e6:>14.1f}MB{result['rss'] / 1e6:>14.1f}MB"
+                f"{result['latency'] * 1000:>10.0f}ms"
+            )
+    finally:
+        os.remove(f.name)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,17 @@ const APIService = {
      * 化学反应智能讲解
      * @param {string} reaction - 化学反应描述
      * @param {string} apiKey - API Key
+     * @param {Function} [onText] - 流式回调，参数为已生成的全部文本
      * @returns {Promise<string>} 反应讲解
      */
-    async explainReaction(reaction, apiKey) {
+    async explainReaction(reaction, apiKey, onText) {
+        if (onText) {
+            return this._streamPythonAPI(
+                CONFIG.PYTHON_BACKEND.ENDPOINTS.REACTION_EXPLAIN_STREAM,
+                { reaction: reaction, api_key: apiKey },
+                onText
+            );
+        }
         return this._explainReactionPython(reaction, apiKey);
     },
     
@@ -18,9 +26,17 @@ const APIService = {
      * 配平化学方程式
      * @param {string} equation - 未配平的方程式
      * @param {string} apiKey - API Key
+     * @param {Function} [onText] - 流式回调，参数为已生成的全部文本
      * @returns {Promise<string>} 配平结果
      */
-    async balanceEquation(equation, apiKey) {
+    async balanceEquation(equation, apiKey, onText) {
+        if (onText) {
+            return this._streamPythonAPI(
+                CONFIG.PYTHON_BACKEND.ENDPOINTS.EQUATION_BALANCE_STREAM,
+                { equation: equation, api_key: apiKey },
+                onText
+            );
+        }
         return this._balanceEquationPython(equation, apiKey);
     },
     
@@ -36,12 +52,15 @@ const APIService = {
     
     /**
      * 识别实验物质
-     * @param {string} imageUrl - 图片URL地址
+     * @param {File|string} image - 图片文件（multipart 上传）或图片URL地址
      * @param {string} apiKey - API Key
      * @returns {Promise<string>} 物质识别结果
      */
-    async recognizeMaterial(imageUrl, apiKey) {
-        return this._recognizeMaterialPython(imageUrl, apiKey);
+    async recognizeMaterial(image, apiKey) {
+        if (image instanceof Blob) {
+            return this._uploadMaterialPython(image, apiKey);
+        }
+        return this._recognizeMaterialPython(image, apiKey);
     },
     
     // ==================== Python 后端实现 ====================
@@ -67,14 +86,33 @@ const APIService = {
     },
     
     async _generateReactionImagePython(prompt, apiKey) {
-        const result = await this._fetchPythonAPI(
+        // 提交文生图任务，立即返回任务ID
+        const submitted = JSON.parse(await this._fetchPythonAPI(
             CONFIG.PYTHON_BACKEND.ENDPOINTS.REACTION_IMAGE,
             {
                 prompt: prompt,
                 api_key: apiKey
             }
-        );
-        return result;
+        ));
+        
+        // 轮询任务状态直至完成
+        const deadline = Date.now() + CONFIG.TIMEOUTS.IMAGE_JOB;
+        while (Date.now() < deadline) {
+            await new Promise(resolve => setTimeout(resolve, CONFIG.TIMEOUTS.IMAGE_JOB_POLL));
+            
+            const job = JSON.parse(await this._getPythonAPI(
+                CONFIG.PYTHON_BACKEND.ENDPOINTS.REACTION_IMAGE_JOB + submitted.job_id
+            ));
+            
+            if (job.status === 'succeeded') {
+                // 本地存储的图像为后端相对路径（/api/images/...）
+                return new URL(job.image_url, CONFIG.PYTHON_BACKEND.BASE_URL).href;
+            }
+            if (job.status === 'failed') {
+                throw new Error(job.error || '图像生成失败');
+            }
+        }
+        throw new Error('图像生成超时');
     },
     
     async _recognizeMaterialPython(imageUrl, apiKey) {
@@ -87,17 +125,98 @@ const APIService = {
         );
     },
     
+    async _uploadMaterialPython(file, apiKey) {
+        // 直接上传文件，不再转换为 base64 Data URL 内联到 JSON
+        const form = new FormData();
+        form.append('image', file);
+        form.append('api_key', apiKey);
+        return this._requestPythonAPI(
+            CONFIG.PYTHON_BACKEND.ENDPOINTS.MATERIAL_RECOGNIZE_UPLOAD,
+            {
+                method: 'POST',
+                body: form
+            }
+        );
+    },
+    
     async _fetchPythonAPI(endpoint, data) {
+        return this._requestPythonAPI(endpoint, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(data)
+        });
+    },
+    
+    async _streamPythonAPI(endpoint, data, onText) {
+        // 读取 Server-Sent Events 流，逐段拼接文本
+        const response = await fetch(
+            CONFIG.PYTHON_BACKEND.BASE_URL + endpoint,
+            {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(data)
+            }
+        );
+        
+        if (!response.ok) {
+            throw new Error(`Python 后端请求失败: HTTP ${response.status}: ${response.statusText}`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder('utf-8');
+        let buffer = '';
+        let text = '';
+        
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) {
+                break;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            
+            for (const rawEvent of events) {
+                let eventType = 'message';
+                let payload = '';
+                for (const line of rawEvent.split('\n')) {
+                    if (line.startsWith('event: ')) {
+                        eventType = line.slice(7);
+                    } else if (line.startsWith('data: ')) {
+                        payload += line.slice(6);
+                    }
+                }
+                if (!payload) {
+                    continue;
+                }
+                const parsed = JSON.parse(payload);
+                if (eventType === 'error') {
+                    throw new Error(`Python 后端请求失败: ${parsed.error}`);
+                }
+                if (eventType === 'message' && parsed.token) {
+                    text += parsed.token;
+                    onText(text);
+                }
+            }
+        }
+        
+        return text;
+    },
+    
+    async _getPythonAPI(endpoint) {
+        return this._requestPythonAPI(endpoint, { method: 'GET' });
+    },
+    
+    async _requestPythonAPI(endpoint, options) {
         try {
             const response = await fetch(
                 CONFIG.PYTHON_BACKEND.BASE_URL + endpoint,
-                {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify(data)
-                }
+                options
             );
             
             if (!response.ok) {
@@ -182,7 +182,11 @@ const App = {
             UIService.showReactionExplainLoading();
             UIService.clearMessages();
             
-            const result = await APIService.explainReaction(reaction, this.apiKey);
+            const result = await APIService.explainReaction(
+                reaction,
+                this.apiKey,
+                text => UIService.setReactionExplainResult(text)
+            );
             UIService.setReactionExplainResult(result);
             UIService.showSuccess('反应讲解生成成功！');
         } catch (error) {
@@ -206,7 +210,11 @@ const App = {
             UIService.showEquationBalanceLoading();
             UIService.clearMessages();
             
-            const result = await APIService.balanceEquation(equation, this.apiKey);
+            const result = await APIService.balanceEquation(
+                equation,
+                this.apiKey,
+                text => UIService.setEquationBalanceResult(text)
+            );
             UIService.setEquationBalanceResult(result);
             UIService.showSuccess('方程式配平成功！');
         } catch (error) {
@@ -259,11 +267,8 @@ const App = {
             UIService.showMaterialRecognitionLoading();
             UIService.clearMessages();
             
-            // 转换为Data URL
-            const imageUrl = await this.readFileAsDataURL(file);
-            
-            // 调用识别接口
-            const result = await APIService.recognizeMaterial(imageUrl, this.apiKey);
+            // 直接上传图片文件（multipart/form-data）
+            const result = await APIService.recognizeMaterial(file, this.apiKey);
             UIService.setMaterialRecognitionResult(result);
             UIService.showSuccess('物质识别成功！');
         } catch (error) {
@@ -271,25 +276,6 @@ const App = {
         } finally {
             UIService.hideMaterialRecognitionLoading();
         }
-    },
-    
-    /**
-     * 转换文件为Data URL
-     */
-    readFileAsDataURL(file) {
-        return new Promise((resolve, reject) => {
-            const reader = new FileReader();
-            
-            reader.onload = (e) => {
-                resolve(e.target.result);
-            };
-            
-            reader.onerror = (error) => {
-                reject(error);
-            };
-            
-            reader.readAsDataURL(file);
-        });
     }
 };
 
@@ -16,9 +16,13 @@ const CONFIG = {
         })(),
         ENDPOINTS: {
             REACTION_EXPLAIN: '/api/reaction/explain',
+            REACTION_EXPLAIN_STREAM: '/api/reaction/explain/stream',
             EQUATION_BALANCE: '/api/equation/balance',
+            EQUATION_BALANCE_STREAM: '/api/equation/balance/stream',
             REACTION_IMAGE: '/api/reaction/image',
-            MATERIAL_RECOGNIZE: '/api/material/recognize'
+            REACTION_IMAGE_JOB: '/api/reaction/image/',
+            MATERIAL_RECOGNIZE: '/api/material/recognize',
+            MATERIAL_RECOGNIZE_UPLOAD: '/api/material/recognize/upload'
         }
     },
     
@@ -26,7 +30,9 @@ const CONFIG = {
     TIMEOUTS: {
         SHORT: 5000,    // 5秒
         MEDIUM: 120000,  // 120秒（2分钟），足以应对大模型长时间生成
-        LONG: 300000    // 300秒（5分钟）
+        LONG: 300000,    // 300秒（5分钟）
+        IMAGE_JOB: 1200000,  // 1200秒（20分钟），文生图任务最长等待时间
+        IMAGE_JOB_POLL: 3000  // 3秒，文生图任务状态查询间隔
     },
     
     // 功能特性标记